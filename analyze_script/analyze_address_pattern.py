@@ -1,16 +1,20 @@
+import argparse
+import itertools
+import os
 import sys
 
-def analyze_addresses(filepath):
-    addresses = []
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from trace_index import get_index, iter_transactions_from
 
-    with open(filepath, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts: continue
-
-            addr_hex = parts[1]
-            addr = int(addr_hex, 16)
-            addresses.append(addr)
+def analyze_addresses(filepath, start=0, count=None):
+    # The sidecar index lets a window of a large trace be analyzed without
+    # reading everything before it
+    # 旁路索引可直接跳至大型 Trace 的某一區段分析，不需讀取其之前的內容
+    index = get_index(filepath)
+    transactions = iter_transactions_from(filepath, index, start)
+    if count is not None:
+        transactions = itertools.islice(transactions, count)
+    addresses = [address for _, address, _, _ in transactions]
 
     print(f"Analyzed {len(addresses)} addresses.")
 
@@ -43,4 +47,9 @@ def analyze_addresses(filepath):
         print(f"  Step {k} Top Stride: {top_k_stride[0]} (0x{abs(top_k_stride[0]):x}) - {top_k_stride[1]} times ({top_k_stride[1]/len(k_strides)*100:.2f}%)")
 
 if __name__ == '__main__':
-    analyze_addresses('traces/PT_test/pt_test.trace')
+    parser = argparse.ArgumentParser(description='Analyze address strides of a trace (分析 Trace 的位址跨距)')
+    parser.add_argument('trace', nargs='?', default='traces/PT_test/pt_test.trace', help='Trace file (Trace 檔案)')
+    parser.add_argument('--start', type=int, default=0, help='First transaction to analyze (起始交易編號)')
+    parser.add_argument('--count', type=int, default=None, help='Number of transactions to analyze, default all (分析的交易數量，預設為全部)')
+    args = parser.parse_args()
+    analyze_addresses(args.trace, args.start, args.count)
@@ -34,7 +34,7 @@ def main():
         if req is None:
             print("End of trace reached.")
             break
-        print(f"Queue Entry {i+1:02d}: Addr: {hex(req['address'])}, Size: {req['size']} Bytes, Beats: {req['beats']}")
+        print(f"Queue Entry {i+1:02d}: Addr: {hex(req.address)}, Size: {req.size} Bytes, Beats: {req.beats}")
 
 if __name__ == "__main__":
     main()
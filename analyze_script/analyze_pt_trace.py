@@ -1,34 +1,18 @@
+import os
 import sys
 
-def analyze(filepath):
-    reads = 0
-    writes = 0
-    sizes = {}
-    total_bytes = 0
-
-    with open(filepath, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts: continue
-
-            cmd = parts[0]
-            if cmd == 'ARx': reads += 1
-            elif cmd == 'AWx': writes += 1
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+from trace_index import get_index
 
-            # burst_len_code: beat
-            beat_hex = parts[3]
-            beat = int(beat_hex, 16)
-
-            # size in bytes: 2^6 * (beat + 1) = 64 * (beat + 1)
-            # Assuming bus_width_log2 is always 6 (64 bytes) for this format based on earlier context
-            bus_width_log2 = int(parts[2])
-            bus_width = 1 << bus_width_log2
-            size = bus_width * (beat + 1)
-
-            if size not in sizes:
-                sizes[size] = 0
-            sizes[size] += 1
-            total_bytes += size
+def analyze(filepath):
+    # Counts and the size histogram come from the trace sidecar index, so the
+    # file is only scanned on the first run (or after it changes)
+    # 計數與大小分佈取自 Trace 旁路索引，只有第一次執行 (或檔案改變後) 才需掃描檔案
+    index = get_index(filepath)
+    reads = index.reads
+    writes = index.writes
+    sizes = index.sizes
+    total_bytes = index.total_bytes
 
     total_reqs = reads + writes
     print(f"Total Requests: {total_reqs}")
@@ -1,50 +1,22 @@
 import os
+import sys
 import glob
-import subprocess
-import re
-
-def run_simulation(trace_file, queue_depth, config_file="../../configs/LP4_32_cfg.json"):
-    cmd = [
-        "python3", "../../src/main.py",
-        "--config", config_file,
-        "--mapping", "../../configs/mapping_2ch.json",
-        "--trace", trace_file,
-        "--policy", "FIFO",
-        "--queue_depth", str(queue_depth)
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running simulation for {trace_file} with {config_file}: {e}")
-        return None
-
-def parse_output(output):
-    metrics = {
-        "Total Cycles": 0,
-        "Bandwidth (GB/s)": 0.0,
-        "Utilization (%)": 0.0,
-        "Avg Queue Depth": 0.0,
-    }
 
-    patterns = {
-        "Total Cycles": r"Total Cycles \(總週期\): (\d+)",
-        "Bandwidth (GB/s)": r"Bandwidth \(頻寬\): ([\d\.]+) GB/s",
-        "Utilization (%)": r"Utilization \(利用率\): ([\d\.]+) %",
-        "Avg Queue Depth": r"Average Queue Depth \(平均隊列深度\): ([\d\.]+)",
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+from sweep import sweep
+
+def to_metrics(record):
+    """
+    Sweep record -> metrics rounded as src/main.py prints them (2 decimals).
+    將掃描紀錄轉為與 src/main.py 輸出相同 (小數兩位) 的指標。
+    """
+    return {
+        "Total Cycles": record["total_cycles"],
+        "Bandwidth (GB/s)": round(record["bandwidth_gbs"], 2),
+        "Utilization (%)": round(record["utilization"], 2),
+        "Avg Queue Depth": round(record["avg_queue_depth"], 2),
     }
 
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output)
-        if match:
-            if key in ["Bandwidth (GB/s)", "Utilization (%)", "Avg Queue Depth"]:
-                metrics[key] = float(match.group(1))
-            else:
-                metrics[key] = int(match.group(1))
-
-    return metrics
-
 def main():
     trace_files = glob.glob("../../traces/basic100/*.trace")
     trace_files.sort()
@@ -54,18 +26,12 @@ def main():
 
     print("Running simulations for basic100 traces...")
     for trace_file in trace_files:
-        basename = os.path.basename(trace_file)
-        results[basename] = {"QD16": {}, "QD64": {}}
-
-        # Run QD=16
-        out_16 = run_simulation(trace_file, 16, config_file)
-        if out_16:
-            results[basename]["QD16"] = parse_output(out_16)
-
-        # Run QD=64
-        out_64 = run_simulation(trace_file, 64, config_file)
-        if out_64:
-            results[basename]["QD64"] = parse_output(out_64)
+        results[os.path.basename(trace_file)] = {"QD16": {}, "QD64": {}}
+
+    # Run QD=16 and QD=64 for every trace in one in-process sweep
+    # 以單次行程內掃描執行每個 Trace 的 QD=16 與 QD=64
+    for record in sweep(trace_files, [config_file], ["../../configs/mapping_2ch.json"], ["FIFO"], [16, 64]):
+        results[os.path.basename(record["trace"])][f"QD{record['queue_depth']}"] = to_metrics(record)
 
     output_file = "basic100_cmp.md"
     with open(output_file, "w") as f:
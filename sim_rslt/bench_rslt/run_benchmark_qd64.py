@@ -1,60 +1,15 @@
 import os
 import sys
 import glob
-import subprocess
-import re
 
-def run_simulation(trace_file, queue_depth, policy="FIFO", config_file="../../configs/LP4_32_cfg.json"):
-    cmd = [
-        "python3", "../../src/main.py",
-        "--config", config_file,
-        "--mapping", "../../configs/mapping_2ch.json",
-        "--trace", trace_file,
-        "--policy", policy,
-        "--queue_depth", str(queue_depth)
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running simulation for {trace_file} with {config_file}: {e}")
-        return None
-
-def parse_output(output):
-    metrics = {
-        "Total Cycles": 0,
-        "Bandwidth (GB/s)": 0.0,
-        "Utilization (%)": 0.0,
-        "Avg Queue Depth": 0.0,
-        "Page Hits": 0,
-        "Page Misses": 0,
-        "Page Conflicts": 0
-    }
-
-    patterns = {
-        "Total Cycles": r"Total Cycles \(總週期\): (\d+)",
-        "Bandwidth (GB/s)": r"Bandwidth \(頻寬\): ([\d\.]+) GB/s",
-        "Utilization (%)": r"Utilization \(利用率\): ([\d\.]+) %",
-        "Avg Queue Depth": r"Average Queue Depth \(平均隊列深度\): ([\d\.]+)",
-        "Page Hits": r"Page Hits \(Page 命中\): (\d+)",
-        "Page Misses": r"Page Misses \(Page 未命中\): (\d+)",
-        "Page Conflicts": r"Page Conflicts \(Page 衝突\): (\d+)"
-    }
-
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output)
-        if match:
-            if key in ["Bandwidth (GB/s)", "Utilization (%)", "Avg Queue Depth"]:
-                metrics[key] = float(match.group(1))
-            else:
-                metrics[key] = int(match.group(1))
-
-    return metrics
-
-def run_benchmark(config_file, config_name, output_file, queue_depth, policy):
-    print(f"\nRunning benchmark for {config_name} with QD={queue_depth} Policy={policy}...")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+from sweep import sweep
 
+def run_simulations(config_files, queue_depth, policies):
+    """
+    Runs every traces/*.trace file against every config and policy in-process with the sweep engine.
+    以掃描引擎於行程內執行 traces/*.trace 與所有設定及策略的組合。
+    """
     # Get all trace files directly in traces/ directory
     # User specified "trace使用 traces/這邊的就好，子資料夾的不要"
     # Note: original run_benchmark.py filters out 'basic' traces.
@@ -64,14 +19,13 @@ def run_benchmark(config_file, config_name, output_file, queue_depth, policy):
     trace_files = glob.glob("../../traces/*.trace")
     trace_files.sort()
 
-    results = []
+    def progress(record):
+        print(f"Finished simulation for {record['trace']} with {record['config']} Policy={record['policy']}")
+
+    return sweep(trace_files, config_files, ["../../configs/mapping_2ch.json"], policies, [queue_depth], progress=progress)
 
-    for trace_file in trace_files:
-        output = run_simulation(trace_file, queue_depth, policy, config_file)
-        if output:
-            metrics = parse_output(output)
-            metrics["Trace File"] = os.path.basename(trace_file)
-            results.append(metrics)
+def run_benchmark(config_file, config_name, output_file, queue_depth, policy, records):
+    results = [res for res in records if res["config"] == config_file and res["policy"] == policy]
 
     # Generate Markdown Table
     markdown_output = []
@@ -84,14 +38,14 @@ def run_benchmark(config_file, config_name, output_file, queue_depth, policy):
 
     for res in results:
         row = [
-            res["Trace File"],
-            str(res["Total Cycles"]),
-            f"{res['Bandwidth (GB/s)']:.2f}",
-            f"{res['Utilization (%)']:.2f}",
-            f"{res['Avg Queue Depth']:.2f}",
-            str(res["Page Hits"]),
-            str(res["Page Misses"]),
-            str(res["Page Conflicts"])
+            os.path.basename(res["trace"]),
+            str(res["total_cycles"]),
+            f"{res['bandwidth_gbs']:.2f}",
+            f"{res['utilization']:.2f}",
+            f"{res['avg_queue_depth']:.2f}",
+            str(res["page_hits"]),
+            str(res["page_misses"]),
+            str(res["page_conflicts"])
         ]
         markdown_output.append("| " + " | ".join(row) + " |")
 
@@ -113,9 +67,10 @@ def main():
         ("../../configs/LP4_4266_64_cfg.json", "LPDDR4-4266 (64-bit)"),
     ]
 
+    records = run_simulations([config_path for config_path, _ in configs], queue_depth, ["FIFO", "PageHitFirst"])
     for config_path, config_name in configs:
-        run_benchmark(config_path, config_name, output_file, queue_depth, "FIFO")
-        run_benchmark(config_path, config_name, output_file, queue_depth, "PageHitFirst")
+        run_benchmark(config_path, config_name, output_file, queue_depth, "FIFO", records)
+        run_benchmark(config_path, config_name, output_file, queue_depth, "PageHitFirst", records)
     print(f"Finished benchmark to {output_file} for Queue Depth = {queue_depth} with policies")
 
 if __name__ == "__main__":
@@ -1,50 +1,22 @@
 import os
+import sys
 import glob
-import subprocess
-import re
 
-def run_simulation(trace_file, queue_depth, config_file):
-    cmd = [
-        "python3", "../../src/main.py",
-        "--config", config_file,
-        "--mapping", "../../configs/mapping_2ch.json",
-        "--trace", trace_file,
-        "--policy", "PageHitFirst",
-        "--queue_depth", str(queue_depth)
-    ]
-
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running simulation for {trace_file} with {config_file}: {e}")
-        return None
-
-def parse_output(output):
-    metrics = {
-        "Total Cycles": 0,
-        "Bandwidth (GB/s)": 0.0,
-        "Utilization (%)": 0.0,
-        "Page Hits": 0
-    }
-
-    patterns = {
-        "Total Cycles": r"Total Cycles \(總週期\): (\d+)",
-        "Bandwidth (GB/s)": r"Bandwidth \(頻寬\): ([\d\.]+) GB/s",
-        "Utilization (%)": r"Utilization \(利用率\): ([\d\.]+) %",
-        "Page Hits": r"Page Hits \(Page 命中\): (\d+)"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+from sweep import sweep
+
+def to_metrics(record):
+    """
+    Sweep record -> metrics rounded as src/main.py prints them (2 decimals).
+    將掃描紀錄轉為與 src/main.py 輸出相同 (小數兩位) 的指標。
+    """
+    return {
+        "Total Cycles": record["total_cycles"],
+        "Bandwidth (GB/s)": round(record["bandwidth_gbs"], 2),
+        "Utilization (%)": round(record["utilization"], 2),
+        "Page Hits": record["page_hits"],
     }
 
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output)
-        if match:
-            if key in ["Bandwidth (GB/s)", "Utilization (%)"]:
-                metrics[key] = float(match.group(1))
-            else:
-                metrics[key] = int(match.group(1))
-
-    return metrics
-
 def main():
     configs = [
         ("../../configs/LP4_16_cfg.json", "LPDDR4-6400 (16-bit)"),
@@ -62,6 +34,13 @@ def main():
     trace_files = glob.glob("../../traces/mix/*.trace")
     trace_files.sort()
 
+    # Run every (config, trace, QD) point in one in-process sweep
+    # 以單次行程內掃描執行所有 (設定, Trace, QD) 組合
+    config_files = [config_path for config_path, _ in configs]
+    metrics = {}
+    for record in sweep(trace_files, config_files, ["../../configs/mapping_2ch.json"], ["PageHitFirst"], [64, 128]):
+        metrics[(record["config"], record["trace"], record["queue_depth"])] = to_metrics(record)
+
     output_file = "mix_analysis_rslt.md"
 
     with open(output_file, "w", encoding='utf-8') as f:
@@ -78,13 +57,10 @@ def main():
             for trace_file in trace_files:
                 trace_name = os.path.basename(trace_file)
 
-                out_64 = run_simulation(trace_file, 64, config_path)
-                out_128 = run_simulation(trace_file, 128, config_path)
-
-                if out_64 and out_128:
-                    m64 = parse_output(out_64)
-                    m128 = parse_output(out_128)
+                m64 = metrics.get((config_path, trace_file, 64))
+                m128 = metrics.get((config_path, trace_file, 128))
 
+                if m64 and m128:
                     c64 = m64["Total Cycles"]
                     c128 = m128["Total Cycles"]
                     u64 = m64["Utilization (%)"]
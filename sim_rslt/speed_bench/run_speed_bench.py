@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src'))
+from dram_sim import SIM_VERSION
+
+# ----------------------------------------------------------------------------
+# Simulator speed benchmark (模擬器速度基準測試)
+#
+# Times every engine end to end (interpreter start, trace parsing, simulation)
+# on fixed workloads, one subprocess per run, and records wall time and the
+# peak RSS of the run's process tree. Results are compared with a stored JSON
+# baseline; runs slower or larger than the thresholds are flagged.
+# 以固定工作負載端到端量測每個引擎 (直譯器啟動、Trace 解析、模擬)，每次執行一個子行程，
+# 記錄執行時間與該行程樹的峰值記憶體 (RSS)，並與儲存的 JSON 基準比較；超過門檻者標示為退化。
+# ----------------------------------------------------------------------------
+
+# Engine name -> simulator command line (add new engines here)
+# 引擎名稱 -> 模擬器命令列 (新引擎請加在此處)
+ENGINES = {
+    'main': ['../../src/main.py'],
+    'main_event': ['../../src/main.py', '--engine', 'event'],
+    'main_ff': ['../../src/main.py', '--fast_forward'],
+    'asyc': ['../../src/asyc_parall.py'],
+    'opt': ['../../src/asyc_parall_opt.py'],
+    'opt_shm': ['../../src/asyc_parall_opt.py', '--fanout', 'shm'],
+    'opt_ff': ['../../src/asyc_parall_opt.py', '--fast_forward'],
+}
+
+SUITES = {
+    'perf_limit': [
+        '../../traces/perf_limit/rand_read_128B.trace',
+        '../../traces/perf_limit/rand_read_256B.trace',
+        '../../traces/perf_limit/rand_write_128B.trace',
+        '../../traces/perf_limit/rand_write_256B.trace',
+        '../../traces/perf_limit/seq_read_128B.trace',
+        '../../traces/perf_limit/seq_read_256B.trace',
+        '../../traces/perf_limit/seq_write_128B.trace',
+        '../../traces/perf_limit/seq_write_256B.trace',
+    ],
+    'mix': [
+        '../../traces/mix/rand_mix_64B.trace',
+        '../../traces/mix/rand_mix_128B.trace',
+        '../../traces/mix/rand_mix_256B.trace',
+        '../../traces/mix/rand_mix_512B.trace',
+        '../../traces/mix/seq_mix_64B.trace',
+        '../../traces/mix/seq_mix_128B.trace',
+        '../../traces/mix/seq_mix_256B.trace',
+        '../../traces/mix/seq_mix_512B.trace',
+    ],
+    'pt_test': [
+        '../../traces/PT_test/pt_test.trace',
+    ],
+}
+
+QUEUE_DEPTHS = [16, 64, 256, 1024]
+CONFIG = '../../configs/LP4_32_cfg.json'
+MAPPING = '../../configs/mapping_2ch.json'
+POLICY = 'PageHitFirst'
+
+BASELINE_FILE = 'speed_baseline.json'
+OUTPUT_FILE = 'speed_bench.md'
+
+
+def run_key(engine, trace, queue_depth):
+    return f"{engine}|{os.path.basename(trace)}|{queue_depth}"
+
+
+def run_once(engine, trace, queue_depth):
+    """
+    Runs one simulation as a subprocess.
+    以子行程執行一次模擬。
+    Returns (wall_seconds, peak_rss_kb, total_cycles); peak RSS covers the
+    simulator and every worker it waited for, and is None where os.wait4 is unavailable.
+    回傳 (執行秒數, 峰值 RSS KiB, 總週期數)；峰值 RSS 涵蓋模擬器及其等待過的所有 Worker，無 os.wait4 的平台為 None。
+    """
+    with tempfile.TemporaryDirectory(prefix='speed_bench_') as tmp_dir:
+        json_path = os.path.join(tmp_dir, 'result.json')
+        cmd = [sys.executable] + ENGINES[engine] + [
+            '--config', CONFIG, '--mapping', MAPPING, '--trace', trace,
+            '--policy', POLICY, '--queue_depth', str(queue_depth), '--json', json_path,
+        ]
+        with open(os.path.join(tmp_dir, 'stderr.txt'), 'w+') as err:
+            start = time.perf_counter()
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=err)
+            if hasattr(os, 'wait4'):
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                # ru_maxrss is in bytes on macOS, KiB elsewhere
+                # ru_maxrss 在 macOS 上以 bytes 為單位，其他平台為 KiB
+                peak_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+            else:
+                proc.wait()
+                peak_rss_kb = None
+            wall = time.perf_counter() - start
+
+            if proc.returncode != 0:
+                err.seek(0)
+                raise RuntimeError(f"{' '.join(cmd)} failed with exit code {proc.returncode}:\n{err.read()}")
+
+        with open(json_path, 'r') as f:
+            total_cycles = json.load(f)['total_cycles']
+    return wall, peak_rss_kb, total_cycles
+
+
+def run_suite(engines, suites, queue_depths, repeat):
+    """
+    Runs every (engine, trace, queue depth) point; wall time is the best of repeat runs.
+    執行所有 (引擎, Trace, 隊列深度) 組合；執行時間取 repeat 次中的最小值。
+    """
+    results = {}
+    points = [(engine, trace, qd) for suite in suites for trace in SUITES[suite] for qd in queue_depths for engine in engines]
+    for i, (engine, trace, qd) in enumerate(points, 1):
+        walls = []
+        rss = []
+        for _ in range(repeat):
+            wall, peak_rss_kb, total_cycles = run_once(engine, trace, qd)
+            walls.append(wall)
+            if peak_rss_kb is not None:
+                rss.append(peak_rss_kb)
+        results[run_key(engine, trace, qd)] = {
+            'engine': engine,
+            'trace': os.path.basename(trace),
+            'queue_depth': qd,
+            'wall_seconds': min(walls),
+            'peak_rss_kb': max(rss) if rss else None,
+            'total_cycles': total_cycles,
+        }
+        print(f"[{i}/{len(points)}] {engine:<10} {os.path.basename(trace):<22} QD={qd:<5} {min(walls):8.3f} s")
+    return results
+
+
+def compare(results, baseline, time_threshold, mem_threshold, min_seconds=0.0):
+    """
+    Returns [(key, kind, base, current)] for every run beyond the thresholds.
+    回傳所有超過門檻之執行的 [(鍵值, 類型, 基準值, 目前值)]。
+    kind is 'time', 'memory' or 'cycles' (the simulated result itself changed,
+    so the timings are not comparable).
+    kind 為 'time'、'memory' 或 'cycles' (模擬結果本身已改變，時間不可直接比較)。
+    Slowdowns smaller than min_seconds are ignored as timer noise.
+    小於 min_seconds 的變慢視為計時雜訊而忽略。
+    """
+    regressions = []
+    for key, res in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if base['total_cycles'] != res['total_cycles']:
+            regressions.append((key, 'cycles', base['total_cycles'], res['total_cycles']))
+        if (res['wall_seconds'] > base['wall_seconds'] * (1 + time_threshold) and
+                res['wall_seconds'] - base['wall_seconds'] > min_seconds):
+            regressions.append((key, 'time', base['wall_seconds'], res['wall_seconds']))
+        if (base['peak_rss_kb'] is not None and res['peak_rss_kb'] is not None and
+                res['peak_rss_kb'] > base['peak_rss_kb'] * (1 + mem_threshold)):
+            regressions.append((key, 'memory', base['peak_rss_kb'], res['peak_rss_kb']))
+    return regressions
+
+
+def write_report(output_file, results, baseline):
+    lines = ["# DRAM Simulator Speed Benchmark (模擬器速度基準測試)\n",
+             f"`{os.path.basename(CONFIG)}`, `{os.path.basename(MAPPING)}`, {POLICY}; wall time is end to end, including interpreter start.",
+             "執行時間為端到端量測，包含直譯器啟動。\n"]
+    headers = ["Engine", "Trace File", "QD", "Wall (s)", "Baseline (s)", "Change (%)", "Peak RSS (MB)", "Total Cycles"]
+    lines.append("| " + " | ".join(headers) + " |")
+    lines.append("| " + " | ".join(["---"] * len(headers)) + " |")
+    for key, res in results.items():
+        base = baseline.get(key)
+        change = f"{(res['wall_seconds'] / base['wall_seconds'] - 1) * 100:+.1f}" if base else "-"
+        row = [
+            res['engine'],
+            res['trace'],
+            str(res['queue_depth']),
+            f"{res['wall_seconds']:.3f}",
+            f"{base['wall_seconds']:.3f}" if base else "-",
+            change,
+            f"{res['peak_rss_kb'] / 1024:.1f}" if res['peak_rss_kb'] is not None else "-",
+            str(res['total_cycles']),
+        ]
+        lines.append("| " + " | ".join(row) + " |")
+    with open(output_file, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulator speed benchmark with regression baselines (具退化基準的模擬器速度基準測試)')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES), help='Engines to time (要量測的引擎)')
+    parser.add_argument('--suites', nargs='+', default=list(SUITES), choices=list(SUITES), help='Workload suites (工作負載組)')
+    parser.add_argument('--queue_depths', nargs='+', type=int, default=QUEUE_DEPTHS, help='Command queue depths (指令隊列深度)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per point; the fastest counts (每個點的執行次數，取最快者)')
+    parser.add_argument('--baseline', type=str, default=BASELINE_FILE, help='Baseline JSON file (基準 JSON 檔)')
+    parser.add_argument('--update', action='store_true', help='Store these results in the baseline (將本次結果存入基準)')
+    parser.add_argument('--time_threshold', type=float, default=0.15, help='Allowed wall-time increase, as a fraction (允許的執行時間增加比例)')
+    parser.add_argument('--min_seconds', type=float, default=0.1, help='Ignore slowdowns below this many seconds as noise (忽略小於此秒數的變慢，視為雜訊)')
+    parser.add_argument('--mem_threshold', type=float, default=0.20, help='Allowed peak RSS increase, as a fraction (允許的峰值記憶體增加比例)')
+    args = parser.parse_args()
+
+    baseline_data = {'meta': {}, 'results': {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline_data = json.load(f)
+    baseline = baseline_data['results']
+
+    results = run_suite(args.engines, args.suites, args.queue_depths, args.repeat)
+    write_report(OUTPUT_FILE, results, baseline)
+
+    regressions = compare(results, baseline, args.time_threshold, args.mem_threshold, args.min_seconds)
+    missing = [key for key in results if key not in baseline]
+    print()
+    if missing:
+        print(f"{len(missing)} run(s) have no baseline yet.")
+    for key, kind, base, current in regressions:
+        if kind == 'time':
+            print(f"REGRESSION (time) {key}: {base:.3f} s -> {current:.3f} s ({(current / base - 1) * 100:+.1f} %)")
+        elif kind == 'memory':
+            print(f"REGRESSION (memory) {key}: {base / 1024:.1f} MB -> {current / 1024:.1f} MB ({(current / base - 1) * 100:+.1f} %)")
+        else:
+            print(f"RESULT CHANGED {key}: {base} -> {current} cycles")
+    if not regressions:
+        print("No regressions against the baseline.")
+
+    if args.update:
+        # Merge, so a partial run only replaces the points it measured
+        # 以合併方式更新，部分執行只取代其量測到的點
+        baseline.update(results)
+        baseline_data['meta'] = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sim_version': SIM_VERSION,
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline_data, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {args.baseline}")
+
+    if regressions and not args.update:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
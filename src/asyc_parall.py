@@ -1,4 +1,5 @@
 import argparse
+import json
 import sys
 import os
 
@@ -7,93 +8,43 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
 from config import load_config, load_mapping
 from mapper import AddressMapper
-from dram_sim import DRAMController
+from dram_sim import FRFCFS_AGE_CAP, PAGE_POLICIES, PAGE_TIMEOUT, POLICIES, DRAMController
+from chunker import BlockTraceReader, TraceReader
+from simulate import result_from_channels
+from trace_bin import BinaryTraceReader, is_binary_trace
+from shard import ShardReader, load_shards, shard_trace, write_shard_manifest
+from trace_index import get_index
+from profiler import Profiler, format_profile, phase
 import multiprocessing
-
-class TraceReader:
-    """
-    Reads and parses trace files with hardware-aligned chunking.
-    讀取並解析 Trace 檔案，並進行硬體對齊的區塊切割。
-    """
-    def __init__(self, filepath, mapper):
-        self.filepath = filepath
-        self.file = open(filepath, 'r')
-        self.mapper = mapper
-        self.pending_chunks = []
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if self.pending_chunks:
-            return self.pending_chunks.pop(0)
-
-        line = self.file.readline()
-        if not line:
-            self.file.close()
-            raise StopIteration
-
-        parts = line.strip().split()
-        if not parts:
-            return self.__next__()
-
-        # Format: [R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # 格式：[R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # Data Size = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
-
-        type_str = parts[0]
-        addr_str = parts[1]
-        bus_width_log2 = int(parts[2])
-        burst_len_code = int(parts[3], 16)
-
-        is_write = 'W' in type_str
-        start_address = int(addr_str, 16)
-
-        # Calculate total Request Size
-        # 計算總請求大小
-        beats = burst_len_code + 1
-        bytes_per_beat = 2**bus_width_log2
-        total_size = bytes_per_beat * beats
-
-        curr_addr = start_address
-        remaining_size = total_size
-
-        # Max chunk size logic: Limit to 2 DRAM Burst Lengths (2BL).
-        # LPDDR4/5 Burst Length = 16. So 2 BL = 32 transfers.
-        # A single 16-beat BL on a 64-bit (8-Byte) bus is 16 * 8 = 128 Bytes.
-        # 2 BL = 2 * 128 = 256 Bytes.
-        # 最大區塊大小邏輯：限制為 2 個 DRAM Burst Length (2BL)。
-        # 單一 64-bit 匯流排的 16-beat BL 為 128 Bytes。2 BL = 256 Bytes。
-        max_chunk_size = 256
-
-        while remaining_size > 0:
-            next_boundary = self.mapper.get_next_boundary(curr_addr)
-            chunk_size = min(remaining_size, next_boundary - curr_addr, max_chunk_size)
-
-            self.pending_chunks.append({
-                'is_write': is_write,
-                'address': curr_addr,
-                'size': chunk_size,
-                'beats': chunk_size // bytes_per_beat
-            })
-
-            curr_addr += chunk_size
-            remaining_size -= chunk_size
-
-        return self.pending_chunks.pop(0)
+import shutil
+import tempfile
 
 import os
 
-def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_depth, interval_us, verbose_interval, trace_name, log_dir):
+def run_channel_sim(channel_id, shard_path, config, mapping, policy, queue_depth, interval_us, verbose_interval, trace_name, log_dir, engine='scan', profile=False, fast_forward=False, age_cap=FRFCFS_AGE_CAP,
+                    controller_options=None):
     """
-    Simulates a single Channel independently by streaming the trace file.
-    This avoids loading the entire trace into memory, preventing OOM on huge files.
+    Simulates a single Channel independently by streaming its channel shard.
+    This avoids loading the entire trace into memory, preventing OOM on huge files,
+    and each worker only reads the requests of its own channel.
+    依序讀取自己 Channel 的分片來獨立模擬單一 Channel，每個 Worker 只讀取屬於自己的請求。
+    With profile, the result also carries a Profiler summary under 'profile'.
+    若啟用 profile，結果另於 'profile' 附上 Profiler 剖析摘要。
+    controller_options holds the DRAMController write queue (write_queue_depth,
+    write_high, write_low), page policy (page_policy, page_timeout) and
+    auto_precharge arguments.
+    controller_options 為 DRAMController 的寫入隊列 (write_queue_depth、write_high、write_low)、Page 策略 (page_policy、page_timeout) 與 auto_precharge 參數。
     """
     mapper = AddressMapper(mapping)
-    controller = DRAMController(config, mapper, scheduler_type=policy, queue_depth=queue_depth)
+    controller = DRAMController(config, mapper, scheduler_type=policy, queue_depth=queue_depth, engine=engine, age_cap=age_cap,
+                                **(controller_options or {}))
+
+    trace_iter = iter(ShardReader(shard_path))
 
-    trace_reader = TraceReader(trace_filepath, mapper)
-    trace_iter = iter(trace_reader)
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.instrument_controller(controller)
+        trace_iter = profiler.instrument_iter('trace_read', trace_iter)
 
     interval_log_file = None
     interval_cycles = None
@@ -122,65 +73,70 @@ def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_d
         interval_log_file.write(f"Interval Logging Enabled: {interval_us} us\n")
         interval_log_file.write(f"Interval (us), Utilization (%), Completed AXI Reqs, Interval Bytes, Idle Cycles\n")
 
-    next_req = None
     eof_reached = False
+    # Request read from the shard but not yet admitted (its queue is full)
+    # 已從分片讀出但尚未進入隊列的請求 (其隊列已滿)
+    next_req = None
 
-    while not eof_reached or len(controller.queue) > 0:
-        # Fill Queue up to depth
-        while not eof_reached and len(controller.queue) < queue_depth:
+    def fill_queue():
+        nonlocal eof_reached, next_req
+        while not eof_reached:
             if next_req is None:
+                # Shard requests are pre-mapped and all belong to this channel
+                # 分片中的請求皆已映射且全部屬於此 Channel
                 next_req = next(trace_iter, None)
                 if next_req is None:
                     eof_reached = True
                     break
+            if not controller.has_room(next_req):
+                break
+            controller.queue.append(next_req)
+            next_req = None
 
-            # Process map address to see if it belongs to this worker's channel
-            mapped = mapper.map_address(next_req['address'])
-            req_ch = mapped['Channel']
-
-            if req_ch == channel_id:
-                next_req['mapped'] = mapped
-                controller.queue.append(next_req)
-                next_req = None # Consume it
-            else:
-                next_req = None # Discard it, belongs to another channel
+    while not eof_reached or len(controller.queue) > 0:
+        # Fill Queue up to depth
+        fill_queue()
 
         # Tick even if queue might not be fully populated yet
-        # (or if we hit EOF and just need to drain)
-        controller.tick()
+        # (or if we hit EOF and just need to drain); with fast_forward a
+        # row-hit streak runs in one batch, up to the next interval boundary
+        # 使用 fast_forward 時，Row 命中連續段以單一批次執行，直到下一個區間邊界
+        if not (fast_forward and controller.fast_forward(fill_queue, next_interval_cycle)):
+            controller.tick()
 
         # Interval utilization logging
         if interval_cycles is not None and controller.current_time >= next_interval_cycle:
-            current_bus_busy_cycles = controller.stats['bus_busy_cycles']
-            interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
-
-            current_completed_reqs = controller.completed_requests
-            interval_reqs = current_completed_reqs - last_completed_reqs
-
-            current_total_bytes = controller.stats['total_bytes']
-            interval_bytes = current_total_bytes - last_total_bytes
-
-            # Since this controller is ONLY processing ONE channel:
-            interval_total_available = interval_cycles * 1
-            interval_idle_cycles = max(0, interval_total_available - interval_busy)
-
-            # Clamp utilization to 100% to handle burst durations crossing the interval boundary
-            capped_busy = min(interval_busy, interval_total_available)
-            interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
-            interval_time_us = interval_us * interval_count
-            # 強制轉換為整數並加入千分位逗號，避免科學記號
-            formatted_time = f"{int(interval_time_us):,}"
-
-            if verbose_interval:
-                msg = f"[CH{channel_id}] Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
-                print(msg)
-            interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
-
-            last_bus_busy_cycles = current_bus_busy_cycles
-            last_completed_reqs = current_completed_reqs
-            last_total_bytes = current_total_bytes
-            interval_count += 1
-            next_interval_cycle += interval_cycles
+            with phase(profiler, 'interval_log'):
+                current_bus_busy_cycles = controller.stats['bus_busy_cycles']
+                interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
+
+                current_completed_reqs = controller.completed_requests
+                interval_reqs = current_completed_reqs - last_completed_reqs
+
+                current_total_bytes = controller.stats['total_bytes']
+                interval_bytes = current_total_bytes - last_total_bytes
+
+                # Since this controller is ONLY processing ONE channel:
+                interval_total_available = interval_cycles * 1
+                interval_idle_cycles = max(0, interval_total_available - interval_busy)
+
+                # Clamp utilization to 100% to handle burst durations crossing the interval boundary
+                capped_busy = min(interval_busy, interval_total_available)
+                interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
+                interval_time_us = interval_us * interval_count
+                # 強制轉換為整數並加入千分位逗號，避免科學記號
+                formatted_time = f"{int(interval_time_us):,}"
+
+                if verbose_interval:
+                    msg = f"[CH{channel_id}] Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
+                    print(msg)
+                interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
+
+                last_bus_busy_cycles = current_bus_busy_cycles
+                last_completed_reqs = current_completed_reqs
+                last_total_bytes = current_total_bytes
+                interval_count += 1
+                next_interval_cycle += interval_cycles
 
     if interval_log_file is not None:
         interval_log_file.close()
@@ -194,11 +150,14 @@ def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_d
     total_cycles = max(controller.current_time, max_data_bus_free_time)
     total_cycles = max(1, total_cycles)
 
-    return {
+    result = {
         'channel_id': channel_id,
         'total_cycles': total_cycles,
         'stats': stats
     }
+    if profiler is not None:
+        result['profile'] = profiler.finish(controller)
+    return result
 
 
 def main():
@@ -206,10 +165,24 @@ def main():
     parser.add_argument('--config', required=True, help='Path to timing config JSON (時序設定檔路徑)')
     parser.add_argument('--mapping', required=True, help='Path to address mapping JSON (位址映射檔路徑)')
     parser.add_argument('--trace', required=True, help='Path to trace file (Trace 檔案路徑)')
-    parser.add_argument('--policy', default='PageHitFirst', choices=['FIFO', 'PageHitFirst'], help='Scheduling policy (排程策略)')
+    parser.add_argument('--policy', default='PageHitFirst', choices=list(POLICIES), help='Scheduling policy (排程策略)')
     parser.add_argument('--queue_depth', type=int, default=16, help='Command queue depth (指令隊列深度)')
+    parser.add_argument('--age_cap', type=int, default=FRFCFS_AGE_CAP, help='FRFCFS: cycles a request may wait before row hits stop bypassing it (FRFCFS：請求等待超過此週期數後，Row 命中不再可越過它)')
+    parser.add_argument('--write_queue_depth', type=int, default=0, help='Per-channel write queue depth, 0 = reads and writes share --queue_depth (每 Channel 獨立寫入隊列深度，0 = 讀寫共用 --queue_depth)')
+    parser.add_argument('--write_high', type=int, default=None, help='Queued writes of a channel that start its write drain, default 3/4 of the write queue (Channel 開始排空寫入的寫入筆數，預設為寫入隊列的 3/4)')
+    parser.add_argument('--write_low', type=int, default=None, help='Queued writes of a channel that end its write drain, default 1/4 of the write queue (Channel 結束排空寫入的寫入筆數，預設為寫入隊列的 1/4)')
+    parser.add_argument('--page_policy', default='open', choices=list(PAGE_POLICIES), help='Page policy: open, closed (precharge once no queued request hits the row) or adaptive (precharge after an idle timeout) (Page 策略：open、closed (沒有隊列請求命中該 Row 即預充電) 或 adaptive (閒置逾時後預充電))')
+    parser.add_argument('--page_timeout', type=int, default=PAGE_TIMEOUT, help='Adaptive page policy: initial idle cycles before a bank is precharged (adaptive Page 策略：Bank 預充電前的初始閒置週期數)')
+    parser.add_argument('--auto_precharge', action='store_true', help='Issue the last queued RD/WR to a row as RDA/WRA, closing it without a PRE command (對 Row 的最後一個隊列 RD/WR 以 RDA/WRA 發出，不需 PRE 指令即關閉該 Row)')
+    parser.add_argument('--engine', default='scan', choices=['scan', 'event'], help='Scheduler engine: per-bank scan or event-driven (排程引擎：逐 Bank 掃描或事件驅動)')
+    parser.add_argument('--fast_forward', action='store_true', help='Issue row-hit streaks in one batch, same results (Row 命中連續段批次發出，結果相同)')
     parser.add_argument('--interval_us', type=float, default=None, help='Interval in microseconds for calculating utilization (計算利用率的時間區間，單位為 us)')
     parser.add_argument('--verbose_interval', action='store_true', help='Print interval utilization to console with [CHx] tag (在終端機印出帶有 [CHx] 標籤的區間利用率)')
+    parser.add_argument('--chunk_block', type=int, default=0, help='Chunk and map the trace with NumPy in blocks of N transactions, 0 = per-transaction reader (以 NumPy 每 N 筆交易為一批進行切割與映射，0 = 逐筆讀取)')
+    parser.add_argument('--shard_dir', type=str, default=None, help='Directory to keep the per-channel shard files; defaults to a temporary directory removed after the run (保留各 Channel 分片檔的資料夾，預設為執行後刪除的暫存資料夾)')
+    parser.add_argument('--index', action='store_true', help='Use the trace sidecar index, building it on first use; with --shard_dir, shards matching the index are reused instead of re-sharding (使用 Trace 旁路索引，首次使用時建立；搭配 --shard_dir 時重複使用符合索引的分片而不重新分片)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results as JSON to this file (另將結果以 JSON 格式寫入此檔案)')
+    parser.add_argument('--profile', action='store_true', help='Report wall time per phase, throughput and peak RSS for the parent and every channel worker (回報主行程與各 Channel Worker 的各階段執行時間、吞吐量與峰值記憶體)')
     parser.add_argument('--log_dir', type=str, default='.', help='Directory to save the interval log files (存放 interval log 檔案的資料夾)')
 
     args = parser.parse_args()
@@ -226,58 +199,87 @@ def main():
     # Initialize Components
     # 初始化元件
     mapper = AddressMapper(mapping)
-    controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth)
-
-    # Fast Pre-scan to discover active channels in the trace
-    # 快速掃描找出 Trace 到底用到了哪些 Channel，避免啟動不需要的 Worker
-    active_channels = set()
-    mapper = AddressMapper(mapping)
+    controller_options = {'write_queue_depth': args.write_queue_depth, 'write_high': args.write_high, 'write_low': args.write_low,
+                          'page_policy': args.page_policy, 'page_timeout': args.page_timeout, 'auto_precharge': args.auto_precharge}
+    try:
+        controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth, **controller_options)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
 
-    with open(args.trace, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts:
-                continue
-            addr_str = parts[1]
-            address = int(addr_str, 16)
-
-            bus_width_log2 = int(parts[2])
-            burst_len_code = int(parts[3], 16)
-            beats = burst_len_code + 1
-            bytes_per_beat = 2**bus_width_log2
-            total_size = bytes_per_beat * beats
-
-            curr_addr = address
-            remaining_size = total_size
-            while remaining_size > 0:
-                mapped = mapper.map_address(curr_addr)
-                active_channels.add(mapped['Channel'])
-
-                next_boundary = mapper.get_next_boundary(curr_addr)
-                chunk_size = min(remaining_size, next_boundary - curr_addr)
-                curr_addr += chunk_size
-                remaining_size -= chunk_size
-            # Optional: early exit if we found maximum possible channels
-            # (e.g. if we know it's a 4CH mapping, break when len == 4)
-
-    print(f"Starting parallel simulation with {args.config} and {args.mapping}")
-    print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
-    print(f"Detected {len(active_channels)} active channel(s) in trace: {active_channels}")
-
-    # Multiprocessing Pool Setup
+    # Single-pass sharding: read, chunk and map the trace once, writing one
+    # shard per channel. The channels seen are the active channels, so no
+    # separate pre-scan is needed and workers never re-parse the trace.
+    # 單次分片：只讀取、切割並映射 Trace 一次，為每個 Channel 寫出一個分片。
+    # 出現過的 Channel 即為啟用的 Channel，不需另外快速掃描，Worker 也不必重新解析 Trace。
     trace_base_name = os.path.splitext(os.path.basename(args.trace))[0]
 
-    pool_args = []
-    for ch_id in active_channels:
-        pool_args.append((
-            ch_id, args.trace, config, mapping, args.policy, args.queue_depth, args.interval_us, args.verbose_interval, trace_base_name, args.log_dir
-        ))
-
-    # Determine optimal number of processes
-    num_processes = min(len(active_channels), multiprocessing.cpu_count())
+    # Opt-in self-profiling of the parent (reading, mapping and distributing the
+    # trace); workers profile their own simulation loops.
+    # 選用的主行程自身效能剖析 (讀取、映射與分送 Trace)；各 Worker 自行剖析其模擬迴圈。
+    profiler = Profiler() if args.profile else None
+    if profiler is not None:
+        profiler.instrument_mapper(mapper)
+
+    def open_trace_reader():
+        if args.chunk_block > 0:
+            trace_reader = BlockTraceReader(args.trace, mapper, block_size=args.chunk_block)
+        elif is_binary_trace(args.trace):
+            trace_reader = BinaryTraceReader(args.trace, mapper)
+        else:
+            trace_reader = TraceReader(args.trace, mapper)
+        if profiler is not None:
+            return profiler.instrument_iter('trace_parse', trace_reader)
+        return trace_reader
 
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.starmap(run_channel_sim, pool_args)
+    shard_dir = args.shard_dir if args.shard_dir else tempfile.mkdtemp(prefix='dram_shards_')
+    try:
+        # With the sidecar index, a rerun on the same trace and mapping finds the
+        # kept shards still valid and skips the sharding pass altogether.
+        # 使用旁路索引時，對相同 Trace 與 mapping 重新執行會發現保留的分片仍有效，因而完全略過分片階段。
+        shards = None
+        index = get_index(args.trace, mapping) if args.index else None
+        if index is not None and args.shard_dir:
+            source = {'trace_sha256': index.trace['sha256'], 'mapping_key': index.mapping_key}
+            shards = load_shards(shard_dir, trace_base_name, source)
+            if shards is not None and set(shards) == index.active_channels:
+                print(f"Reusing {len(shards)} shard(s) from {shard_dir}")
+            else:
+                shards = None
+
+        if shards is None:
+            with phase(profiler, 'shard'):
+                shards = shard_trace(open_trace_reader(), mapper, shard_dir, prefix=trace_base_name)
+            if index is not None and args.shard_dir:
+                write_shard_manifest(shard_dir, trace_base_name, shards, source)
+        active_channels = set(shards)
+
+        print(f"Starting parallel simulation with {args.config} and {args.mapping}")
+        print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
+        if controller.write_queue_depth:
+            print(f"Write Queue Depth: {controller.write_queue_depth}, Watermarks: high {controller.write_high}, low {controller.write_low}")
+        if controller.page_policy != 'open':
+            print(f"Page Policy: {controller.page_policy}" + (f", Timeout: {controller.page_timeout}" if controller.page_policy == 'adaptive' else ""))
+        if controller.auto_precharge:
+            print("Auto-Precharge: RDA/WRA")
+        print(f"Detected {len(active_channels)} active channel(s) in trace: {active_channels}")
+
+        # Multiprocessing Pool Setup
+        pool_args = []
+        for ch_id in active_channels:
+            pool_args.append((
+                ch_id, shards[ch_id][0], config, mapping, args.policy, args.queue_depth, args.interval_us, args.verbose_interval, trace_base_name, args.log_dir, args.engine, args.profile, args.fast_forward, args.age_cap, controller_options
+            ))
+
+        # Determine optimal number of processes
+        num_processes = min(len(active_channels), multiprocessing.cpu_count())
+
+        with multiprocessing.Pool(processes=num_processes) as pool:
+            with phase(profiler, 'workers'):
+                results = pool.starmap(run_channel_sim, pool_args)
+    finally:
+        if not args.shard_dir:
+            shutil.rmtree(shard_dir, ignore_errors=True)
 
     # ------------------------------------------------------------------------
     # Aggregate and Print Results
@@ -294,6 +296,9 @@ def main():
     total_page_hits = 0
     total_page_misses = 0
     total_page_conflicts = 0
+    total_turnarounds = 0
+    total_idle_precharges = 0
+    total_auto_precharges = 0
 
     print("\n--- Per-Channel Statistics (個別通道統計) ---")
     for res in sorted(results, key=lambda x: x['channel_id']):
@@ -314,6 +319,11 @@ def main():
         print(f"  Bandwidth: {ch_bw_gbs:.2f} GB/s")
         print(f"  Utilization: {ch_utilization:.2f} %")
         print(f"  Avg Queue Depth: {ch_avg_qd:.2f}")
+        print(f"  Bus Turnarounds: {ch_stats['turnarounds']}")
+        if controller.page_policy != 'open':
+            print(f"  Idle Precharges: {ch_stats['idle_precharges']}")
+        if controller.auto_precharge:
+            print(f"  Auto Precharges: {ch_stats['auto_precharges']}")
 
         # Aggregation for Overall
         overall_max_cycles = max(overall_max_cycles, ch_cycles)
@@ -322,6 +332,9 @@ def main():
         total_page_hits += ch_stats['page_hits']
         total_page_misses += ch_stats['page_misses']
         total_page_conflicts += ch_stats['page_conflicts']
+        total_turnarounds += ch_stats['turnarounds']
+        total_idle_precharges += ch_stats['idle_precharges']
+        total_auto_precharges += ch_stats['auto_precharges']
 
     overall_max_cycles = max(1, overall_max_cycles)
     num_active_channels = len(results)
@@ -347,6 +360,31 @@ def main():
     print(f"Page Hits (Page 命中): {total_page_hits}")
     print(f"Page Misses (Page 未命中): {total_page_misses}")
     print(f"Page Conflicts (Page 衝突): {total_page_conflicts}")
+    print(f"Bus Turnarounds (匯流排轉向次數): {total_turnarounds}")
+    if controller.page_policy != 'open':
+        print(f"Idle Precharges (閒置預充電次數): {total_idle_precharges}")
+    if controller.auto_precharge:
+        print(f"Auto Precharges (自動預充電次數): {total_auto_precharges}")
+
+    if profiler is not None:
+        # Parent phases only; worker time appears under 'workers' as waiting
+        # 僅含主行程階段；Worker 的執行時間在 'workers' 中以等待時間呈現
+        profiler.finish()
+        print()
+        print(format_profile(profiler.summary, 'Profile: Parent (效能剖析：主行程)'))
+        for res in sorted(results, key=lambda x: x['channel_id']):
+            print()
+            print(format_profile(res['profile'], f"Profile: CH{res['channel_id']} (效能剖析：CH{res['channel_id']})"))
+
+    if args.json:
+        data = result_from_channels(config, results, controller.write_queue_config(), controller.page_policy_config(), controller.auto_precharge).to_dict()
+        if profiler is not None:
+            data['profile'] = {
+                'parent': profiler.summary,
+                'channels': [res['profile'] for res in sorted(results, key=lambda x: x['channel_id'])],
+            }
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,6 @@
 import argparse
+import itertools
+import json
 import sys
 import os
 
@@ -7,71 +9,148 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
 from config import load_config, load_mapping
 from mapper import AddressMapper
-from dram_sim import DRAMController
+from dram_sim import FRFCFS_AGE_CAP, PAGE_POLICIES, PAGE_TIMEOUT, POLICIES, DRAMController
+from chunker import BlockTraceReader, TraceReader
+from simulate import result_from_channels
+from trace_bin import BinaryTraceReader, is_binary_trace
+from shard import ShardReader, load_shards, shard_trace, write_shard_manifest
+from trace_index import get_index
+from profiler import Profiler, format_profile, phase
+from checkpoint import checkpoint_path, load_checkpoint, next_checkpoint, restore_controller, resume_interval, save_checkpoint
+from fanout import collect_ring_results, fan_out_trace, ring_worker
 import multiprocessing
+import shutil
+import tempfile
 
 class DRAMControllerOpt(DRAMController):
     """
     Optimized version of DRAMController with command status caching.
     """
-    def __init__(self, config, mapper, scheduler_type='FIFO', queue_depth=16, log_cmd=False, channel_id=None):
-        super().__init__(config, mapper, scheduler_type, queue_depth, log_cmd)
+    def __init__(self, config, mapper, scheduler_type='FIFO', queue_depth=16, log_cmd=False, channel_id=None, age_cap=FRFCFS_AGE_CAP,
+                 write_queue_depth=0, write_high=None, write_low=None, page_policy='open', page_timeout=PAGE_TIMEOUT, auto_precharge=False):
+        super().__init__(config, mapper, scheduler_type, queue_depth, log_cmd, age_cap=age_cap,
+                         write_queue_depth=write_queue_depth, write_high=write_high, write_low=write_low,
+                         page_policy=page_policy, page_timeout=page_timeout, auto_precharge=auto_precharge)
         if log_cmd and channel_id is not None:
             # Overwrite the shared file to a channel specific one
             if self.cmd_log_file:
                 self.cmd_log_file.close()
             self.cmd_log_file = open(f"dram_pipeline_CH{channel_id}.log", "w")
 
-    def invalidate_all_cache(self):
+    def invalidate_dependent_cache(self, issued_req, cmd_type):
         """
-        Invalidates all cached command statuses globally.
-        This ensures absolute correctness since ANY command issued on a channel
-        updates global constraints (like data bus direction, cmd bus occupancy,
-        tFAW window, etc.) which might affect the readiness of OTHER requests
-        in the queue.
+        Invalidates only the cached statuses that depend on state changed by cmd_type.
+        A cached (command, ready time) is a function of:
+          - the request's own bank (any command),
+          - the rank's ACT history for tRRD/tFAW (cached ACT only),
+          - the channel's data bus free time and direction (cached RD/WR only).
+        Bank group timing only adds state of the same rank (ACT) and channel (RD/WR).
+        The command bus is re-checked every tick and is never cached.
+        僅使依賴於 cmd_type 所改變狀態的快取失效：同一 Bank、同一 Rank 的 ACT 視窗、
+        以及同一 Channel 的資料匯流排方向與閒置時間。
         """
+        channel_id = issued_req.channel
+        rank_id = issued_req.rank
+        bank_id = issued_req.bank
+        is_cas = cmd_type in ('RD', 'WR')
+
         for req in self.queue:
-            req.pop('cached_ready_time', None)
-            req.pop('cached_cmd_type', None)
+            cached_cmd = req.cached_cmd_type
+            if cached_cmd is None or req.channel != channel_id:
+                continue
+
+            same_rank = req.rank == rank_id
+            if same_rank and req.bank == bank_id:
+                stale = True
+            elif cmd_type == 'ACT':
+                stale = same_rank and cached_cmd == 'ACT'
+            else:
+                stale = is_cas and cached_cmd in ('RD', 'WR')
+
+            if stale:
+                req.cached_ready_time = None
+                req.cached_cmd_type = None
 
     def issue_command(self, req_idx, cmd_type):
         """
-        Overridden to invalidate cache globally upon state changes.
+        Overridden to invalidate the cache entries affected by the issued command.
         """
-        # Call the original issue_command logic
+        req = self.queue[req_idx]
         done = super().issue_command(req_idx, cmd_type)
-
-        # Any command issuance changes the channel/bus/bank state timeline.
-        # We must invalidate everything to prevent data inaccuracies.
-        self.invalidate_all_cache()
-
+        self.invalidate_dependent_cache(req, cmd_type)
         return done
 
-    def tick(self, pool_manager=None):
+    def _issue_idle_precharge(self, bank):
+        """
+        Overridden to invalidate the cached statuses of the precharged bank's requests.
+        """
+        super()._issue_idle_precharge(bank)
+        for req in self.queue:
+            if req.cached_cmd_type is not None and (req.channel, req.rank, req.bank) == bank.id:
+                req.cached_ready_time = None
+                req.cached_cmd_type = None
+
+    def _sync_queue(self):
+        """
+        Only numbers new requests in arrival order; the cached tick() keeps no per-bank sub-queues.
+        只依到達順序為新請求編號；快取版 tick() 不使用 Bank 子隊列。
+        """
+        for req in self.queue[self._synced:]:
+            req.seq = self._next_seq
+            self._next_seq += 1
+            if req.arrival is None:
+                req.arrival = self.current_time
+            key = self.get_bank_key(req)
+            self._count_queued(key[0], req.is_write, 1)
+            if self._track_rows:
+                demand_key = (key, req.row)
+                self._row_demand[demand_key] = self._row_demand.get(demand_key, 0) + 1
+        self._synced = len(self.queue)
+
+    def _complete(self, req, req_idx):
+        self.queue.pop(req_idx)
+        self._synced -= 1
+        self.completed_requests += 1
+        self._count_queued(req.channel, req.is_write, -1)
+        if self._track_rows:
+            self._release_row_demand((req.channel, req.rank, req.bank), req.row)
+
+    def tick(self):
         """
         Overridden tick to utilize cached command readiness.
         """
         self.stats['cumulative_queue_depth'] += len(self.queue)
         self.stats['queue_depth_samples'] += 1
-
-        candidates = []
+        self._sync_queue()
+        serve = None
+        if self.write_queue_depth:
+            self._update_write_mode()
+            serve = self._serve_writes
+            # Banks with requests of their channel's served direction (see DRAMController._held_back)
+            # 有其 Channel 服務方向請求的 Bank (見 DRAMController._held_back)
+            served_banks = {(req.channel, req.rank, req.bank) for req in self.queue if req.is_write == serve[req.channel]}
+
+        # Channel ID -> [oldest ready (idx, cmd), oldest ready RD/WR (idx, cmd), oldest ready cross-group RD/WR (idx, cmd)],
+        # in order of the oldest ready request
+        # Channel ID -> [最早的就緒候選, 最早的就緒 RD/WR 候選, 最早的就緒跨 Bank Group RD/WR 候選]，依最早就緒請求的順序排列
+        channel_candidates = {}
         min_next_time = float('inf')
         issued_channels = set()
 
         for i, req in enumerate(self.queue):
-            if 'mapped' not in req:
-                req['mapped'] = self.mapper.map_address(req['address'])
+            if req.channel is None:
+                req.map(self.mapper)
 
-            channel_id = req['mapped'].get('Channel', 0)
+            channel_id = req.channel
 
             if self.current_time < self.cmd_bus_free_time.get(channel_id, 0) or channel_id in issued_channels:
                 min_next_time = min(min_next_time, self.cmd_bus_free_time.get(channel_id, 0))
                 continue
 
             # Cache Check
-            if 'cached_ready_time' in req and 'cached_cmd_type' in req:
-                ready_time = req['cached_ready_time']
-                cmd = req['cached_cmd_type']
+            if req.cached_cmd_type is not None:
+                ready_time = req.cached_ready_time
+                cmd = req.cached_cmd_type
                 # Fast path evaluation
                 if ready_time <= self.current_time:
                     ready = True
@@ -82,189 +161,98 @@ class DRAMControllerOpt(DRAMController):
             else:
                 # Cache Miss -> Calculate and Store
                 ready, cmd, next_ts = self.get_command_status(req)
-                req['cached_ready_time'] = next_ts
-                req['cached_cmd_type'] = cmd
+                req.cached_ready_time = next_ts
+                req.cached_cmd_type = cmd
+
+            if serve is not None and self._held_back(req, cmd, (channel_id, req.rank, req.bank) in served_banks):
+                continue
 
             if ready:
-                candidates.append((i, cmd, channel_id))
+                # The queue is in arrival order, so the first ready (RD/WR) candidate of a channel is its oldest
+                # 隊列依到達順序排列，因此 Channel 的第一個就緒 (RD/WR) 候選即為最早者
+                best = channel_candidates.get(channel_id)
+                if best is None:
+                    best = channel_candidates[channel_id] = [(i, cmd), None, None]
+                if best[1] is None and cmd in ('RD', 'WR'):
+                    best[1] = (i, cmd)
+                if (self._prefer_groups and best[2] is None and cmd in ('RD', 'WR') and
+                        (req.rank, req.bank >> self.bank_group_shift) != self.last_cas_group.get(channel_id)):
+                    best[2] = (i, cmd)
             else:
                 if next_ts < min_next_time:
                     min_next_time = next_ts
 
-        if not candidates:
+        if not channel_candidates:
+            if self.page_policy != 'open':
+                issued, next_time = self._precharge_idle_banks(())
+                if issued:
+                    self.current_time += 1
+                    return
+                min_next_time = min(min_next_time, next_time)
             if min_next_time != float('inf') and min_next_time > self.current_time:
                 self.current_time = min_next_time
             else:
                 self.current_time += 1
             return
 
-        channel_candidates = {}
-        for idx, cmd, channel_id in candidates:
-            if channel_id not in channel_candidates:
-                channel_candidates[channel_id] = []
-            channel_candidates[channel_id].append((idx, cmd))
-
         selected_indices = []
 
-        for channel_id, ch_candidates in channel_candidates.items():
-            selected_idx = -1
-            selected_cmd = None
-
-            if self.scheduler_type == 'FIFO':
-                selected_idx, selected_cmd = ch_candidates[0]
-            elif self.scheduler_type == 'PageHitFirst':
-                hit_candidate = None
-                for idx, cmd in ch_candidates:
-                    if cmd in ['RD', 'WR']:
-                        hit_candidate = (idx, cmd)
-                        break
-
-                if hit_candidate:
-                    selected_idx, selected_cmd = hit_candidate
-                else:
-                    selected_idx, selected_cmd = ch_candidates[0]
-            else:
-                selected_idx, selected_cmd = ch_candidates[0]
-
-            if selected_idx != -1:
-                issued_channels.add(channel_id)
-                done = self.issue_command(selected_idx, selected_cmd)
-                if done:
-                    selected_indices.append(selected_idx)
+        for channel_id, (oldest, oldest_hit, cross_hit) in channel_candidates.items():
+            selected_idx, selected_cmd = self.select_candidate(oldest, oldest_hit, self.queue[oldest[0]], cross_hit)
+            issued_channels.add(channel_id)
+            done = self.issue_command(selected_idx, selected_cmd)
+            if done:
+                selected_indices.append(selected_idx)
 
         for idx in sorted(selected_indices, reverse=True):
-            completed_req = self.queue.pop(idx)
-            if pool_manager:
-                pool_manager.recycle(completed_req)
-            self.completed_requests += 1
+            self._complete(self.queue[idx], idx)
 
+        if self.page_policy != 'open':
+            self._precharge_idle_banks(issued_channels)
         self.current_time += 1
 
-class TraceReader:
-    """
-    Reads and parses trace files with hardware-aligned chunking.
-    讀取並解析 Trace 檔案，並進行硬體對齊的區塊切割。
-    """
-    def __init__(self, filepath, mapper, pool=None):
-        self.filepath = filepath
-        self.file = open(filepath, 'r')
-        self.mapper = mapper
-        self.pool = pool
-        self.pending_chunks = []
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        if self.pending_chunks:
-            chunk = self.pending_chunks.pop(0)
-            if self.pool is not None and len(self.pool['free']) > 0:
-                req = self.pool['free'].pop()
-                req.clear()
-                req['is_write'] = chunk['is_write']
-                req['address'] = chunk['address']
-                req['size'] = chunk['size']
-                req['beats'] = chunk['beats']
-                return req
-            else:
-                return chunk
-
-        line = self.file.readline()
-        if not line:
-            self.file.close()
-            raise StopIteration
-
-        parts = line.strip().split()
-        if not parts:
-            return self.__next__()
-
-        # Format: [R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # 格式：[R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # Data Size = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
-
-        type_str = parts[0]
-        addr_str = parts[1]
-        bus_width_log2 = int(parts[2])
-        burst_len_code = int(parts[3], 16)
-
-        is_write = 'W' in type_str
-        start_address = int(addr_str, 16)
-
-        # Calculate total Request Size
-        # 計算總請求大小
-        beats = burst_len_code + 1
-        bytes_per_beat = 2**bus_width_log2
-        total_size = bytes_per_beat * beats
-
-        curr_addr = start_address
-        remaining_size = total_size
-
-        # Max chunk size logic: Limit to 2 DRAM Burst Lengths (2BL).
-        # LPDDR4/5 Burst Length = 16. So 2 BL = 32 transfers.
-        # A single 16-beat BL on a 64-bit (8-Byte) bus is 16 * 8 = 128 Bytes.
-        # 2 BL = 2 * 128 = 256 Bytes.
-        # 最大區塊大小邏輯：限制為 2 個 DRAM Burst Length (2BL)。
-        # 單一 64-bit 匯流排的 16-beat BL 為 128 Bytes。2 BL = 256 Bytes。
-        max_chunk_size = 256
-
-        while remaining_size > 0:
-            next_boundary = self.mapper.get_next_boundary(curr_addr)
-            chunk_size = min(remaining_size, next_boundary - curr_addr, max_chunk_size)
-
-            self.pending_chunks.append({
-                'is_write': is_write,
-                'address': curr_addr,
-                'size': chunk_size,
-                'beats': chunk_size // bytes_per_beat
-            })
-
-            curr_addr += chunk_size
-            remaining_size -= chunk_size
-
-        chunk = self.pending_chunks.pop(0)
-
-        if self.pool is not None and len(self.pool['free']) > 0:
-            req = self.pool['free'].pop()
-            req.clear() # clear previous states
-            req['is_write'] = chunk['is_write']
-            req['address'] = chunk['address']
-            req['size'] = chunk['size']
-            req['beats'] = chunk['beats']
-            return req
-        else:
-            return chunk
-
-class RequestPoolManager:
-    """
-    Manages a pool of request dictionaries to prevent GC overhead.
-    """
-    def __init__(self, max_size):
-        self.pool = {
-            'free': [{} for _ in range(max_size)],
-            'max_size': max_size
-        }
-
-    def get_pool(self):
-        return self.pool
-
-    def recycle(self, req):
-        if len(self.pool['free']) < self.pool['max_size']:
-            self.pool['free'].append(req)
-
 import os
 
-def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_depth, interval_us, verbose_interval, trace_name, log_dir, log_cmd):
+def run_channel_sim(channel_id, source, config, mapping, policy, queue_depth, interval_us, verbose_interval, trace_name, log_dir, log_cmd, profile=False, fast_forward=False, checkpoint=None, age_cap=FRFCFS_AGE_CAP,
+                    controller_options=None):
     """
-    Simulates a single Channel independently by streaming the trace file.
-    This avoids loading the entire trace into memory, preventing OOM on huge files.
+    Simulates a single Channel independently by streaming its channel shard.
+    This avoids loading the entire trace into memory, preventing OOM on huge files,
+    and each worker only reads the requests of its own channel.
+    依序讀取自己 Channel 的分片來獨立模擬單一 Channel，每個 Worker 只讀取屬於自己的請求。
+    source is a shard file path or an already open reader (e.g. RingReader).
+    source 為分片檔路徑，或已開啟的讀取器 (例如 RingReader)。
+    With profile, the result also carries a Profiler summary under 'profile'.
+    若啟用 profile，結果另於 'profile' 附上 Profiler 剖析摘要。
+    checkpoint, if given, is {'checkpoint_us', 'checkpoint_dir', 'trace', 'resume'}:
+    checkpoints are written every checkpoint_us of simulated time (if set),
+    and a loaded checkpoint of this channel under 'resume' is continued.
+    若提供 checkpoint ({'checkpoint_us', 'checkpoint_dir', 'trace', 'resume'})，每隔 checkpoint_us 模擬時間寫入檢查點 (若有設定)，
+    並由 'resume' 中已載入的此 Channel 檢查點繼續執行。
+    controller_options holds the DRAMController write queue (write_queue_depth,
+    write_high, write_low), page policy (page_policy, page_timeout) and
+    auto_precharge arguments.
+    controller_options 為 DRAMController 的寫入隊列 (write_queue_depth、write_high、write_low)、Page 策略 (page_policy、page_timeout) 與 auto_precharge 參數。
     """
     mapper = AddressMapper(mapping)
-    controller = DRAMControllerOpt(config, mapper, scheduler_type=policy, queue_depth=queue_depth, log_cmd=log_cmd, channel_id=channel_id)
+    controller = DRAMControllerOpt(config, mapper, scheduler_type=policy, queue_depth=queue_depth, log_cmd=log_cmd, channel_id=channel_id, age_cap=age_cap,
+                                   **(controller_options or {}))
+
+    trace_iter = iter(ShardReader(source) if isinstance(source, str) else source)
 
-    # Initialize Object Pool to avoid Python GC lag on huge traces
-    pool_manager = RequestPoolManager(queue_depth * 2)
-    trace_reader = TraceReader(trace_filepath, mapper, pool=pool_manager.get_pool())
-    trace_iter = iter(trace_reader)
+    # Requests taken from the channel stream so far: the reader position stored in checkpoints
+    # 目前已從 Channel 串流取出的請求數：即檢查點中保存的讀取位置
+    consumed = 0
+    resumed = checkpoint['resume'] if checkpoint is not None else None
+    if resumed is not None:
+        restore_controller(controller, resumed['state'])
+        consumed = resumed['position']
+        next(itertools.islice(trace_iter, consumed, consumed), None)
+
+    profiler = Profiler() if profile else None
+    if profiler is not None:
+        profiler.instrument_controller(controller)
+        trace_iter = profiler.instrument_iter('trace_read', trace_iter)
 
     interval_log_file = None
     interval_cycles = None
@@ -292,67 +280,98 @@ def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_d
             print(f"[CH{channel_id}] Interval Logging Enabled: {interval_us} us (approx {int(interval_cycles)} cycles)")
         interval_log_file.write(f"Interval Logging Enabled: {interval_us} us\n")
         interval_log_file.write(f"Interval (us), Utilization (%), Completed AXI Reqs, Interval Bytes, Idle Cycles\n")
+        if resumed is not None:
+            interval_count, next_interval_cycle, last_bus_busy_cycles, last_completed_reqs, last_total_bytes = resume_interval(
+                resumed['driver'], interval_us, interval_cycles, controller)
+
+    checkpoint_cycles = None
+    next_checkpoint_cycle = None
+    if checkpoint is not None and checkpoint['checkpoint_us'] is not None:
+        checkpoint_cycles = checkpoint['checkpoint_us'] * 1000.0 / (1000.0 / config['ClockFrequencyMHz'])
+        next_checkpoint_cycle = checkpoint_cycles
+        if resumed is not None:
+            next_checkpoint_cycle = next_checkpoint(resumed['driver'], checkpoint['checkpoint_us'], checkpoint_cycles, controller.current_time)
 
-    next_req = None
     eof_reached = False
+    # Request read from the stream but not yet admitted (its queue is full)
+    # 已從串流讀出但尚未進入隊列的請求 (其隊列已滿)
+    next_req = None
 
-    while not eof_reached or len(controller.queue) > 0:
-        # Fill Queue up to depth
-        while not eof_reached and len(controller.queue) < queue_depth:
+    def fill_queue():
+        nonlocal eof_reached, consumed, next_req
+        while not eof_reached:
             if next_req is None:
+                # Shard requests are pre-mapped and all belong to this channel
+                # 分片中的請求皆已映射且全部屬於此 Channel
                 next_req = next(trace_iter, None)
                 if next_req is None:
                     eof_reached = True
                     break
+            if not controller.has_room(next_req):
+                break
+            controller.queue.append(next_req)
+            next_req = None
+            consumed += 1
 
-            # Process map address to see if it belongs to this worker's channel
-            mapped = mapper.map_address(next_req['address'])
-            req_ch = mapped['Channel']
-
-            if req_ch == channel_id:
-                next_req['mapped'] = mapped
-                controller.queue.append(next_req)
-                next_req = None # Consume it
-            else:
-                pool_manager.recycle(next_req)
-                next_req = None # Discard it, belongs to another channel
+    while not eof_reached or len(controller.queue) > 0:
+        # Fill Queue up to depth
+        fill_queue()
 
         # Tick even if queue might not be fully populated yet
-        # (or if we hit EOF and just need to drain)
-        controller.tick(pool_manager=pool_manager)
+        # (or if we hit EOF and just need to drain); with fast_forward a
+        # row-hit streak runs in one batch, up to the next interval or checkpoint boundary
+        # 使用 fast_forward 時，Row 命中連續段以單一批次執行，直到下一個區間或檢查點邊界
+        if not (fast_forward and controller.fast_forward(fill_queue, min(
+                (cycle for cycle in (next_interval_cycle, next_checkpoint_cycle) if cycle is not None), default=None))):
+            controller.tick()
 
         # Interval utilization logging
         if interval_cycles is not None and controller.current_time >= next_interval_cycle:
-            current_bus_busy_cycles = controller.stats['bus_busy_cycles']
-            interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
-
-            current_completed_reqs = controller.completed_requests
-            interval_reqs = current_completed_reqs - last_completed_reqs
-
-            current_total_bytes = controller.stats['total_bytes']
-            interval_bytes = current_total_bytes - last_total_bytes
-
-            # Since this controller is ONLY processing ONE channel:
-            interval_total_available = interval_cycles * 1
-            interval_idle_cycles = max(0, interval_total_available - interval_busy)
-
-            # Clamp utilization to 100% to handle burst durations crossing the interval boundary
-            capped_busy = min(interval_busy, interval_total_available)
-            interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
-            interval_time_us = interval_us * interval_count
-            # 強制轉換為整數並加入千分位逗號，避免科學記號
-            formatted_time = f"{int(interval_time_us):,}"
-
-            if verbose_interval:
-                msg = f"[CH{channel_id}] Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
-                print(msg)
-            interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
-
-            last_bus_busy_cycles = current_bus_busy_cycles
-            last_completed_reqs = current_completed_reqs
-            last_total_bytes = current_total_bytes
-            interval_count += 1
-            next_interval_cycle += interval_cycles
+            with phase(profiler, 'interval_log'):
+                current_bus_busy_cycles = controller.stats['bus_busy_cycles']
+                interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
+
+                current_completed_reqs = controller.completed_requests
+                interval_reqs = current_completed_reqs - last_completed_reqs
+
+                current_total_bytes = controller.stats['total_bytes']
+                interval_bytes = current_total_bytes - last_total_bytes
+
+                # Since this controller is ONLY processing ONE channel:
+                interval_total_available = interval_cycles * 1
+                interval_idle_cycles = max(0, interval_total_available - interval_busy)
+
+                # Clamp utilization to 100% to handle burst durations crossing the interval boundary
+                capped_busy = min(interval_busy, interval_total_available)
+                interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
+                interval_time_us = interval_us * interval_count
+                # 強制轉換為整數並加入千分位逗號，避免科學記號
+                formatted_time = f"{int(interval_time_us):,}"
+
+                if verbose_interval:
+                    msg = f"[CH{channel_id}] Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
+                    print(msg)
+                interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
+
+                last_bus_busy_cycles = current_bus_busy_cycles
+                last_completed_reqs = current_completed_reqs
+                last_total_bytes = current_total_bytes
+                interval_count += 1
+                next_interval_cycle += interval_cycles
+
+        # Periodic checkpoint
+        # 週期性檢查點
+        if checkpoint_cycles is not None and controller.current_time >= next_checkpoint_cycle:
+            while next_checkpoint_cycle <= controller.current_time:
+                next_checkpoint_cycle += checkpoint_cycles
+            driver = {'channel_id': channel_id, 'checkpoint_us': checkpoint['checkpoint_us'], 'next_checkpoint_cycle': next_checkpoint_cycle, 'interval': None}
+            if interval_cycles is not None:
+                driver['interval'] = {
+                    'interval_us': interval_us, 'interval_count': interval_count, 'next_interval_cycle': next_interval_cycle,
+                    'last_bus_busy_cycles': last_bus_busy_cycles, 'last_completed_reqs': last_completed_reqs, 'last_total_bytes': last_total_bytes,
+                }
+            save_checkpoint(checkpoint_path(checkpoint['checkpoint_dir'], f"{trace_name}_CH{channel_id}", controller.current_time),
+                            controller, consumed, driver, checkpoint['trace'])
 
     if interval_log_file is not None:
         interval_log_file.close()
@@ -366,11 +385,14 @@ def run_channel_sim(channel_id, trace_filepath, config, mapping, policy, queue_d
     total_cycles = max(controller.current_time, max_data_bus_free_time)
     total_cycles = max(1, total_cycles)
 
-    return {
+    result = {
         'channel_id': channel_id,
         'total_cycles': total_cycles,
         'stats': stats
     }
+    if profiler is not None:
+        result['profile'] = profiler.finish(controller)
+    return result
 
 
 def main():
@@ -378,12 +400,29 @@ def main():
     parser.add_argument('--config', required=True, help='Path to timing config JSON (時序設定檔路徑)')
     parser.add_argument('--mapping', required=True, help='Path to address mapping JSON (位址映射檔路徑)')
     parser.add_argument('--trace', required=True, help='Path to trace file (Trace 檔案路徑)')
-    parser.add_argument('--policy', default='PageHitFirst', choices=['FIFO', 'PageHitFirst'], help='Scheduling policy (排程策略)')
+    parser.add_argument('--policy', default='PageHitFirst', choices=list(POLICIES), help='Scheduling policy (排程策略)')
     parser.add_argument('--queue_depth', type=int, default=16, help='Command queue depth (指令隊列深度)')
+    parser.add_argument('--age_cap', type=int, default=FRFCFS_AGE_CAP, help='FRFCFS: cycles a request may wait before row hits stop bypassing it (FRFCFS：請求等待超過此週期數後，Row 命中不再可越過它)')
+    parser.add_argument('--write_queue_depth', type=int, default=0, help='Per-channel write queue depth, 0 = reads and writes share --queue_depth (每 Channel 獨立寫入隊列深度，0 = 讀寫共用 --queue_depth)')
+    parser.add_argument('--write_high', type=int, default=None, help='Queued writes of a channel that start its write drain, default 3/4 of the write queue (Channel 開始排空寫入的寫入筆數，預設為寫入隊列的 3/4)')
+    parser.add_argument('--write_low', type=int, default=None, help='Queued writes of a channel that end its write drain, default 1/4 of the write queue (Channel 結束排空寫入的寫入筆數，預設為寫入隊列的 1/4)')
+    parser.add_argument('--page_policy', default='open', choices=list(PAGE_POLICIES), help='Page policy: open, closed (precharge once no queued request hits the row) or adaptive (precharge after an idle timeout) (Page 策略：open、closed (沒有隊列請求命中該 Row 即預充電) 或 adaptive (閒置逾時後預充電))')
+    parser.add_argument('--page_timeout', type=int, default=PAGE_TIMEOUT, help='Adaptive page policy: initial idle cycles before a bank is precharged (adaptive Page 策略：Bank 預充電前的初始閒置週期數)')
+    parser.add_argument('--auto_precharge', action='store_true', help='Issue the last queued RD/WR to a row as RDA/WRA, closing it without a PRE command (對 Row 的最後一個隊列 RD/WR 以 RDA/WRA 發出，不需 PRE 指令即關閉該 Row)')
+    parser.add_argument('--fast_forward', action='store_true', help='Issue row-hit streaks in one batch, same results (Row 命中連續段批次發出，結果相同)')
     parser.add_argument('--interval_us', type=float, default=None, help='Interval in microseconds for calculating utilization (計算利用率的時間區間，單位為 us)')
     parser.add_argument('--verbose_interval', action='store_true', help='Print interval utilization to console with [CHx] tag (在終端機印出帶有 [CHx] 標籤的區間利用率)')
+    parser.add_argument('--chunk_block', type=int, default=0, help='Chunk and map the trace with NumPy in blocks of N transactions, 0 = per-transaction reader (以 NumPy 每 N 筆交易為一批進行切割與映射，0 = 逐筆讀取)')
+    parser.add_argument('--shard_dir', type=str, default=None, help='Directory to keep the per-channel shard files; defaults to a temporary directory removed after the run (保留各 Channel 分片檔的資料夾，預設為執行後刪除的暫存資料夾)')
+    parser.add_argument('--index', action='store_true', help='Use the trace sidecar index, building it on first use; with --shard_dir, shards matching the index are reused instead of re-sharding (使用 Trace 旁路索引，首次使用時建立；搭配 --shard_dir 時重複使用符合索引的分片而不重新分片)')
+    parser.add_argument('--fanout', default='shard', choices=['shard', 'shm'], help='How requests reach the channel workers: on-disk shards or shared-memory ring buffers (請求送往各 Channel Worker 的方式：磁碟分片或共享記憶體環形緩衝區)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results as JSON to this file (另將結果以 JSON 格式寫入此檔案)')
+    parser.add_argument('--profile', action='store_true', help='Report wall time per phase, throughput and peak RSS for the parent and every channel worker (回報主行程與各 Channel Worker 的各階段執行時間、吞吐量與峰值記憶體)')
     parser.add_argument('--log_dir', type=str, default='.', help='Directory to save the interval log files (存放 interval log 檔案的資料夾)')
     parser.add_argument('--log_cmd', action='store_true', help='Enable pipeline command logging (啟用管線指令日誌)')
+    parser.add_argument('--checkpoint_us', type=float, default=None, help='Write a checkpoint per channel every N microseconds of simulated time (每隔 N 微秒模擬時間為每個 Channel 寫入檢查點)')
+    parser.add_argument('--checkpoint_dir', type=str, default='.', help='Directory to save the checkpoint files (存放檢查點檔案的資料夾)')
+    parser.add_argument('--resume', nargs='+', default=None, help='Resume from these checkpoint files, one per active channel (由這些檢查點檔繼續執行，每個啟用的 Channel 一個)')
 
     args = parser.parse_args()
 
@@ -399,58 +438,158 @@ def main():
     # Initialize Components
     # 初始化元件
     mapper = AddressMapper(mapping)
-    controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth)
-
-    # Fast Pre-scan to discover active channels in the trace
-    # 快速掃描找出 Trace 到底用到了哪些 Channel，避免啟動不需要的 Worker
-    active_channels = set()
-    mapper = AddressMapper(mapping)
+    controller_options = {'write_queue_depth': args.write_queue_depth, 'write_high': args.write_high, 'write_low': args.write_low,
+                          'page_policy': args.page_policy, 'page_timeout': args.page_timeout, 'auto_precharge': args.auto_precharge}
+    try:
+        controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth, **controller_options)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
 
-    with open(args.trace, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            if not parts:
-                continue
-            addr_str = parts[1]
-            address = int(addr_str, 16)
-
-            # Use hardware chunking logic during pre-scan to correctly identify active channels
-            # 在快速掃描時使用硬體切割邏輯，以正確找出被啟用的 Channel
-            bus_width_log2 = int(parts[2])
-            burst_len_code = int(parts[3], 16)
-            beats = burst_len_code + 1
-            bytes_per_beat = 2**bus_width_log2
-            total_size = bytes_per_beat * beats
-
-            curr_addr = address
-            remaining_size = total_size
-            while remaining_size > 0:
-                mapped = mapper.map_address(curr_addr)
-                active_channels.add(mapped['Channel'])
-
-                next_boundary = mapper.get_next_boundary(curr_addr)
-                chunk_size = min(remaining_size, next_boundary - curr_addr)
-                curr_addr += chunk_size
-                remaining_size -= chunk_size
-
-    print(f"Starting parallel simulation with {args.config} and {args.mapping}")
-    print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
-    print(f"Detected {len(active_channels)} active channel(s) in trace: {active_channels}")
-
-    # Multiprocessing Pool Setup
+    # Single-pass sharding: read, chunk and map the trace once, writing one
+    # shard per channel. The channels seen are the active channels, so no
+    # separate pre-scan is needed and workers never re-parse the trace.
+    # 單次分片：只讀取、切割並映射 Trace 一次，為每個 Channel 寫出一個分片。
+    # 出現過的 Channel 即為啟用的 Channel，不需另外快速掃描，Worker 也不必重新解析 Trace。
     trace_base_name = os.path.splitext(os.path.basename(args.trace))[0]
 
-    pool_args = []
-    for ch_id in active_channels:
-        pool_args.append((
-            ch_id, args.trace, config, mapping, args.policy, args.queue_depth, args.interval_us, args.verbose_interval, trace_base_name, args.log_dir, args.log_cmd
-        ))
-
-    # Determine optimal number of processes
-    num_processes = min(len(active_channels), multiprocessing.cpu_count())
-
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.starmap(run_channel_sim, pool_args)
+    # Opt-in self-profiling of the parent (reading, mapping and distributing the
+    # trace); workers profile their own simulation loops.
+    # 選用的主行程自身效能剖析 (讀取、映射與分送 Trace)；各 Worker 自行剖析其模擬迴圈。
+    profiler = Profiler() if args.profile else None
+    if profiler is not None:
+        profiler.instrument_mapper(mapper)
+
+    # Checkpoints: every worker writes its own channel's files and resumes from its own one
+    # 檢查點：每個 Worker 寫出自己 Channel 的檔案，並由自己的檢查點繼續
+    resumed = {}
+    if args.checkpoint_us is not None or args.resume is not None:
+        trace_index = get_index(args.trace, mapping)
+        trace_info = {'path': args.trace, 'sha256': trace_index.trace['sha256']}
+        try:
+            for path in args.resume or []:
+                data = load_checkpoint(path)
+                if data['trace']['sha256'] != trace_info['sha256']:
+                    raise ValueError(f"Checkpoint was taken on a different trace: {path}")
+                restore_controller(DRAMControllerOpt(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth, age_cap=args.age_cap,
+                                                      **controller_options), data['state'])
+                resumed[data['driver']['channel_id']] = data
+                print(f"Resumed channel {data['driver']['channel_id']} from {path} at cycle {data['state']['current_time']}")
+            if args.resume is not None and set(resumed) != trace_index.active_channels:
+                raise ValueError(f"Checkpoints cover channel(s) {sorted(resumed)}, the trace uses {sorted(trace_index.active_channels)}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading checkpoint: {e}")
+            return
+        if args.checkpoint_us is not None:
+            os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    def channel_checkpoint(ch_id):
+        if args.checkpoint_us is None and args.resume is None:
+            return None
+        return {'checkpoint_us': args.checkpoint_us, 'checkpoint_dir': args.checkpoint_dir, 'trace': trace_info, 'resume': resumed.get(ch_id)}
+
+    def open_trace_reader():
+        if args.chunk_block > 0:
+            trace_reader = BlockTraceReader(args.trace, mapper, block_size=args.chunk_block)
+        elif is_binary_trace(args.trace):
+            trace_reader = BinaryTraceReader(args.trace, mapper)
+        else:
+            trace_reader = TraceReader(args.trace, mapper)
+        if profiler is not None:
+            return profiler.instrument_iter('trace_parse', trace_reader)
+        return trace_reader
+
+    if args.fanout == 'shm':
+        # Streaming fan-out: this process is the single producer and pushes the
+        # mapped requests into one shared-memory ring per channel. A worker is
+        # started for each channel on its first request and consumes its ring
+        # concurrently, so every channel runs at once (no pool size limit).
+        # 串流分送：此行程為唯一的生產者，將映射後的請求寫入每個 Channel 的共享記憶體環形緩衝區。
+        # 每個 Channel 在第一個請求出現時啟動 Worker 並同時消費，因此所有 Channel 同時執行 (不受行程池大小限制)。
+        print(f"Starting parallel simulation with {args.config} and {args.mapping}")
+        print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
+        if controller.write_queue_depth:
+            print(f"Write Queue Depth: {controller.write_queue_depth}, Watermarks: high {controller.write_high}, low {controller.write_low}")
+        if controller.page_policy != 'open':
+            print(f"Page Policy: {controller.page_policy}" + (f", Timeout: {controller.page_timeout}" if controller.page_policy == 'adaptive' else ""))
+        if controller.auto_precharge:
+            print("Auto-Precharge: RDA/WRA")
+
+        result_queue = multiprocessing.Queue()
+
+        def start_worker(ch_id, ring):
+            worker = multiprocessing.Process(target=ring_worker, args=(
+                result_queue, run_channel_sim, ch_id, ring, config, mapping, args.policy, args.queue_depth, args.interval_us, args.verbose_interval, trace_base_name, args.log_dir, args.log_cmd, args.profile, args.fast_forward,
+                channel_checkpoint(ch_id), args.age_cap, controller_options
+            ))
+            worker.start()
+            return worker
+
+        with phase(profiler, 'fanout'):
+            channels = fan_out_trace(open_trace_reader(), mapper, start_worker)
+        active_channels = set(channels)
+        print(f"Detected {len(active_channels)} active channel(s) in trace: {active_channels}")
+
+        results = None
+        try:
+            with phase(profiler, 'workers'):
+                results = collect_ring_results(result_queue, channels)
+        finally:
+            for ring, worker in channels.values():
+                if results is None:
+                    worker.terminate()
+                worker.join()
+                ring.release()
+    else:
+        shard_dir = args.shard_dir if args.shard_dir else tempfile.mkdtemp(prefix='dram_shards_')
+        try:
+            # With the sidecar index, a rerun on the same trace and mapping finds the
+            # kept shards still valid and skips the sharding pass altogether.
+            # 使用旁路索引時，對相同 Trace 與 mapping 重新執行會發現保留的分片仍有效，因而完全略過分片階段。
+            shards = None
+            index = get_index(args.trace, mapping) if args.index else None
+            if index is not None and args.shard_dir:
+                source = {'trace_sha256': index.trace['sha256'], 'mapping_key': index.mapping_key}
+                shards = load_shards(shard_dir, trace_base_name, source)
+                if shards is not None and set(shards) == index.active_channels:
+                    print(f"Reusing {len(shards)} shard(s) from {shard_dir}")
+                else:
+                    shards = None
+
+            if shards is None:
+                with phase(profiler, 'shard'):
+                    shards = shard_trace(open_trace_reader(), mapper, shard_dir, prefix=trace_base_name)
+                if index is not None and args.shard_dir:
+                    write_shard_manifest(shard_dir, trace_base_name, shards, source)
+            active_channels = set(shards)
+
+            print(f"Starting parallel simulation with {args.config} and {args.mapping}")
+            print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
+            if controller.write_queue_depth:
+                print(f"Write Queue Depth: {controller.write_queue_depth}, Watermarks: high {controller.write_high}, low {controller.write_low}")
+            if controller.page_policy != 'open':
+                print(f"Page Policy: {controller.page_policy}" + (f", Timeout: {controller.page_timeout}" if controller.page_policy == 'adaptive' else ""))
+            if controller.auto_precharge:
+                print("Auto-Precharge: RDA/WRA")
+            print(f"Detected {len(active_channels)} active channel(s) in trace: {active_channels}")
+
+            # Multiprocessing Pool Setup
+            pool_args = []
+            for ch_id in active_channels:
+                pool_args.append((
+                    ch_id, shards[ch_id][0], config, mapping, args.policy, args.queue_depth, args.interval_us, args.verbose_interval, trace_base_name, args.log_dir, args.log_cmd, args.profile, args.fast_forward,
+                    channel_checkpoint(ch_id), args.age_cap, controller_options
+                ))
+
+            # Determine optimal number of processes
+            num_processes = min(len(active_channels), multiprocessing.cpu_count())
+
+            with multiprocessing.Pool(processes=num_processes) as pool:
+                with phase(profiler, 'workers'):
+                    results = pool.starmap(run_channel_sim, pool_args)
+        finally:
+            if not args.shard_dir:
+                shutil.rmtree(shard_dir, ignore_errors=True)
 
     # ------------------------------------------------------------------------
     # Aggregate and Print Results
@@ -467,6 +606,9 @@ def main():
     total_page_hits = 0
     total_page_misses = 0
     total_page_conflicts = 0
+    total_turnarounds = 0
+    total_idle_precharges = 0
+    total_auto_precharges = 0
 
     print("\n--- Per-Channel Statistics (個別通道統計) ---")
     for res in sorted(results, key=lambda x: x['channel_id']):
@@ -487,6 +629,11 @@ def main():
         print(f"  Bandwidth: {ch_bw_gbs:.2f} GB/s")
         print(f"  Utilization: {ch_utilization:.2f} %")
         print(f"  Avg Queue Depth: {ch_avg_qd:.2f}")
+        print(f"  Bus Turnarounds: {ch_stats['turnarounds']}")
+        if controller.page_policy != 'open':
+            print(f"  Idle Precharges: {ch_stats['idle_precharges']}")
+        if controller.auto_precharge:
+            print(f"  Auto Precharges: {ch_stats['auto_precharges']}")
 
         # Aggregation for Overall
         overall_max_cycles = max(overall_max_cycles, ch_cycles)
@@ -495,6 +642,9 @@ def main():
         total_page_hits += ch_stats['page_hits']
         total_page_misses += ch_stats['page_misses']
         total_page_conflicts += ch_stats['page_conflicts']
+        total_turnarounds += ch_stats['turnarounds']
+        total_idle_precharges += ch_stats['idle_precharges']
+        total_auto_precharges += ch_stats['auto_precharges']
 
     overall_max_cycles = max(1, overall_max_cycles)
     num_active_channels = len(results)
@@ -520,6 +670,31 @@ def main():
     print(f"Page Hits (Page 命中): {total_page_hits}")
     print(f"Page Misses (Page 未命中): {total_page_misses}")
     print(f"Page Conflicts (Page 衝突): {total_page_conflicts}")
+    print(f"Bus Turnarounds (匯流排轉向次數): {total_turnarounds}")
+    if controller.page_policy != 'open':
+        print(f"Idle Precharges (閒置預充電次數): {total_idle_precharges}")
+    if controller.auto_precharge:
+        print(f"Auto Precharges (自動預充電次數): {total_auto_precharges}")
+
+    if profiler is not None:
+        # Parent phases only; worker time appears under 'workers' as waiting
+        # 僅含主行程階段；Worker 的執行時間在 'workers' 中以等待時間呈現
+        profiler.finish()
+        print()
+        print(format_profile(profiler.summary, 'Profile: Parent (效能剖析：主行程)'))
+        for res in sorted(results, key=lambda x: x['channel_id']):
+            print()
+            print(format_profile(res['profile'], f"Profile: CH{res['channel_id']} (效能剖析：CH{res['channel_id']})"))
+
+    if args.json:
+        data = result_from_channels(config, results, controller.write_queue_config(), controller.page_policy_config(), controller.auto_precharge).to_dict()
+        if profiler is not None:
+            data['profile'] = {
+                'parent': profiler.summary,
+                'channels': [res['profile'] for res in sorted(results, key=lambda x: x['channel_id'])],
+            }
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
 
 if __name__ == "__main__":
     main()
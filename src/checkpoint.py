@@ -0,0 +1,232 @@
+import gzip
+import json
+import os
+
+from chunker import iter_chunks
+from dram_sim import SIM_VERSION, BankState
+from request import Request
+from trace_bin import iter_transactions
+from trace_index import get_index, iter_transactions_from
+
+# ----------------------------------------------------------------------------
+# Controller checkpoints (控制器檢查點)
+#
+# A checkpoint is a gzip-compressed JSON file holding the complete state of a
+# DRAMController / DRAMControllerOpt: banks, bus free times and directions,
+# act_history, the bank group timing state, the queued requests, stats and the clock, together with the
+# trace reader position and the driver's interval/checkpoint counters.
+# Only primary state is stored. The per-bank sub-queues and the event engine
+# and DRAMControllerOpt readiness caches are derived from it and rebuilt on
+# the next step, so a resumed run is bit-identical to an uninterrupted one.
+# 檢查點為 gzip 壓縮的 JSON 檔，保存 DRAMController / DRAMControllerOpt 的完整狀態：Bank、匯流排閒置時間與方向、
+# act_history、Bank Group 時序狀態、隊列中的請求、統計與時鐘，以及 Trace 讀取位置與驅動端的區間/檢查點計數器。
+# 只保存原始狀態；Bank 子隊列、事件引擎與 DRAMControllerOpt 的就緒快取皆由其推導，於下一步重建，
+# 因此由檢查點繼續的執行與未中斷的執行結果完全相同。
+#
+# <dir>/<name>_c<cycle>.ckpt    one file per checkpoint, named by simulated cycle
+# ----------------------------------------------------------------------------
+
+CHECKPOINT_VERSION = 7
+
+# Request fields stored per queued request; the mapped fields are recomputed on restore
+# 每個隊列請求保存的欄位；映射欄位於還原時重新計算
+REQUEST_FIELDS = ('is_write', 'address', 'size', 'beats', 'status', 'arrival')
+BANK_FIELDS = ('is_open', 'open_row', 'last_act', 'last_pre', 'last_read', 'last_write', 'idle_timeout', 'idle_closed_row')
+
+
+def controller_state(controller):
+    """
+    Returns the primary state of a controller as JSON-serializable data.
+    以可序列化為 JSON 的資料回傳控制器的原始狀態。
+    """
+    # JSON object keys are strings, so Channel / (Channel, Rank) keyed dicts become lists
+    # JSON 物件的鍵值必須為字串，因此以 Channel / (Channel, Rank) 為鍵值的字典改存為列表
+    return {
+        'controller': type(controller).__name__,
+        'config': controller.config,
+        'mapping': controller.mapper.mapping,
+        'scheduler_type': controller.scheduler_type,
+        'queue_depth': controller.queue_depth,
+        'age_cap': controller.age_cap,
+        'write_queue': controller.write_queue_config(),
+        'page_policy': controller.page_policy_config(),
+        'auto_precharge': controller.auto_precharge,
+        'write_draining': sorted(ch for ch, draining in controller.write_draining.items() if draining),
+        'current_time': controller.current_time,
+        'completed_requests': controller.completed_requests,
+        'stats': controller.stats,
+        'channel_stats': sorted(controller.channel_stats.items()),
+        'data_bus_free_time': sorted(controller.data_bus_free_time.items()),
+        'cmd_bus_free_time': sorted(controller.cmd_bus_free_time.items()),
+        'last_data_dir': sorted(controller.last_data_dir.items()),
+        'act_history': [[ch, rank, history] for (ch, rank), history in sorted(controller.act_history.items())],
+        'group_last_act': [list(key) + [t] for key, t in sorted(controller.group_last_act.items())],
+        'group_last_cas': [list(key) + [t] for key, t in sorted(controller.group_last_cas.items())],
+        'rank_last_cas': [list(key) + [t] for key, t in sorted(controller.rank_last_cas.items())],
+        'last_cas_group': [[ch, rank, group] for ch, (rank, group) in sorted(controller.last_cas_group.items())],
+        'banks': [list(key) + [getattr(bank, field) for field in BANK_FIELDS] for key, bank in sorted(controller.banks.items())],
+        'queue': [[getattr(req, field) for field in REQUEST_FIELDS] for req in controller.queue],
+    }
+
+
+def restore_controller(controller, state, allow_changes=()):
+    """
+    Loads controller_state() data into a freshly constructed controller.
+    將 controller_state() 資料載入新建立的控制器。
+    Raises ValueError if the controller's config, mapping, policy, queue
+    depth, age cap, write queue, page policy or auto-precharge differ from the checkpoint, except for the fields named in
+    allow_changes (e.g. ('config', 'scheduler_type') for a what-if branch).
+    若控制器的 config、mapping、排程策略、隊列深度、age cap、寫入隊列、Page 策略或自動預充電與檢查點不同，拋出 ValueError；
+    allow_changes 中列出的欄位除外 (例如 what-if 分支的 ('config', 'scheduler_type'))。
+    """
+    for field, current in (('config', controller.config), ('mapping', controller.mapper.mapping),
+                           ('scheduler_type', controller.scheduler_type), ('queue_depth', controller.queue_depth),
+                           ('age_cap', controller.age_cap), ('write_queue', controller.write_queue_config()),
+                           ('page_policy', controller.page_policy_config()), ('auto_precharge', controller.auto_precharge)):
+        if field not in allow_changes and json.loads(json.dumps(current)) != json.loads(json.dumps(state[field])):
+            raise ValueError(f"Checkpoint {field} does not match this run")
+    if controller.queue or controller.completed_requests:
+        raise ValueError("Checkpoints can only be restored into a fresh controller")
+
+    controller.current_time = state['current_time']
+    controller.completed_requests = state['completed_requests']
+    controller.write_draining = {ch: True for ch in state['write_draining']}
+    controller.stats = dict(state['stats'])
+    controller.channel_stats = {ch: dict(ch_stats) for ch, ch_stats in state['channel_stats']}
+    controller.data_bus_free_time = dict(state['data_bus_free_time'])
+    controller.cmd_bus_free_time = dict(state['cmd_bus_free_time'])
+    controller.last_data_dir = dict(state['last_data_dir'])
+    controller.act_history = {(ch, rank): list(history) for ch, rank, history in state['act_history']}
+    controller.group_last_act = {(ch, rank, group): t for ch, rank, group, t in state['group_last_act']}
+    controller.group_last_cas = {(ch, rank, group): t for ch, rank, group, t in state['group_last_cas']}
+    controller.rank_last_cas = {(ch, rank): t for ch, rank, t in state['rank_last_cas']}
+    controller.last_cas_group = {ch: (rank, group) for ch, rank, group in state['last_cas_group']}
+
+    controller.banks = {}
+    for entry in state['banks']:
+        key = tuple(entry[:3])
+        bank = controller.banks[key] = BankState(key, controller.config)
+        for field, value in zip(BANK_FIELDS, entry[3:]):
+            setattr(bank, field, value)
+
+    mapper = controller.mapper
+    for entry in state['queue']:
+        is_write, address, size, beats, status, arrival = entry
+        req = Request(is_write, address, size, beats).map(mapper)
+        req.status = status
+        req.arrival = arrival
+        controller.queue.append(req)
+    return controller
+
+
+class PositionedTraceReader:
+    """
+    Trace reader that knows the position of every Request it yields and can start from one.
+    可得知每個產生之 Request 的位置，並可從指定位置開始的 Trace 讀取器。
+    A position is (transaction index, chunk index within the transaction).
+    Starting past the beginning seeks with the trace sidecar index (see
+    trace_index.py) instead of re-reading the skipped part.
+    位置為 (交易索引, 交易內的區塊索引)。從中間開始時以 Trace 旁路索引 (見 trace_index.py) 跳轉，不重新讀取略過的部分。
+    """
+    def __init__(self, filepath, mapper, start=(0, 0), index=None):
+        self.filepath = filepath
+        start_transaction, self._skip = start
+        if start_transaction > 0:
+            transactions = iter_transactions_from(filepath, index if index is not None else get_index(filepath), start_transaction)
+        else:
+            transactions = iter_transactions(filepath)
+        self._transaction = start_transaction - 1
+        self._chunk = -1
+        self.position = None
+        self._chunks = iter_chunks(self._counted(transactions), mapper)
+
+    def _counted(self, transactions):
+        for transaction in transactions:
+            self._transaction += 1
+            self._chunk = -1
+            yield transaction
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            req = next(self._chunks)
+            self._chunk += 1
+            if self._skip:
+                self._skip -= 1
+                continue
+            self.position = (self._transaction, self._chunk)
+            return req
+
+
+def checkpoint_path(checkpoint_dir, name, cycle):
+    return os.path.join(checkpoint_dir, f"{name}_c{cycle}.ckpt")
+
+
+def save_checkpoint(path, controller, position, driver=None, trace=None):
+    """
+    Writes a checkpoint atomically.
+    以原子方式寫入檢查點。
+    position is where the driver's trace reader resumes (None once the trace
+    is exhausted); driver holds the driver's own counters (interval logging,
+    next checkpoint); trace identifies the trace, e.g. {'path', 'sha256'}.
+    position 為驅動端 Trace 讀取器繼續的位置 (Trace 讀完後為 None)；driver 保存驅動端自身的計數器 (區間日誌、下一個檢查點)；
+    trace 用於識別 Trace，例如 {'path', 'sha256'}。
+    """
+    data = {
+        'version': CHECKPOINT_VERSION,
+        'sim_version': SIM_VERSION,
+        'trace': trace,
+        'position': position,
+        'driver': driver or {},
+        'state': controller_state(controller),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, 'wt') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(path):
+    """
+    Reads a checkpoint; raises ValueError if it was written by another checkpoint format or simulator version.
+    讀取檢查點；若由其他檢查點格式或模擬器版本寫入，拋出 ValueError。
+    """
+    with gzip.open(path, 'rt') as f:
+        data = json.load(f)
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {data.get('version')}: {path}")
+    if data.get('sim_version') != SIM_VERSION:
+        raise ValueError(f"Checkpoint was written by simulator version {data.get('sim_version')}, this is {SIM_VERSION}: {path}")
+    if data['position'] is not None:
+        data['position'] = tuple(data['position']) if isinstance(data['position'], list) else data['position']
+    return data
+
+
+def resume_interval(driver, interval_us, interval_cycles, controller):
+    """
+    Returns (interval_count, next_interval_cycle, last_bus_busy_cycles, last_completed_reqs, last_total_bytes) for a resumed run.
+    回傳由檢查點繼續的執行所用的 (interval_count, next_interval_cycle, last_bus_busy_cycles, last_completed_reqs, last_total_bytes)。
+    With the interval of the checkpointed run, its counters continue exactly;
+    otherwise intervals restart at the next boundary after the checkpoint.
+    與檢查點執行使用相同區間時，其計數器完全延續；否則區間從檢查點後的下一個邊界重新開始。
+    """
+    saved = driver.get('interval')
+    if saved is not None and saved['interval_us'] == interval_us:
+        return (saved['interval_count'], saved['next_interval_cycle'], saved['last_bus_busy_cycles'],
+                saved['last_completed_reqs'], saved['last_total_bytes'])
+    interval_count = int(controller.current_time // interval_cycles) + 1
+    return (interval_count, interval_count * interval_cycles, controller.stats['bus_busy_cycles'],
+            controller.completed_requests, controller.stats['total_bytes'])
+
+
+def next_checkpoint(driver, checkpoint_us, checkpoint_cycles, current_time):
+    """
+    Returns the cycle of the first checkpoint after current_time, continuing the checkpointed run's schedule when the period matches.
+    回傳 current_time 之後第一個檢查點的週期；週期相同時延續檢查點執行的排程。
+    """
+    if driver.get('checkpoint_us') == checkpoint_us:
+        return driver['next_checkpoint_cycle']
+    return (int(current_time // checkpoint_cycles) + 1) * checkpoint_cycles
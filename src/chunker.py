@@ -0,0 +1,208 @@
+from request import Request
+from trace_bin import BinaryTrace, is_binary_trace, iter_transactions, parse_text_line
+
+# Max chunk size logic: Limit to 2 DRAM Burst Lengths (2BL).
+# LPDDR4/5 Burst Length = 16. So 2 BL = 32 transfers.
+# A single 16-beat BL on a 64-bit (8-Byte) bus is 16 * 8 = 128 Bytes.
+# 2 BL = 2 * 128 = 256 Bytes.
+# 最大區塊大小邏輯：限制為 2 個 DRAM Burst Length (2BL)。
+# 單一 64-bit 匯流排的 16-beat BL 為 128 Bytes。2 BL = 256 Bytes。
+MAX_CHUNK_SIZE = 256
+
+
+def iter_chunks(transactions, mapper, max_chunk_size=MAX_CHUNK_SIZE):
+    """
+    Pure-Python hardware-aligned chunking, one transaction at a time.
+    純 Python 的硬體對齊切割，一次處理一筆交易。
+
+    transactions yields (is_write, address, bus_width_log2, burst_len_code);
+    yields unmapped Request chunks. Every trace reader chunks through this function
+    (or chunk_transactions, its vectorized equivalent).
+    transactions 逐筆產生 (is_write, address, bus_width_log2, burst_len_code)；產生未映射的 Request 區塊。
+    所有 Trace 讀取器皆以此函式 (或其向量化版本 chunk_transactions) 切割。
+    """
+    for is_write, address, bus_width_log2, burst_len_code in transactions:
+        is_write = bool(is_write)
+        # Data Size = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
+        # 資料大小 = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
+        bytes_per_beat = 2**bus_width_log2
+        remaining_size = bytes_per_beat * (burst_len_code + 1)
+        curr_addr = address
+
+        while remaining_size > 0:
+            # Chunk size is limited by the remaining size, the next hardware boundary, and the 2BL max limit.
+            # A single request must not cross a boundary.
+            # 區塊大小受限於剩餘大小、下一個硬體邊界、以及 2BL 的最大限制；單一請求不能跨越邊界。
+            next_boundary = mapper.get_next_boundary(curr_addr)
+            chunk_size = min(remaining_size, next_boundary - curr_addr, max_chunk_size)
+            yield Request(is_write, curr_addr, chunk_size, chunk_size // bytes_per_beat)
+            curr_addr += chunk_size
+            remaining_size -= chunk_size
+
+
+class TraceReader:
+    """
+    Reads and parses trace files with hardware-aligned chunking (see iter_chunks).
+    讀取並解析 Trace 檔案，並進行硬體對齊的區塊切割 (見 iter_chunks)。
+    """
+    def __init__(self, filepath, mapper):
+        self.filepath = filepath
+        self.mapper = mapper
+        self.chunks = iter_chunks(iter_transactions(filepath), mapper)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+
+def chunk_transactions(mapper, addresses, sizes, max_chunk_size=MAX_CHUNK_SIZE):
+    """
+    Vectorized hardware-aligned chunking of a block of transactions.
+    對一批交易進行向量化的硬體對齊切割。
+
+    Produces exactly the chunks of TraceReader: each transaction is split at
+    every Channel/Rank/Bank/Row boundary (mapper.boundary_size) and at the
+    2BL max chunk size. Because both sizes are powers of two, the cut points
+    have a closed form: inside the first boundary segment chunks advance by
+    max_chunk_size from the start address; after it every segment starts
+    aligned, so chunks advance by min(boundary_size, max_chunk_size).
+    產生與 TraceReader 完全相同的區塊：於每個 Channel/Rank/Bank/Row 邊界及 2BL 上限處切割。
+    由於兩者皆為 2 的次方，切割點有封閉形式：第一個邊界區段內從起始位址每 max_chunk_size 切割；
+    之後每個區段皆已對齊，每 min(boundary_size, max_chunk_size) 切割。
+
+    Returns (txn_index, chunk_address, chunk_size) as int64 NumPy arrays, in
+    trace order. Requires NumPy.
+    依 Trace 順序回傳 (txn_index, chunk_address, chunk_size) 三個 int64 NumPy 陣列。需要 NumPy。
+    """
+    import numpy as np
+
+    addrs = np.asarray(addresses, dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    ends = addrs + sizes
+
+    boundary = mapper.boundary_size
+    step = min(boundary, max_chunk_size)
+
+    # First segment: from the start address up to the next boundary (or the end)
+    # 第一個區段：從起始位址到下一個邊界 (或結尾)
+    first_end = np.minimum(ends, (addrs & ~(boundary - 1)) + boundary)
+    first_chunks = -(-(first_end - addrs) // max_chunk_size)
+    rest_chunks = -(-(ends - first_end) // step)
+    counts = first_chunks + rest_chunks
+
+    txn_index = np.repeat(np.arange(len(addrs), dtype=np.int64), counts)
+
+    # Ordinal of each chunk within its transaction
+    # 每個區塊在其交易中的序號
+    offsets = np.cumsum(counts) - counts
+    ordinal = np.arange(len(txn_index), dtype=np.int64) - np.repeat(offsets, counts)
+
+    first_count = first_chunks[txn_index]
+    in_first = ordinal < first_count
+    chunk_addr = np.where(
+        in_first,
+        addrs[txn_index] + ordinal * max_chunk_size,
+        first_end[txn_index] + (ordinal - first_count) * step,
+    )
+    chunk_limit = np.where(in_first, first_end[txn_index], ends[txn_index])
+    chunk_size = np.minimum(np.where(in_first, max_chunk_size, step), chunk_limit - chunk_addr)
+
+    return txn_index, chunk_addr, chunk_size
+
+
+class BlockTraceReader:
+    """
+    TraceReader variant that chunks and maps the trace a block of transactions
+    at a time with NumPy, then yields pre-mapped Request objects.
+    以 NumPy 每次切割並映射一整批交易，再產生已映射的 Request 物件的 TraceReader 版本。
+    Accepts both text and binary traces.
+    支援文字與二進位 Trace。
+    """
+    def __init__(self, filepath, mapper, block_size=65536):
+        self.filepath = filepath
+        self.mapper = mapper
+        self.block_size = block_size
+        self.blocks = self._read_blocks()
+        self.pending_chunks = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            req = next(self.pending_chunks, None)
+            if req is not None:
+                return req
+            # Raises StopIteration once every block has been consumed
+            # 所有區塊處理完畢後拋出 StopIteration
+            self.pending_chunks = self._chunk_block(*next(self.blocks))
+
+    def _read_blocks(self):
+        """
+        Yields (is_write, address, bus_width_log2, burst_len_code) arrays per block.
+        逐區塊產生 (is_write, address, bus_width_log2, burst_len_code) 陣列。
+        """
+        import numpy as np
+
+        if is_binary_trace(self.filepath):
+            trace = BinaryTrace(self.filepath)
+            records = None
+            try:
+                records = trace.to_numpy()
+                for start in range(0, len(records), self.block_size):
+                    # Columns are copied out of the memory map, so no yielded array outlives it
+                    # 欄位自記憶體映射中複製出來，產生的陣列不會比映射存活更久
+                    block = records[start:start + self.block_size]
+                    columns = (block['is_write'].copy(), block['address'].copy(),
+                               block['bus_width_log2'].copy(), block['burst_len_code'].copy())
+                    del block
+                    yield columns
+            finally:
+                # The mmap cannot close while a NumPy view of it exists, also when the generator is closed early
+                # NumPy 視圖存在時無法關閉 mmap，生成器提前關閉時亦然
+                del records
+                trace.close()
+            return
+
+        with open(self.filepath, 'r') as f:
+            while True:
+                rows = []
+                for line in f:
+                    parsed = parse_text_line(line)
+                    if parsed is not None:
+                        rows.append(parsed[:4])
+                        if len(rows) >= self.block_size:
+                            break
+                if not rows:
+                    return
+                is_write, address, bus_width_log2, burst_len_code = zip(*rows)
+                yield (np.array(is_write, dtype=np.uint8), np.array(address, dtype=np.uint64),
+                       np.array(bus_width_log2, dtype=np.int64), np.array(burst_len_code, dtype=np.int64))
+
+    def _chunk_block(self, is_write, address, bus_width_log2, burst_len_code):
+        import numpy as np
+
+        # Data Size = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
+        # 資料大小 = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
+        bytes_per_beat = np.left_shift(1, bus_width_log2.astype(np.int64))
+        sizes = bytes_per_beat * (burst_len_code.astype(np.int64) + 1)
+
+        txn_index, chunk_addr, chunk_size = chunk_transactions(self.mapper, address.astype(np.int64), sizes)
+        mapped = self.mapper.map_many(chunk_addr)
+
+        chunk_is_write = is_write.astype(bool)[txn_index].tolist()
+        chunk_beats = (chunk_size // bytes_per_beat[txn_index]).tolist()
+        fields = zip(chunk_is_write, chunk_addr.tolist(), chunk_size.tolist(), chunk_beats,
+                     mapped['Channel'].tolist(), mapped['Rank'].tolist(), mapped['Bank'].tolist(),
+                     mapped['Row'].tolist(), mapped['Column'].tolist())
+
+        for w, addr, size, beats, channel, rank, bank, row, column in fields:
+            req = Request(w, addr, size, beats)
+            req.channel = channel
+            req.rank = rank
+            req.bank = bank
+            req.row = row
+            req.column = column
+            yield req
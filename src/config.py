@@ -15,6 +15,9 @@ def load_mapping(filepath):
     """
     Loads address mapping from a JSON file.
     從 JSON 檔案讀取位址映射規則。
+    Fields are Channel, Rank, Bank, Row, Column and the optional BankGroup,
+    whose bits sit above the Bank bits in the bank index (see mapper.py).
+    欄位為 Channel、Rank、Bank、Row、Column 與選用的 BankGroup；BankGroup 位元位於 Bank 索引中 Bank 位元之上 (見 mapper.py)。
     """
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"Mapping file not found: {filepath}")
@@ -31,4 +34,6 @@ def load_mapping(filepath):
             normalized[key] = [value]
         else:
             normalized[key] = value
+    if "BankGroup" in normalized and "Bank" not in normalized:
+        raise ValueError(f"Mapping has BankGroup bits but no Bank bits: {filepath}")
     return normalized
@@ -1,3 +1,31 @@
+import heapq
+from collections import deque
+from bisect import bisect_left
+
+# Simulator version, part of every result cache key (see result_cache.py).
+# Bump it whenever a change alters simulation results, so cached results
+# from older versions are no longer reused.
+# 模擬器版本，為每個結果快取鍵值的一部分 (見 result_cache.py)。
+# 任何會改變模擬結果的修改都必須遞增此值，避免重用舊版本的快取結果。
+SIM_VERSION = 6
+
+# Scheduling policies: FIFO (oldest ready first), PageHitFirst (oldest ready
+# row hit first), FRFCFS (row hits first, but a request waiting longer than
+# age_cap cycles wins as soon as its command is ready)
+# 排程策略：FIFO (最早就緒者優先)、PageHitFirst (最早就緒的 Row 命中優先)、
+# FRFCFS (Row 命中優先，但等待超過 age_cap 週期的請求在其指令就緒時立即優先)
+POLICIES = ('FIFO', 'PageHitFirst', 'FRFCFS')
+FRFCFS_AGE_CAP = 256
+
+# Page policies: open (a row stays open until a conflicting request closes
+# it), closed (a bank is precharged as soon as no queued request hits its
+# open row), adaptive (such a bank is precharged after an idle timeout that
+# each bank tunes from how its closed rows are reused)
+# Page 策略：open (Row 保持開啟直到衝突請求將其關閉)、closed (一旦沒有隊列請求命中開啟的 Row 即預充電)、
+# adaptive (閒置超過逾時後預充電，逾時依各 Bank 關閉之 Row 是否被再次使用而調整)
+PAGE_POLICIES = ('open', 'closed', 'adaptive')
+PAGE_TIMEOUT = 128
+
 
 class BankState:
     """
@@ -19,6 +47,12 @@ class BankState:
         self.last_read = -10000
         self.last_write = -10000
 
+        # Adaptive page policy: idle cycles before a background PRE (None: the
+        # controller's page_timeout) and the row the last background PRE closed
+        # Adaptive Page 策略：背景 PRE 前的閒置週期數 (None 表示使用控制器的 page_timeout)，以及上次背景 PRE 關閉的 Row
+        self.idle_timeout = None
+        self.idle_closed_row = None
+
         # Parameters
         self.tRP = config['tRP']
         self.tRCD = config['tRCD']
@@ -73,17 +107,74 @@ class BankState:
         rtw_rec = self.last_read + self.tCL + burst_cycles + self.tRTW - self.tCWL
         return max(self.last_act + self.tRCD, self.last_write + self.tCCD, rtw_rec)
 
+    def auto_precharge(self):
+        """
+        Closes the bank after an RDA/WRA.
+        於 RDA/WRA 後關閉 Bank。
+        The implicit PRE happens as soon as a PRE command could have been
+        issued: tRAS after ACT, tRTP after a READ, or write recovery (tWR)
+        after a WRITE; the next ACT then follows tRP after it.
+        隱含的 PRE 於 PRE 指令最早可發出時進行：ACT 後 tRAS、READ 後 tRTP 或 WRITE 後的寫入恢復 (tWR)；下一個 ACT 於其後 tRP 發出。
+        """
+        self.last_pre = self.get_next_pre_time()
+        self.is_open = False
+        self.open_row = None
+
 
 class DRAMController:
     """
     Simulates the DRAM Memory Controller.
     模擬 DRAM 記憶體控制器。
     """
-    def __init__(self, config, mapper, scheduler_type='FIFO', queue_depth=16, log_cmd=False):
+    def __init__(self, config, mapper, scheduler_type='FIFO', queue_depth=16, log_cmd=False, engine='scan', age_cap=FRFCFS_AGE_CAP,
+                 write_queue_depth=0, write_high=None, write_low=None, page_policy='open', page_timeout=PAGE_TIMEOUT, auto_precharge=False):
         self.config = config
         self.mapper = mapper
         self.scheduler_type = scheduler_type
         self.queue_depth = queue_depth
+        # Cycles after which FRFCFS stops letting row hits bypass a request
+        # FRFCFS 中請求等待超過此週期數後，Row 命中不再可越過它
+        self.age_cap = age_cap
+
+        # Separate write queues (write_queue_depth > 0): reads get queue_depth
+        # entries and each channel's writes write_queue_depth. A channel drains
+        # its writes in bursts, from write_high queued writes down to write_low
+        # (see _update_write_mode).
+        # 獨立寫入隊列 (write_queue_depth > 0)：讀取使用 queue_depth 個項目，每個 Channel 的寫入使用 write_queue_depth 個。
+        # Channel 以批次排空其寫入：由 write_high 筆排空至 write_low 筆 (見 _update_write_mode)。
+        self.write_queue_depth = write_queue_depth
+        if write_queue_depth:
+            self.write_high = write_high if write_high is not None else max(1, write_queue_depth * 3 // 4)
+            self.write_low = write_low if write_low is not None else write_queue_depth // 4
+            if not 0 <= self.write_low < self.write_high <= write_queue_depth:
+                raise ValueError(f"Write watermarks must satisfy 0 <= low < high <= write queue depth, got low={self.write_low}, high={self.write_high}, depth={write_queue_depth}")
+        else:
+            self.write_high = None
+            self.write_low = None
+        # The drain state is kept per channel (Channel ID -> value), so each
+        # channel turns its own data bus around
+        # 排空狀態依 Channel 分別保存 (Channel ID -> 值)，每個 Channel 各自轉向其資料匯流排
+        self.queued_reads = {}       # Reads among the registered queue entries
+        self.queued_writes = {}      # Writes among the registered queue entries
+        self.write_draining = {}     # Draining writes down to write_low
+        self._serve_writes = {}      # Direction served this step (is_write); empty without a write queue
+
+        # Page policy (see PAGE_POLICIES); with closed and adaptive, banks whose
+        # open row no queued request hits are precharged in the background
+        # Page 策略 (見 PAGE_POLICIES)；closed 與 adaptive 會在背景預充電沒有隊列請求命中其開啟 Row 的 Bank
+        if page_policy not in PAGE_POLICIES:
+            raise ValueError(f"Unknown page policy {page_policy!r}, expected one of {', '.join(PAGE_POLICIES)}")
+        if page_timeout < 1:
+            raise ValueError(f"Page timeout must be at least 1 cycle, got {page_timeout}")
+        self.page_policy = page_policy
+        self.page_timeout = page_timeout
+        # Auto-precharge: the last queued RD/WR to an open row issues as RDA/WRA,
+        # closing the row without a separate PRE on the command bus
+        # 自動預充電：對開啟 Row 的最後一個隊列 RD/WR 以 RDA/WRA 發出，不需在指令匯流排上另外發出 PRE 即關閉該 Row
+        self.auto_precharge = auto_precharge
+        self._track_rows = page_policy != 'open' or auto_precharge
+        self._row_demand = {}        # (Bank key, Row) -> queued requests to it (only if _track_rows)
+        self.engine = engine
         self.log_cmd = log_cmd
         self.cmd_log_file = None
         if self.log_cmd:
@@ -111,6 +202,24 @@ class DRAMController:
         self.tRRD = config.get('tRRD', 0)
         self.tFAW = config.get('tFAW', 0)
 
+        # Bank groups (mapping with a BankGroup field): tRRD_L / tCCD_L apply between
+        # commands to the same bank group of a rank, tRRD_S / tCCD_S between groups.
+        # Without bank groups only tRRD and the per-bank tCCD apply.
+        # Bank Group (映射含 BankGroup 欄位)：同一 Rank 中相同 Bank Group 的指令之間套用 tRRD_L / tCCD_L，
+        # 不同 Bank Group 之間套用 tRRD_S / tCCD_S。沒有 Bank Group 時只套用 tRRD 與各 Bank 的 tCCD。
+        self.bank_group_shift = mapper.bank_group_shift
+        self.tRRD_L = config.get('tRRD_L', self.tRRD)
+        self.tRRD_S = config.get('tRRD_S', self.tRRD)
+        self.tCCD_L = config.get('tCCD_L', config.get('tCCD', 4))
+        self.tCCD_S = config.get('tCCD_S', config.get('tCCD', 4))
+        self.group_last_act = {}     # (Channel, Rank, Bank Group) -> last ACT
+        self.group_last_cas = {}     # (Channel, Rank, Bank Group) -> last RD/WR
+        self.rank_last_cas = {}      # (Channel, Rank) -> last RD/WR
+        self.last_cas_group = {}     # Channel ID -> (Rank, Bank Group) of the last RD/WR
+        # Row hits in another bank group than the channel's last RD/WR go first (see select_candidate)
+        # 與 Channel 上一個 RD/WR 不同 Bank Group 的 Row 命中優先 (見 select_candidate)
+        self._prefer_groups = self.bank_group_shift is not None and scheduler_type != 'FIFO'
+
         self.stats = {
             'total_cycles': 0,
             'page_hits': 0,
@@ -119,8 +228,14 @@ class DRAMController:
             'bus_busy_cycles': 0,
             'total_bytes': 0,
             'cumulative_queue_depth': 0,
-            'queue_depth_samples': 0
+            'queue_depth_samples': 0,
+            'turnarounds': 0,
+            'idle_precharges': 0,
+            'auto_precharges': 0
         }
+        # Per-channel breakdown of the request/data counters in self.stats
+        # self.stats 中請求/資料計數器的各 Channel 明細
+        self.channel_stats = {}      # Channel ID -> dict
 
         # DRAM Specs
         self.prefetch = config.get('Prefetch', 16) # Default 16n
@@ -129,14 +244,60 @@ class DRAMController:
         self.bytes_per_burst = (self.prefetch * self.bit_width) // 8
         self.burst_cycles = self.prefetch // 2 # DDR (2 transfers per cycle)
 
+        # Per-bank sub-queues of self.queue, each in arrival order
+        # self.queue 依 Bank 分組的子隊列，各自維持到達順序
+        self.bank_queues = {}        # Bank key -> {seq: req}
+        self._synced = 0             # Number of queue entries already registered
+        self._next_seq = 0
+
+        # Event-driven engine state (engine='event')
+        # 事件驅動引擎狀態 (engine='event')
+        self._dirty = {}             # seq -> req whose readiness must be re-evaluated
+        self._pending_heap = []      # (ready_time, seq, gen, req) for requests not yet ready
+        self._ready_any = {}         # Channel ID -> heap of (seq, gen, req) ready now
+        self._ready_hit = {}         # Channel ID -> heap of (seq, gen, req) ready RD/WR
+        self._ready_hit_group = {}   # Channel ID -> {(Rank, Bank Group): heap of ready RD/WR} (only with bank groups)
+        self._act_waiting = {}       # (Channel, Rank) -> {seq: req} whose next command is ACT
+        self._cas_waiting = {}       # Channel ID -> {seq: req} whose next command is RD/WR
+
+        # Row-hit fast-forward state (fast_forward())
+        # Row 命中快轉狀態 (fast_forward())
+        self._streak_blocker = None  # (req, bank) that last broke a streak check
+
+    def get_channel_stats(self, channel_id):
+        """
+        Returns the per-channel counters, creating them on first use.
+        回傳該 Channel 的計數器，首次使用時建立。
+        """
+        ch_stats = self.channel_stats.get(channel_id)
+        if ch_stats is None:
+            ch_stats = self.channel_stats[channel_id] = {
+                'page_hits': 0,
+                'page_misses': 0,
+                'page_conflicts': 0,
+                'bus_busy_cycles': 0,
+                'total_bytes': 0,
+                'turnarounds': 0,
+                'idle_precharges': 0,
+                'auto_precharges': 0,
+            }
+        return ch_stats
+
+    def get_bank_key(self, req):
+        """
+        Returns the (Channel, Rank, Bank) key of a request.
+        回傳請求的 (Channel, Rank, Bank) 鍵值。
+        """
+        if req.channel is None:
+            req.map(self.mapper)
+        return (req.channel, req.rank, req.bank)
+
     def get_bank(self, req):
         """
         Retrieves or creates the BankState object for a request.
         取得或建立請求對應的 BankState 物件。
         """
-        if 'mapped' not in req:
-            req['mapped'] = self.mapper.map_address(req['address'])
-        key = (req['mapped'].get('Channel', 0), req['mapped'].get('Rank', 0), req['mapped']['Bank'])
+        key = self.get_bank_key(req)
         if key not in self.banks:
             self.banks[key] = BankState(key, self.config)
         return self.banks[key]
@@ -149,71 +310,98 @@ class DRAMController:
         回傳：(是否就緒, 指令類型, 下次就緒時間)
         """
         bank = self.get_bank(req)
-        row = req['mapped']['Row']
+        cmd_type = self.get_next_command(bank, req)
+        ready_time = self.get_command_ready_time(bank, cmd_type)
+        return (ready_time <= self.current_time), cmd_type, ready_time
 
+    def get_next_command(self, bank, req):
+        """
+        Returns the next command a request needs given the state of its bank.
+        依據 Bank 狀態回傳請求需要的下一個指令。
+        """
         if bank.is_open:
-            if bank.open_row == row:
+            if bank.open_row == req.row:
                 # Target Row Open -> RD/WR
                 # 目標 Row 已開啟 -> 執行 RD/WR
-                cmd_type = 'WR' if req['is_write'] else 'RD'
-                if cmd_type == 'WR':
-                    ready_time = bank.get_next_write_time()
-                    latency = self.config['tCWL']
-                else:
-                    ready_time = bank.get_next_read_time()
-                    latency = self.config['tCL']
-
-                # Calculate required DRAM bursts for the request size
-                # 計算請求大小所需的 DRAM Burst 數量
-                num_bursts = (req['size'] + self.bytes_per_burst - 1) // self.bytes_per_burst
-                duration = num_bursts * self.burst_cycles
-
-                # Channel specific data bus free time
-                channel_id = req['mapped'].get('Channel', 0)
-                ch_data_bus_free = self.data_bus_free_time.get(channel_id, 0)
-                last_dir = self.last_data_dir.get(channel_id, cmd_type)
-
-                # Bus Turnaround Penalty based on physical constraints
-                bus_turnaround = 0
-                if last_dir != cmd_type:
-                    if last_dir == 'RD' and cmd_type == 'WR':
-                        # Read to Write turnaround: tRTW
-                        bus_turnaround = self.config.get('tRTW', 14)
-                    elif last_dir == 'WR' and cmd_type == 'RD':
-                        # Write to Read turnaround: tWTR
-                        bus_turnaround = self.config.get('tWTR', 10)
-
-                min_issue_time = max(ready_time, ch_data_bus_free + bus_turnaround - latency)
+                return 'WR' if req.is_write else 'RD'
+            # Conflict -> PRE
+            # Row 衝突 -> 執行 PRE
+            return 'PRE'
+        # Closed -> ACT
+        # Bank 關閉 -> 執行 ACT
+        return 'ACT'
+
+    def get_command_ready_time(self, bank, cmd_type):
+        """
+        Earliest time cmd_type can be issued to a bank.
+        計算 cmd_type 最早可對該 Bank 發出的時間。
+        Every request of a bank needing the same command shares this time, so
+        it only has to be computed once per bank and command type.
+        同一 Bank 中需要相同指令的請求共用此時間，因此每個 Bank 每種指令只需計算一次。
+        """
+        channel_id, rank_id, bank_id = bank.id
 
-                return (min_issue_time <= self.current_time), cmd_type, min_issue_time
+        if cmd_type == 'PRE':
+            return bank.get_next_pre_time()
 
-            else:
-                # Conflict -> PRE
-                # Row 衝突 -> 執行 PRE
-                ready_time = bank.get_next_pre_time()
-                return (ready_time <= self.current_time), 'PRE', ready_time
-        else:
-            # Closed -> ACT
-            # Bank 關閉 -> 執行 ACT
+        if cmd_type == 'ACT':
             ready_time = bank.get_next_act_time()
 
             # Global ACT Constraints (tRRD, tFAW) per Rank
             # 每個 Rank 的全域 ACT 限制 (tRRD, tFAW)
-            rank_key = (req['mapped'].get('Channel', 0), req['mapped'].get('Rank', 0))
-            history = self.act_history.get(rank_key, [])
+            history = self.act_history.get((channel_id, rank_id), [])
 
             trrd_constraint = 0
             tfaw_constraint = 0
 
-            if history:
+            if self.bank_group_shift is not None:
+                # tRRD_S after any ACT of the rank, tRRD_L after one in the same bank group
+                # 距 Rank 中任一 ACT 需 tRRD_S，距相同 Bank Group 的 ACT 需 tRRD_L
+                if history:
+                    trrd_constraint = history[-1] + self.tRRD_S
+                group_act = self.group_last_act.get((channel_id, rank_id, bank_id >> self.bank_group_shift))
+                if group_act is not None:
+                    trrd_constraint = max(trrd_constraint, group_act + self.tRRD_L)
+            elif history:
                 trrd_constraint = history[-1] + self.tRRD
 
             if len(history) >= 4:
                 tfaw_constraint = history[-4] + self.tFAW
 
-            final_ready_time = max(ready_time, trrd_constraint, tfaw_constraint)
+            return max(ready_time, trrd_constraint, tfaw_constraint)
 
-            return (final_ready_time <= self.current_time), 'ACT', final_ready_time
+        if cmd_type == 'WR':
+            ready_time = bank.get_next_write_time()
+            latency = self.config['tCWL']
+        else:
+            ready_time = bank.get_next_read_time()
+            latency = self.config['tCL']
+
+        if self.bank_group_shift is not None:
+            # tCCD_S after any RD/WR of the rank, tCCD_L after one in the same bank group
+            # 距 Rank 中任一 RD/WR 需 tCCD_S，距相同 Bank Group 的 RD/WR 需 tCCD_L
+            rank_cas = self.rank_last_cas.get((channel_id, rank_id))
+            if rank_cas is not None:
+                ready_time = max(ready_time, rank_cas + self.tCCD_S)
+                group_cas = self.group_last_cas.get((channel_id, rank_id, bank_id >> self.bank_group_shift))
+                if group_cas is not None:
+                    ready_time = max(ready_time, group_cas + self.tCCD_L)
+
+        # Channel specific data bus free time
+        ch_data_bus_free = self.data_bus_free_time.get(channel_id, 0)
+        last_dir = self.last_data_dir.get(channel_id, cmd_type)
+
+        # Bus Turnaround Penalty based on physical constraints
+        bus_turnaround = 0
+        if last_dir != cmd_type:
+            if last_dir == 'RD' and cmd_type == 'WR':
+                # Read to Write turnaround: tRTW
+                bus_turnaround = self.config.get('tRTW', 14)
+            elif last_dir == 'WR' and cmd_type == 'RD':
+                # Write to Read turnaround: tWTR
+                bus_turnaround = self.config.get('tWTR', 10)
+
+        return max(ready_time, ch_data_bus_free + bus_turnaround - latency)
 
     def issue_command(self, req_idx, cmd_type):
         """
@@ -224,30 +412,37 @@ class DRAMController:
         """
         req = self.queue[req_idx]
         bank = self.get_bank(req)
-        row = req['mapped']['Row']
+        row = req.row
 
-        channel_id = req['mapped'].get('Channel', 0)
-        rank_id = req['mapped'].get('Rank', 0)
-        bank_id = req['mapped'].get('Bank', 0)
+        channel_id = req.channel
+        rank_id = req.rank
+        bank_id = req.bank
 
         # Classify request status if not already done
         # 若尚未分類請求狀態，進行分類 (Hit/Miss/Conflict)
-        if 'status' not in req:
-            # print(f"Classifying Req {req['address']:x} Bank {bank.id} Row {row}. Open: {bank.is_open}, OpenRow: {bank.open_row}")
+        if req.status is None:
+            ch_stats = self.get_channel_stats(channel_id)
             if bank.is_open:
                 if bank.open_row == row:
-                    req['status'] = 'HIT'
+                    req.status = 'HIT'
                     self.stats['page_hits'] += 1
+                    ch_stats['page_hits'] += 1
                 else:
-                    req['status'] = 'CONFLICT'
+                    req.status = 'CONFLICT'
                     self.stats['page_conflicts'] += 1
+                    ch_stats['page_conflicts'] += 1
             else:
-                req['status'] = 'MISS'
+                req.status = 'MISS'
                 self.stats['page_misses'] += 1
+                ch_stats['page_misses'] += 1
 
         self.cmd_bus_free_time[channel_id] = self.current_time + 1
 
         if cmd_type == 'PRE':
+            if self.page_policy == 'adaptive':
+                # A request had to close the row: it was kept open too long
+                # 請求必須關閉此 Row：代表保持開啟過久
+                self._adapt_idle_timeout(bank, False)
             bank.last_pre = self.current_time
             bank.is_open = False
             bank.open_row = None
@@ -256,13 +451,18 @@ class DRAMController:
             return False
 
         elif cmd_type == 'ACT':
+            if self.page_policy == 'adaptive' and bank.idle_closed_row is not None:
+                # Reopening the row a background PRE closed means it was closed too early
+                # 重新開啟背景 PRE 關閉的 Row 代表關閉過早
+                self._adapt_idle_timeout(bank, bank.idle_closed_row == row)
+                bank.idle_closed_row = None
             bank.last_act = self.current_time
             bank.is_open = True
             bank.open_row = row
 
             # Track ACT for global constraints per Rank
             # 追蹤 ACT 以檢查 Rank 層級的全域限制
-            rank_key = (req['mapped'].get('Channel', 0), req['mapped'].get('Rank', 0))
+            rank_key = (channel_id, rank_id)
             if rank_key not in self.act_history:
                 self.act_history[rank_key] = []
 
@@ -270,6 +470,8 @@ class DRAMController:
             history.append(self.current_time)
             if len(history) > 4:
                 history.pop(0)
+            if self.bank_group_shift is not None:
+                self.group_last_act[(channel_id, rank_id, bank_id >> self.bank_group_shift)] = self.current_time
 
             if self.cmd_log_file:
                 self.cmd_log_file.write(f"{self.current_time}: [CH{channel_id} RK{rank_id} BK{bank_id}] ACT\n")
@@ -286,7 +488,7 @@ class DRAMController:
 
             # Calculate required DRAM bursts for the request size
             # 計算請求大小所需的 DRAM Burst 數量
-            num_bursts = (req['size'] + self.bytes_per_burst - 1) // self.bytes_per_burst
+            num_bursts = (req.size + self.bytes_per_burst - 1) // self.bytes_per_burst
             duration = num_bursts * self.burst_cycles
 
             data_start = self.current_time + latency
@@ -299,6 +501,8 @@ class DRAMController:
                     bus_turnaround = self.config.get('tRTW', 14)
                 elif last_dir == 'WR' and cmd_type == 'RD':
                     bus_turnaround = self.config.get('tWTR', 10)
+                self.stats['turnarounds'] += 1
+                self.channel_stats[channel_id]['turnarounds'] += 1
 
             # Ensure the bus is truly free (handles out-of-order latency differences)
             ch_data_bus_free = self.data_bus_free_time.get(channel_id, 0)
@@ -306,53 +510,119 @@ class DRAMController:
 
             self.data_bus_free_time[channel_id] = actual_data_start + duration
             self.last_data_dir[channel_id] = cmd_type
+            if self.bank_group_shift is not None:
+                group = bank_id >> self.bank_group_shift
+                self.group_last_cas[(channel_id, rank_id, group)] = self.current_time
+                self.rank_last_cas[(channel_id, rank_id)] = self.current_time
+                self.last_cas_group[channel_id] = (rank_id, group)
+
+            # No other queued request hits this row: issue RDA/WRA instead
+            # 沒有其他隊列請求命中此 Row：改為發出 RDA/WRA
+            cmd_name = cmd_type
+            if self.auto_precharge and self._row_demand[(bank.id, row)] == 1:
+                bank.auto_precharge()
+                cmd_name += 'A'
+                self.stats['auto_precharges'] += 1
+                self.channel_stats[channel_id]['auto_precharges'] += 1
 
             if self.cmd_log_file:
-                self.cmd_log_file.write(f"{self.current_time}: [CH{channel_id} RK{rank_id} BK{bank_id}] {cmd_type} (Data: {actual_data_start} to {actual_data_start + duration})\n")
+                self.cmd_log_file.write(f"{self.current_time}: [CH{channel_id} RK{rank_id} BK{bank_id}] {cmd_name} (Data: {actual_data_start} to {actual_data_start + duration})\n")
 
             # Count the full burst duration as bus busy time to reflect actual hardware utilization
             # 計算完整的 Burst 週期作為匯流排忙碌時間，反映真實的硬體利用率
             self.stats['bus_busy_cycles'] += duration
-            self.stats['total_bytes'] += req['size']
+            self.stats['total_bytes'] += req.size
+            ch_stats = self.channel_stats[channel_id]
+            ch_stats['bus_busy_cycles'] += duration
+            ch_stats['total_bytes'] += req.size
 
             return True
 
+    def select_candidate(self, oldest, oldest_hit, oldest_req, cross_hit=None):
+        """
+        Applies the scheduling policy to the ready commands of one channel.
+        對單一 Channel 的就緒指令套用排程策略。
+        oldest: earliest-arrived ready candidate; oldest_hit: earliest ready RD/WR candidate or None;
+        oldest_req: the request of oldest. Each engine keeps both candidates per channel, so this is O(1).
+        oldest: 最早到達的就緒候選；oldest_hit: 最早就緒的 RD/WR 候選 (可能為 None)；oldest_req: oldest 的請求。
+        各引擎皆依 Channel 維護這兩個候選，因此為 O(1)。
+        cross_hit: with bank groups, the earliest ready RD/WR candidate outside the bank
+        group of the channel's last RD/WR (or None); it is preferred over oldest_hit.
+        cross_hit：使用 Bank Group 時，Channel 上一個 RD/WR 所屬 Bank Group 以外最早就緒的 RD/WR 候選 (可能為 None)，優先於 oldest_hit。
+        """
+        if oldest_hit is None or self.scheduler_type == 'FIFO':
+            return oldest
+        if cross_hit is not None:
+            oldest_hit = cross_hit
+        if self.scheduler_type == 'PageHitFirst':
+            return oldest_hit
+        if self.scheduler_type == 'FRFCFS':
+            # Any ready request older than the cap is at least as old as oldest_req,
+            # so the cap only has to be checked on the oldest ready one
+            # 任何超過上限的就緒請求都不會比 oldest_req 更晚到達，因此只需檢查最早的就緒請求
+            if self.current_time - oldest_req.arrival >= self.age_cap:
+                return oldest
+            return oldest_hit
+        return oldest
+
     def tick(self):
         """
         Advances the simulation by one step (or more if skipping).
         推進模擬一步 (若使用時間跳躍則可能更多)。
         """
+        if self.engine == 'event':
+            return self._tick_event()
+
         # Track queue depth statistics
         # 追蹤隊列深度統計
         self.stats['cumulative_queue_depth'] += len(self.queue)
         self.stats['queue_depth_samples'] += 1
 
-        candidates = []
+        self._sync_queue()
+        if self.write_queue_depth:
+            self._update_write_mode()
+
         min_next_time = float('inf')
 
-        # Track issued channels in this cycle to avoid multiple commands on the same channel cmd bus
-        issued_channels = set()
+        # Channel ID -> [oldest ready (req, cmd), oldest ready RD/WR (req, cmd), oldest ready cross-group RD/WR (req, cmd)]
+        # Channel ID -> [最早的就緒候選, 最早的就緒 RD/WR 候選, 最早的就緒跨 Bank Group RD/WR 候選]
+        channel_candidates = {}
 
-        for i, req in enumerate(self.queue):
-            # Ensure mapped address exists
-            if 'mapped' not in req:
-                req['mapped'] = self.mapper.map_address(req['address'])
+        for key, bank_reqs in self.bank_queues.items():
+            if not bank_reqs:
+                continue
 
-            channel_id = req['mapped'].get('Channel', 0)
+            channel_id = key[0]
 
             # If command bus for this channel is busy, skip
-            if self.current_time < self.cmd_bus_free_time.get(channel_id, 0) or channel_id in issued_channels:
+            if self.current_time < self.cmd_bus_free_time.get(channel_id, 0):
                 min_next_time = min(min_next_time, self.cmd_bus_free_time.get(channel_id, 0))
                 continue
 
-            ready, cmd, next_ts = self.get_command_status(req)
-            if ready:
-                candidates.append((i, cmd, channel_id))
-            else:
-                if next_ts < min_next_time:
-                    min_next_time = next_ts
-
-        if not candidates:
+            for req, cmd, next_ts in self._bank_candidates(self.banks[key], bank_reqs):
+                if next_ts > self.current_time:
+                    if next_ts < min_next_time:
+                        min_next_time = next_ts
+                    continue
+
+                if channel_id not in channel_candidates:
+                    channel_candidates[channel_id] = [None, None, None]
+                best = channel_candidates[channel_id]
+                if best[0] is None or req.seq < best[0][0].seq:
+                    best[0] = (req, cmd)
+                if cmd in ('RD', 'WR') and (best[1] is None or req.seq < best[1][0].seq):
+                    best[1] = (req, cmd)
+                if (self._prefer_groups and cmd in ('RD', 'WR') and (best[2] is None or req.seq < best[2][0].seq) and
+                        (key[1], key[2] >> self.bank_group_shift) != self.last_cas_group.get(channel_id)):
+                    best[2] = (req, cmd)
+
+        if not channel_candidates:
+            if self.page_policy != 'open':
+                issued, next_time = self._precharge_idle_banks(())
+                if issued:
+                    self.current_time += 1
+                    return
+                min_next_time = min(min_next_time, next_time)
             # Time Skipping Logic
             # 時間跳躍邏輯
             if min_next_time != float('inf') and min_next_time > self.current_time:
@@ -361,48 +631,648 @@ class DRAMController:
                 self.current_time += 1
             return
 
-        # Issue commands for parallel channels
-        # We process candidates per channel to respect scheduling policies
+        # Issue one command per channel, serving channels in the order of their oldest ready request
+        # 每個 Channel 發出一個指令，依各 Channel 最早就緒請求的順序處理
+        for channel_id, (oldest, oldest_hit, cross_hit) in sorted(channel_candidates.items(), key=lambda item: item[1][0][0].seq):
+            req, cmd = self.select_candidate(oldest, oldest_hit, oldest[0], cross_hit)
+            req_idx = bisect_left(self.queue, req.seq, key=lambda r: r.seq)
+            if self.issue_command(req_idx, cmd):
+                self._complete(req, req_idx)
 
-        # Group candidates by channel
-        channel_candidates = {}
-        for idx, cmd, channel_id in candidates:
-            if channel_id not in channel_candidates:
-                channel_candidates[channel_id] = []
-            channel_candidates[channel_id].append((idx, cmd))
+        if self.page_policy != 'open':
+            self._precharge_idle_banks(channel_candidates)
+        self.current_time += 1
+
+    def _bank_candidates(self, bank, bank_reqs):
+        """
+        Yields (req, cmd, ready_time) for the oldest request of each command class in a bank.
+        針對 Bank 中每一類指令，產生最早請求的 (req, cmd, ready_time)。
+        A closed bank only has ACT; an open bank has PRE for conflicting rows and
+        RD/WR for the row-hit subset. Requests of the same class share one ready
+        time, so later ones can never be chosen ahead of the oldest.
+        關閉的 Bank 只有 ACT；開啟的 Bank 對衝突 Row 為 PRE，對命中子集為 RD/WR。
+        With a write queue, requests held back (see _held_back) are left out.
+        使用寫入隊列時，排除被保留的請求 (見 _held_back)。
+        """
+        serve = self._serve_writes.get(bank.id[0])
+        if serve is not None:
+            bank_has_served = any(req.is_write == serve for req in bank_reqs.values())
+            classes = {}
+            for req in bank_reqs.values():
+                cmd = self.get_next_command(bank, req) if bank.is_open else 'ACT'
+                if cmd not in classes and not self._held_back(req, cmd, bank_has_served):
+                    classes[cmd] = req
+            for cmd, req in classes.items():
+                yield req, cmd, self.get_command_ready_time(bank, cmd)
+            return
+
+        if not bank.is_open:
+            yield next(iter(bank_reqs.values())), 'ACT', self.get_command_ready_time(bank, 'ACT')
+            return
+
+        seen = set()
+        for req in bank_reqs.values():
+            cmd = self.get_next_command(bank, req)
+            if cmd in seen:
+                continue
+            seen.add(cmd)
+            yield req, cmd, self.get_command_ready_time(bank, cmd)
+            if len(seen) == 3:
+                return
+
+    def _sync_queue(self):
+        """
+        Registers requests appended to self.queue since the last step into
+        their per-bank sub-queue (kept in arrival order).
+        將自上一步以來新加入 self.queue 的請求登記到對應的 Bank 子隊列 (維持到達順序)。
+        """
+        for req in self.queue[self._synced:]:
+            seq = self._next_seq
+            self._next_seq += 1
+            req.seq = seq
+            req.gen = 0
+            # Restored checkpoints keep their arrival times
+            # 由檢查點還原的請求保留其到達時間
+            if req.arrival is None:
+                req.arrival = self.current_time
+            key = self.get_bank(req).id
+            self._count_queued(key[0], req.is_write, 1)
+            if self._track_rows:
+                demand_key = (key, req.row)
+                self._row_demand[demand_key] = self._row_demand.get(demand_key, 0) + 1
+            if key not in self.bank_queues:
+                self.bank_queues[key] = {}
+            if self.engine == 'event':
+                if self.write_queue_depth:
+                    # An arrival can hold back the other direction's ACT/PRE in its bank
+                    # 新請求可能使同一 Bank 中另一方向的 ACT/PRE 被保留
+                    for other in self.bank_queues[key].values():
+                        if other.is_write != req.is_write:
+                            self._invalidate(other)
+                self._dirty[seq] = req
+            self.bank_queues[key][seq] = req
+        self._synced = len(self.queue)
+
+    def _complete(self, req, req_idx):
+        """
+        Removes a finished request from the queue and its bank sub-queue.
+        將已完成的請求從隊列與 Bank 子隊列中移除。
+        """
+        seq = req.seq
+        key = self.get_bank(req).id
+        del self.bank_queues[key][seq]
+        self._dirty.pop(seq, None)
+        req.gen = -1
+        self.queue.pop(req_idx)
+        self._synced -= 1
+        self.completed_requests += 1
+        self._count_queued(key[0], req.is_write, -1)
+        if self._track_rows:
+            self._release_row_demand(key, req.row)
+
+    def has_room(self, req):
+        """
+        True if req can enter the queue now; drivers fill the queue while this holds.
+        若 req 目前可進入隊列則為 True；驅動端在此條件成立時持續填充隊列。
+        Without a write queue this is len(queue) < queue_depth; with one,
+        reads are counted against queue_depth and writes against the
+        write_queue_depth of their channel.
+        未使用寫入隊列時即 len(queue) < queue_depth；使用時讀取以 queue_depth 計算，寫入以其 Channel 的 write_queue_depth 計算。
+        """
+        if not self.write_queue_depth:
+            return len(self.queue) < self.queue_depth
+        self._sync_queue()
+        if req.is_write:
+            return self.queued_writes.get(self.get_bank_key(req)[0], 0) < self.write_queue_depth
+        return sum(self.queued_reads.values()) < self.queue_depth
+
+    def _count_queued(self, channel_id, is_write, delta):
+        """
+        Adds delta to the queued read or write count of a channel.
+        將 delta 加到 Channel 的隊列讀取或寫入筆數。
+        """
+        if channel_id not in self.queued_writes:
+            self.queued_reads[channel_id] = 0
+            self.queued_writes[channel_id] = 0
+        if is_write:
+            self.queued_writes[channel_id] += delta
+        else:
+            self.queued_reads[channel_id] += delta
 
-        selected_indices = []
+    def write_queue_config(self):
+        """
+        Returns the configured read/write queue sizes and watermarks, or None without a write queue.
+        回傳設定的讀取/寫入隊列大小與水位；未使用寫入隊列時回傳 None。
+        """
+        if not self.write_queue_depth:
+            return None
+        return {'read_queue_depth': self.queue_depth, 'write_queue_depth': self.write_queue_depth,
+                'write_high': self.write_high, 'write_low': self.write_low}
 
-        for channel_id, ch_candidates in channel_candidates.items():
-            selected_idx = -1
-            selected_cmd = None
+    def page_policy_config(self):
+        """
+        Returns the configured page policy (with its timeout when adaptive), or None for the open page policy.
+        回傳設定的 Page 策略 (adaptive 時含逾時)；open Page 策略時回傳 None。
+        """
+        if self.page_policy == 'open':
+            return None
+        if self.page_policy == 'adaptive':
+            return {'page_policy': self.page_policy, 'page_timeout': self.page_timeout}
+        return {'page_policy': self.page_policy}
 
-            if self.scheduler_type == 'FIFO':
-                selected_idx, selected_cmd = ch_candidates[0]
+    def _update_write_mode(self):
+        """
+        Chooses the direction served by each channel in this step when writes have their own queue.
+        使用獨立寫入隊列時，決定各 Channel 本步服務的方向。
+        A channel serves reads until its queued writes reach write_high; its
+        writes are then drained until they fall to write_low. A channel with
+        no queued read serves its writes. A full read queue stalls the trace,
+        so while it is full a channel with queued reads neither starts nor
+        continues a drain. Once the data bus has turned to the served
+        direction only its RD or WR may issue, so the bus turns around once
+        per burst instead of per request (see _held_back).
+        Channel 持續服務讀取直到其隊列中的寫入達到 write_high，接著排空寫入直到降至 write_low；沒有隊列讀取的 Channel 服務其寫入。
+        讀取隊列已滿時 Trace 無法前進，因此此時有隊列讀取的 Channel 不開始也不繼續排空。
+        資料匯流排轉向服務方向後只有該方向的 RD 或 WR 可發出，因此每個批次才轉向一次，而非每個請求 (見 _held_back)。
+        """
+        reads_full = sum(self.queued_reads.values()) >= self.queue_depth
+        for channel_id, writes in self.queued_writes.items():
+            reads_stalled = reads_full and self.queued_reads[channel_id]
+            draining = self.write_draining.get(channel_id, False)
+            if draining:
+                if writes <= self.write_low or reads_stalled:
+                    draining = self.write_draining[channel_id] = False
+            elif writes >= self.write_high and not reads_stalled:
+                draining = self.write_draining[channel_id] = True
+            serve = draining or not self.queued_reads[channel_id]
+            if serve != self._serve_writes.get(channel_id):
+                self._serve_writes[channel_id] = serve
+                if self.engine == 'event':
+                    for req in self.queue:
+                        if req.channel == channel_id:
+                            self._invalidate(req)
+
+    def _held_back(self, req, cmd, bank_has_served):
+        """
+        True if, with a write queue, req may not issue cmd in this step.
+        使用寫入隊列時，若 req 本步不可發出 cmd 則為 True。
+        A request of the direction its channel does not serve may not issue
+        ACT/PRE in a bank that has requests of the served direction
+        (bank_has_served), so it never closes a row the served direction is
+        using. Its RD/WR is held back once the channel's data bus has turned
+        to the served direction; until then it keeps the bus busy while the
+        served direction opens its rows.
+        其 Channel 非服務方向的請求不可在有服務方向請求的 Bank (bank_has_served) 中發出 ACT/PRE，因此不會關閉服務方向正在使用的 Row。
+        其 RD/WR 在 Channel 的資料匯流排轉向服務方向後被保留；在此之前，它在服務方向開啟 Row 的期間持續使用匯流排。
+        """
+        serve = self._serve_writes[req.channel]
+        if req.is_write == serve:
+            return False
+        if cmd in ('RD', 'WR'):
+            return self.last_data_dir.get(req.channel) == ('WR' if serve else 'RD')
+        return bank_has_served
+
+    # ------------------------------------------------------------------------
+    # Page policies
+    # Page 策略
+    #
+    # With the closed and adaptive policies a bank whose open row no queued
+    # request hits is precharged in the background, so the next request to it
+    # finds the bank closed (a miss, needing only ACT) instead of open on the
+    # wrong row (a conflict, needing PRE then ACT). Background PREs use the
+    # command bus of channels that issued nothing in the step, so they never
+    # delay a request's own command.
+    # 使用 closed 與 adaptive 策略時，沒有隊列請求命中其開啟 Row 的 Bank 會在背景預充電，
+    # 因此下一個請求遇到的是關閉的 Bank (Miss，只需 ACT)，而非開在錯誤 Row 上 (Conflict，需要 PRE 再 ACT)。
+    # 背景 PRE 只使用本步未發出指令之 Channel 的指令匯流排，因此不會延遲請求本身的指令。
+    # ------------------------------------------------------------------------
+
+    def _release_row_demand(self, key, row):
+        demand_key = (key, row)
+        count = self._row_demand[demand_key] - 1
+        if count:
+            self._row_demand[demand_key] = count
+        else:
+            del self._row_demand[demand_key]
 
-            elif self.scheduler_type == 'PageHitFirst':
-                hit_candidate = None
-                for idx, cmd in ch_candidates:
-                    if cmd in ['RD', 'WR']:
-                        hit_candidate = (idx, cmd)
-                        break
+    def _adapt_idle_timeout(self, bank, longer):
+        """
+        Doubles (longer) or halves a bank's adaptive idle timeout, within 1/8 and 8 times page_timeout.
+        將 Bank 的 adaptive 閒置逾時加倍 (longer) 或減半，範圍為 page_timeout 的 1/8 至 8 倍。
+        """
+        timeout = bank.idle_timeout if bank.idle_timeout is not None else self.page_timeout
+        if longer:
+            bank.idle_timeout = min(timeout * 2, self.page_timeout * 8)
+        else:
+            bank.idle_timeout = max(timeout // 2, self.page_timeout // 8, 1)
 
-                if hit_candidate:
-                    selected_idx, selected_cmd = hit_candidate
+    def _precharge_idle_banks(self, issued_channels):
+        """
+        Issues the background PREs of the page policy on channels not in issued_channels.
+        在不屬於 issued_channels 的 Channel 上發出 Page 策略的背景 PRE。
+        A bank qualifies when no queued request hits its open row and its PRE
+        is ready; adaptive also waits until the bank has been idle for its
+        timeout. At most one PRE is issued per channel, to the qualifying bank
+        with the lowest key.
+        Returns (issued, next_time): whether any PRE was issued, and the
+        earliest later time one becomes ready (inf if none), for time skipping.
+        沒有隊列請求命中其開啟 Row 且 PRE 已就緒的 Bank 符合條件；adaptive 另需 Bank 閒置達其逾時。
+        每個 Channel 最多發出一個 PRE，給鍵值最小的符合條件 Bank。
+        回傳 (issued, next_time)：是否發出 PRE，以及之後最早就緒的時間 (無則為 inf)，供時間跳躍使用。
+        """
+        now = self.current_time
+        adaptive = self.page_policy == 'adaptive'
+        row_demand = self._row_demand
+        next_time = float('inf')
+        selected = {}                # Channel ID -> bank key
+        for key, bank in self.banks.items():
+            if not bank.is_open or key[0] in issued_channels or (key, bank.open_row) in row_demand:
+                continue
+            ready_time = bank.get_next_pre_time()
+            if adaptive:
+                timeout = bank.idle_timeout if bank.idle_timeout is not None else self.page_timeout
+                ready_time = max(ready_time, max(bank.last_act, bank.last_read, bank.last_write) + timeout)
+            if ready_time > now:
+                if ready_time < next_time:
+                    next_time = ready_time
+            elif key[0] not in selected or key < selected[key[0]]:
+                selected[key[0]] = key
+        for key in selected.values():
+            self._issue_idle_precharge(self.banks[key])
+        return bool(selected), next_time
+
+    def _issue_idle_precharge(self, bank):
+        """
+        Issues a background PRE to bank, which no queued request needs open.
+        對沒有隊列請求需要其保持開啟的 Bank 發出背景 PRE。
+        """
+        channel_id, rank_id, bank_id = bank.id
+        if self.page_policy == 'adaptive':
+            bank.idle_closed_row = bank.open_row
+        bank.last_pre = self.current_time
+        bank.is_open = False
+        bank.open_row = None
+        self.cmd_bus_free_time[channel_id] = self.current_time + 1
+        self.stats['idle_precharges'] += 1
+        self.get_channel_stats(channel_id)['idle_precharges'] += 1
+        if self.cmd_log_file:
+            self.cmd_log_file.write(f"{self.current_time}: [CH{channel_id} RK{rank_id} BK{bank_id}] PRE (idle)\n")
+        if self.engine == 'event':
+            for other in self.bank_queues.get(bank.id, {}).values():
+                self._invalidate(other)
+
+    # ------------------------------------------------------------------------
+    # Row-hit streak fast-forward
+    # Row 命中連續段快轉
+    #
+    # While every queued request is a hit to an already open row, and all of
+    # a channel's requests go in one direction (with a write queue, the
+    # direction that channel then serves), no ACT/PRE can become ready and
+    # each bank's requests share one ready time. A step then reduces to picking,
+    # per channel, the oldest bank head whose RD/WR is ready, which is exactly
+    # what tick() would choose. fast_forward() runs such steps back to back,
+    # calling the driver's refill between them as the fill/tick loop would, and
+    # hands control back as soon as an arrival breaks the streak.
+    # 當隊列中所有請求皆命中已開啟的 Row，且每個 Channel 的請求方向一致時 (使用寫入隊列時即為該 Channel
+    # 所服務的方向)，不會有 ACT/PRE 就緒，
+    # 同一 Bank 的請求共用相同就緒時間。此時每一步只需在各 Channel 中挑出就緒的最早 Bank 首筆請求，
+    # 與 tick() 的選擇完全相同。fast_forward() 連續執行這些步驟，並如同填充/步進迴圈般在步驟間呼叫
+    # 驅動端的 refill，一旦新請求打斷連續段即交回控制權。
+    # ------------------------------------------------------------------------
+
+    def _add_to_streak(self, streak, reqs):
+        """
+        Files reqs into streak (Channel ID -> [cmd, {bank key: deque of reqs}]).
+        將 reqs 加入 streak (Channel ID -> [指令, {Bank 鍵值: 請求 deque}])。
+        Returns False as soon as one is not a row hit in the channel's direction.
+        一旦有請求不是該 Channel 方向的 Row 命中即回傳 False。
+        """
+        for req in reqs:
+            bank = self.get_bank(req)
+            if not bank.is_open or bank.open_row != req.row:
+                self._streak_blocker = (req, bank)
+                return False
+            cmd = 'WR' if req.is_write else 'RD'
+            entry = streak.get(req.channel)
+            if entry is None:
+                entry = streak[req.channel] = [cmd, {}]
+            elif entry[0] != cmd:
+                return False
+            bank_reqs = entry[1].get(bank.id)
+            if bank_reqs is None:
+                bank_reqs = entry[1][bank.id] = deque()
+            bank_reqs.append(req)
+        return True
+
+    def fast_forward(self, refill=None, until=None):
+        """
+        Runs consecutive steps of a row-hit streak; returns the number of steps run (0 if not in a streak).
+        連續執行 Row 命中連續段的步驟；回傳執行的步數 (不在連續段中時為 0)。
+
+        Each step has exactly the effect of one tick(), so results, stats and
+        the command log are identical. refill() is called after every step, as
+        the driver's fill loop would before its next tick(). Stops when the
+        queue is empty, an arrival breaks the streak, or current_time reaches
+        until (the driver's next interval boundary). When it returns 0 the
+        driver must tick() instead.
+        每一步的效果與一次 tick() 完全相同，因此結果、統計與指令日誌皆一致。每步之後呼叫 refill()，
+        如同驅動端在下一次 tick() 前的填充迴圈。隊列清空、新請求打斷連續段或 current_time 到達 until
+        (驅動端下一個區間邊界) 時停止。回傳 0 時驅動端必須改為呼叫 tick()。
+        """
+        if not self.queue:
+            return 0
+        # A request that failed the last check stays a non-hit until its bank
+        # opens its row, so the full check can be skipped until then
+        # 上次檢查失敗的請求在其 Bank 開啟該 Row 之前仍非命中，因此在此之前可略過完整檢查
+        if self._streak_blocker is not None:
+            req, bank = self._streak_blocker
+            if not bank.is_open or bank.open_row != req.row:
+                return 0
+            self._streak_blocker = None
+        self._sync_queue()
+        streak = {}
+        if not self._add_to_streak(streak, self.queue):
+            return 0
+
+        stats = self.stats
+        queue = self.queue
+        banks = self.banks
+        steps = 0
+        while True:
+            stats['cumulative_queue_depth'] += len(queue)
+            stats['queue_depth_samples'] += 1
+            if self.write_queue_depth:
+                self._update_write_mode()
+            now = self.current_time
+            min_next_time = float('inf')
+
+            # Oldest ready bank head per channel, as tick() would select it
+            # 各 Channel 中最早就緒的 Bank 首筆請求，與 tick() 的選擇相同
+            selected = []
+            for channel_id, (cmd, bank_reqs) in streak.items():
+                cmd_bus_free = self.cmd_bus_free_time.get(channel_id, 0)
+                if now < cmd_bus_free:
+                    min_next_time = min(min_next_time, cmd_bus_free)
+                    continue
+                best = None
+                cross = None
+                last_group = self.last_cas_group.get(channel_id)
+                for key, reqs in bank_reqs.items():
+                    head = reqs[0]
+                    ready_time = self.get_command_ready_time(banks[key], cmd)
+                    if ready_time > now:
+                        if ready_time < min_next_time:
+                            min_next_time = ready_time
+                        continue
+                    if best is None or head.seq < best.seq:
+                        best = head
+                    if (self._prefer_groups and (cross is None or head.seq < cross.seq) and
+                            (key[1], key[2] >> self.bank_group_shift) != last_group):
+                        cross = head
+                if best is not None:
+                    # Every candidate is a row hit, so only the bank group preference can pass over best
+                    # 所有候選皆為 Row 命中，因此只有 Bank Group 優先可能不選 best
+                    choice = self.select_candidate(best, best, best, cross) if cross is not None else best
+                    selected.append((best.seq, channel_id, choice))
+
+            if selected:
+                for _, channel_id, req in sorted(selected):
+                    cmd, bank_reqs = streak[channel_id]
+                    req_idx = bisect_left(queue, req.seq, key=lambda r: r.seq)
+                    self.issue_command(req_idx, cmd)
+                    if self.engine == 'event':
+                        self._invalidate_dependents(req, cmd)
+                    self._complete(req, req_idx)
+                    key = (req.channel, req.rank, req.bank)
+                    bank_reqs[key].popleft()
+                    if not bank_reqs[key]:
+                        del bank_reqs[key]
+                        if not bank_reqs:
+                            # An emptied channel may restart in either direction
+                            # 已清空的 Channel 可重新以任一方向開始
+                            del streak[channel_id]
+                if self.page_policy != 'open':
+                    self._precharge_idle_banks({channel_id for _, channel_id, _ in selected})
+                self.current_time = now + 1
+            else:
+                if self.page_policy != 'open':
+                    issued, next_time = self._precharge_idle_banks(())
+                    min_next_time = now + 1 if issued else min(min_next_time, next_time)
+                if min_next_time != float('inf') and min_next_time > now:
+                    # Time Skipping Logic
+                    # 時間跳躍邏輯
+                    self.current_time = min_next_time
                 else:
-                    selected_idx, selected_cmd = ch_candidates[0]
+                    self.current_time = now + 1
+            steps += 1
+
+            if until is not None and self.current_time >= until:
+                return steps
+            if refill is not None:
+                synced = len(queue)
+                refill()
+                self._sync_queue()
+                if not self._add_to_streak(streak, queue[synced:]):
+                    return steps
+            if not queue:
+                return steps
+
+    # ------------------------------------------------------------------------
+    # Event-driven engine
+    # 事件驅動引擎
+    #
+    # A request's (command, ready_time) only depends on its bank, the rank's ACT
+    # history (for ACT) and the channel's data bus (for RD/WR); bank group timing
+    # only adds state of the same rank (ACT) and channel (RD/WR). It is therefore
+    # cached and only re-evaluated when an issued command touches one of those.
+    # Requests that are not ready wait in a heap keyed by ready time; ready ones
+    # sit in per-channel heaps keyed by arrival order so the policy can pick the
+    # oldest (hit) candidate without scanning the queue.
+    # 請求的 (指令, 就緒時間) 只取決於其 Bank、Rank 的 ACT 歷史 (ACT) 與
+    # Channel 的資料匯流排 (RD/WR)，因此只在發出的指令影響到這些狀態時才重新計算。
+    # ------------------------------------------------------------------------
+
+    def _invalidate(self, req):
+        """
+        Drops the cached readiness of a request and schedules its re-evaluation.
+        捨棄請求的就緒快取並排入重新計算。
+        """
+        seq = req.seq
+        if seq in self._dirty:
+            return
+        # Bumping the generation turns every heap entry of this request stale
+        # 遞增世代編號，使此請求在各 heap 中的項目失效
+        req.gen += 1
+        cmd = req.cached_cmd_type
+        if cmd == 'ACT':
+            self._act_waiting[(req.channel, req.rank)].pop(seq, None)
+        elif cmd in ('RD', 'WR'):
+            self._cas_waiting[req.channel].pop(seq, None)
+        self._dirty[seq] = req
+
+    def _evaluate(self, req, bank_times):
+        """
+        Computes and caches the next command of a request, then files it as ready or pending.
+        計算並快取請求的下一個指令，並放入就緒或等待結構。
+        bank_times memoizes ready times per (bank key, command) within one step.
+        bank_times 在同一步內依 (Bank 鍵值, 指令) 暫存就緒時間。
+        """
+        bank = self.get_bank(req)
+        cmd = self.get_next_command(bank, req)
+        time_key = (bank.id, cmd)
+        ready_time = bank_times.get(time_key)
+        if ready_time is None:
+            ready_time = bank_times[time_key] = self.get_command_ready_time(bank, cmd)
+        ready = ready_time <= self.current_time
+        req.cached_ready_time = ready_time
+        req.cached_cmd_type = cmd
+
+        seq = req.seq
+        channel_id = req.channel
+        if cmd == 'ACT':
+            rank_key = (channel_id, req.rank)
+            if rank_key not in self._act_waiting:
+                self._act_waiting[rank_key] = {}
+            self._act_waiting[rank_key][seq] = req
+        elif cmd != 'PRE':
+            if channel_id not in self._cas_waiting:
+                self._cas_waiting[channel_id] = {}
+            self._cas_waiting[channel_id][seq] = req
+
+        serve = self._serve_writes.get(channel_id)
+        if serve is not None and req.is_write != serve:
+            # Held back requests wait for an invalidation (direction switch, a bank arrival or a channel RD/WR)
+            # 被保留的請求等待失效 (方向切換、同 Bank 新請求或 Channel 的 RD/WR) 後重新計算
+            if self._held_back(req, cmd, any(other.is_write == serve for other in self.bank_queues[bank.id].values())):
+                return
+        if ready:
+            self._push_ready(channel_id, req)
+        else:
+            heapq.heappush(self._pending_heap, (ready_time, seq, req.gen, req))
+
+    def _push_ready(self, channel_id, req):
+        entry = (req.seq, req.gen, req)
+        if channel_id not in self._ready_any:
+            self._ready_any[channel_id] = []
+            self._ready_hit[channel_id] = []
+        heapq.heappush(self._ready_any[channel_id], entry)
+        if req.cached_cmd_type in ('RD', 'WR'):
+            heapq.heappush(self._ready_hit[channel_id], entry)
+            if self._prefer_groups:
+                groups = self._ready_hit_group.get(channel_id)
+                if groups is None:
+                    groups = self._ready_hit_group[channel_id] = {}
+                group = (req.rank, req.bank >> self.bank_group_shift)
+                if group not in groups:
+                    groups[group] = []
+                heapq.heappush(groups[group], entry)
+
+    def _oldest_cross_hit(self, channel_id):
+        """
+        Returns the oldest valid ready RD/WR entry of a channel outside the bank group of its last RD/WR (or None).
+        回傳 Channel 中上一個 RD/WR 所屬 Bank Group 以外最早的有效就緒 RD/WR 項目 (或 None)。
+        """
+        last_group = self.last_cas_group.get(channel_id)
+        cross_hit = None
+        for group, heap in self._ready_hit_group.get(channel_id, {}).items():
+            if group != last_group:
+                head = self._peek_valid(heap, 1)
+                if head is not None and (cross_hit is None or head[0] < cross_hit[0]):
+                    cross_hit = head
+        return cross_hit
+
+    @staticmethod
+    def _peek_valid(heap, gen_pos):
+        """
+        Discards stale entries and returns the top of a heap (or None).
+        丟棄失效項目並回傳 heap 頂端 (或 None)。
+        """
+        while heap and heap[0][gen_pos] != heap[0][-1].gen:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def _invalidate_dependents(self, req, cmd_type):
+        """
+        Invalidates every queued request whose readiness depends on state changed by cmd_type.
+        使所有就緒狀態受 cmd_type 影響的請求失效。
+        """
+        channel_id = req.channel
+        for other in self.bank_queues[self.get_bank_key(req)].values():
+            self._invalidate(other)
+        if cmd_type == 'ACT':
+            rank_key = (channel_id, req.rank)
+            for other in list(self._act_waiting.get(rank_key, {}).values()):
+                self._invalidate(other)
+        elif cmd_type in ('RD', 'WR'):
+            for other in list(self._cas_waiting.get(channel_id, {}).values()):
+                self._invalidate(other)
+
+    def _tick_event(self):
+        """
+        Event-driven equivalent of tick(): identical results, but only requests
+        touched by the previous commands are re-evaluated.
+        tick() 的事件驅動版本：結果完全相同，但只重新計算受前一指令影響的請求。
+        """
+        self.stats['cumulative_queue_depth'] += len(self.queue)
+        self.stats['queue_depth_samples'] += 1
+
+        self._sync_queue()
+        if self.write_queue_depth:
+            self._update_write_mode()
+        dirty = self._dirty
+        self._dirty = {}
+        bank_times = {}
+        for req in dirty.values():
+            self._evaluate(req, bank_times)
+
+        # Promote pending requests whose ready time has been reached
+        # 將已到達就緒時間的等待請求移入就緒結構
+        pending = self._pending_heap
+        while pending and pending[0][0] <= self.current_time:
+            _, _, gen, req = heapq.heappop(pending)
+            if gen == req.gen:
+                self._push_ready(req.channel, req)
+
+        # Channels are served in the order of their oldest ready request, as in tick()
+        # 與 tick() 相同，依各 Channel 最早的就緒請求順序處理
+        channel_order = []
+        for channel_id, ready_any in self._ready_any.items():
+            head = self._peek_valid(ready_any, 1)
+            if head is not None:
+                channel_order.append((head[0], channel_id))
+
+        if not channel_order:
+            next_time = float('inf')
+            if self.page_policy != 'open':
+                issued, next_time = self._precharge_idle_banks(())
+                if issued:
+                    self.current_time += 1
+                    return
+            # Time Skipping Logic
+            # 時間跳躍邏輯
+            head = self._peek_valid(pending, 2)
+            if head is not None:
+                next_time = min(next_time, head[0])
+            if next_time != float('inf') and next_time > self.current_time:
+                self.current_time = next_time
             else:
-                selected_idx, selected_cmd = ch_candidates[0]
+                self.current_time += 1
+            return
+
+        for _, channel_id in sorted(channel_order):
+            oldest = self._peek_valid(self._ready_any[channel_id], 1)
+            oldest_hit = self._peek_valid(self._ready_hit[channel_id], 1)
+            cross_hit = self._oldest_cross_hit(channel_id) if self._prefer_groups else None
+            req = self.select_candidate(oldest, oldest_hit, oldest[-1], cross_hit)[-1]
+            cmd_type = req.cached_cmd_type
 
-            if selected_idx != -1:
-                issued_channels.add(channel_id)
-                done = self.issue_command(selected_idx, selected_cmd)
-                if done:
-                    selected_indices.append(selected_idx)
+            req_idx = bisect_left(self.queue, req.seq, key=lambda r: r.seq)
+            done = self.issue_command(req_idx, cmd_type)
+            self._invalidate_dependents(req, cmd_type)
 
-        # Remove completed requests from back to front
-        for idx in sorted(selected_indices, reverse=True):
-            self.queue.pop(idx)
-            self.completed_requests += 1
+            if done:
+                self._complete(req, req_idx)
 
+        if self.page_policy != 'open':
+            self._precharge_idle_banks({channel_id for _, channel_id in channel_order})
         self.current_time += 1
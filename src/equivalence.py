@@ -0,0 +1,309 @@
+import argparse
+import glob
+import itertools
+import os
+import random
+import sys
+
+# Add src to path if needed, or assume running from root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from config import load_config, load_mapping
+from mapper import AddressMapper
+from dram_sim import PAGE_POLICIES, DRAMController
+from chunker import iter_chunks
+from trace_bin import iter_transactions
+from asyc_parall_opt import DRAMControllerOpt
+
+# ----------------------------------------------------------------------------
+# Differential engine-equivalence harness (引擎等價差異測試)
+#
+# Every scheduler engine must produce the same simulation as the reference
+# engine, command for command. Engines are compared in both queue modes:
+#   shared       one queue for all channels, as src/main.py
+#   per_channel  one independent controller per channel, as the
+#                src/asyc_parall*.py workers
+# Each run records the --log_cmd command stream in memory, so a mismatch is
+# reported at the first divergent command with the commands around it.
+# 每個排程引擎都必須產生與參考引擎逐指令相同的模擬。引擎於兩種隊列模式下比較：
+#   shared       所有 Channel 共用一個隊列，同 src/main.py
+#   per_channel  每個 Channel 一個獨立控制器，同 src/asyc_parall*.py 的 Worker
+# 每次執行皆於記憶體中記錄 --log_cmd 指令串流，不一致時回報第一個分歧的指令及其前後指令。
+# ----------------------------------------------------------------------------
+
+# FRFCFS age cap of every engine: short, so that the starvation override is exercised on the generated traces
+# 所有引擎的 FRFCFS age cap：設得較短，使飢餓優先機制在產生的 Trace 上也會被觸發
+AGE_CAP = 100
+# Page timeout of the adaptive page policy: short as well, so that timeouts expire on the generated traces
+# adaptive Page 策略的逾時：同樣設得較短，使逾時在產生的 Trace 上也會到期
+PAGE_TIMEOUT = 32
+
+# Engine name -> (controller factory (config, mapper, policy, queue_depth, **controller options), row-hit fast-forward); the first is the reference
+# 引擎名稱 -> (控制器建構函式 (config, mapper, policy, queue_depth, **控制器選項), Row 命中快轉)；第一個為參考引擎
+ENGINES = {
+    'scan': (lambda config, mapper, policy, qd, **options: DRAMController(config, mapper, scheduler_type=policy, queue_depth=qd, engine='scan', age_cap=AGE_CAP, **options), False),
+    'event': (lambda config, mapper, policy, qd, **options: DRAMController(config, mapper, scheduler_type=policy, queue_depth=qd, engine='event', age_cap=AGE_CAP, **options), False),
+    'opt': (lambda config, mapper, policy, qd, **options: DRAMControllerOpt(config, mapper, scheduler_type=policy, queue_depth=qd, age_cap=AGE_CAP, **options), False),
+    'scan_ff': (lambda config, mapper, policy, qd, **options: DRAMController(config, mapper, scheduler_type=policy, queue_depth=qd, engine='scan', age_cap=AGE_CAP, **options), True),
+    'event_ff': (lambda config, mapper, policy, qd, **options: DRAMController(config, mapper, scheduler_type=policy, queue_depth=qd, engine='event', age_cap=AGE_CAP, **options), True),
+    'opt_ff': (lambda config, mapper, policy, qd, **options: DRAMControllerOpt(config, mapper, scheduler_type=policy, queue_depth=qd, age_cap=AGE_CAP, **options), True),
+}
+
+MODES = ('shared', 'per_channel')
+POLICIES = ('FIFO', 'PageHitFirst', 'FRFCFS')
+
+METRICS = ('total_cycles', 'total_bytes', 'bus_busy_cycles', 'page_hits', 'page_misses', 'page_conflicts', 'completed_requests',
+           'queue_depth_samples', 'cumulative_queue_depth', 'turnarounds', 'idle_precharges', 'auto_precharges')
+
+# Generated trace patterns: name -> (count, seed)
+# 產生的 Trace 樣式：名稱 -> (數量, 亂數種子)
+GENERATED = {
+    'gen_seq': (400, 1),
+    'gen_rand': (400, 2),
+    'gen_streams': (400, 3),
+    'gen_hot_rows': (400, 4),
+}
+
+
+class CommandLog:
+    """
+    In-memory stand-in for the --log_cmd file: collects the command lines.
+    --log_cmd 檔案的記憶體替代品：收集指令行。
+    """
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text.rstrip('\n'))
+
+    def close(self):
+        pass
+
+
+def generate_trace(pattern, count, seed):
+    """
+    Returns a deterministic list of (is_write, address, bus_width_log2, burst_len_code) transactions.
+    回傳確定性的 (is_write, address, bus_width_log2, burst_len_code) 交易列表。
+    Patterns: gen_seq (sequential), gen_rand (random), gen_streams (four
+    interleaved strided streams) and gen_hot_rows (a few rows hit repeatedly,
+    mixing row hits with conflicts).
+    樣式：gen_seq (循序)、gen_rand (隨機)、gen_streams (四條交錯的跨距串流) 與 gen_hot_rows (反覆存取少數 Row，混合命中與衝突)。
+    """
+    rng = random.Random(seed)
+    transactions = []
+    address = 0
+    streams = [0x100000 * i for i in range(4)]
+    hot_rows = [rng.randrange(1 << 30) & ~0xFFF for _ in range(6)]
+
+    for i in range(count):
+        burst_len_code = rng.randrange(8)
+        size = 64 * (burst_len_code + 1)
+        is_write = rng.random() < 0.3
+        if pattern == 'gen_seq':
+            current = address
+            address += size
+        elif pattern == 'gen_rand':
+            current = rng.randrange(1 << 32) & ~0x3F
+        elif pattern == 'gen_streams':
+            current = streams[i % 4]
+            streams[i % 4] += 0x1000
+        elif pattern == 'gen_hot_rows':
+            current = rng.choice(hot_rows) + (rng.randrange(64) << 6)
+        else:
+            raise ValueError(f"Unknown trace pattern: {pattern}")
+        transactions.append((is_write, current, 6, burst_len_code))
+    return transactions
+
+
+def load_transactions(trace):
+    """
+    Returns the transactions of a generated pattern name or a trace file path.
+    回傳產生樣式名稱或 Trace 檔案路徑的交易。
+    """
+    if trace in GENERATED:
+        return generate_trace(trace, *GENERATED[trace])
+    return list(iter_transactions(trace))
+
+
+def _drive(controller, requests, fast_forward=False):
+    """
+    Same fill/tick loop as src/main.py and the src/asyc_parall*.py workers.
+    與 src/main.py 及 src/asyc_parall*.py Worker 相同的填充/步進迴圈。
+    """
+    trace_iter = iter(requests)
+    next_req = next(trace_iter, None)
+
+    def refill():
+        nonlocal next_req
+        while next_req is not None and controller.has_room(next_req):
+            controller.queue.append(next_req)
+            next_req = next(trace_iter, None)
+
+    while next_req is not None or len(controller.queue) > 0:
+        refill()
+        if not (fast_forward and controller.fast_forward(refill)):
+            controller.tick()
+
+    total_cycles = controller.current_time
+    if controller.data_bus_free_time:
+        total_cycles = max(total_cycles, max(controller.data_bus_free_time.values()))
+    stats = controller.stats
+    return {
+        'total_cycles': max(1, total_cycles),
+        'total_bytes': stats['total_bytes'],
+        'bus_busy_cycles': stats['bus_busy_cycles'],
+        'page_hits': stats['page_hits'],
+        'page_misses': stats['page_misses'],
+        'page_conflicts': stats['page_conflicts'],
+        'completed_requests': controller.completed_requests,
+        'queue_depth_samples': stats['queue_depth_samples'],
+        'cumulative_queue_depth': stats['cumulative_queue_depth'],
+        'turnarounds': stats['turnarounds'],
+        'idle_precharges': stats['idle_precharges'],
+        'auto_precharges': stats['auto_precharges'],
+    }
+
+
+def run_engine(engine, mode, config, mapping, transactions, policy, queue_depth, record_commands=True, write_queue_depth=0, page_policy='open',
+               auto_precharge=False):
+    """
+    Runs one engine and returns {stream: (metrics, command_lines)}.
+    執行單一引擎並回傳 {串流: (指標, 指令行)}。
+    stream is 'all' in shared mode and 'CH<n>' per channel in per_channel
+    mode; command_lines is None unless record_commands.
+    shared 模式下串流為 'all'，per_channel 模式下為各 Channel 的 'CH<n>'；未指定 record_commands 時 command_lines 為 None。
+    """
+    mapper = AddressMapper(mapping)
+    requests = [req.map(mapper) for req in iter_chunks(transactions, mapper)]
+    if mode == 'shared':
+        groups = {'all': requests}
+    else:
+        groups = {}
+        for req in requests:
+            groups.setdefault(f"CH{req.channel}", []).append(req)
+
+    outputs = {}
+    for stream, stream_requests in sorted(groups.items()):
+        factory, fast_forward = ENGINES[engine]
+        controller = factory(config, mapper, policy, queue_depth, write_queue_depth=write_queue_depth,
+                             page_policy=page_policy, page_timeout=PAGE_TIMEOUT, auto_precharge=auto_precharge)
+        log = CommandLog() if record_commands else None
+        controller.cmd_log_file = log
+        metrics = _drive(controller, stream_requests, fast_forward)
+        outputs[stream] = (metrics, log.lines if log is not None else None)
+    return outputs
+
+
+def first_divergence(ref_lines, lines):
+    """
+    Returns the index of the first differing command, or None if the streams are equal.
+    回傳第一個不同指令的索引，若串流相同則回傳 None。
+    """
+    for i, (a, b) in enumerate(zip(ref_lines, lines)):
+        if a != b:
+            return i
+    if len(ref_lines) != len(lines):
+        return min(len(ref_lines), len(lines))
+    return None
+
+
+def format_divergence(ref_name, ref_lines, name, lines, index, context=5):
+    """
+    Formats the commands around the first divergence of two command streams.
+    格式化兩個指令串流第一個分歧點前後的指令。
+    """
+    out = [f"  First divergent command at #{index}:"]
+    for i in range(max(0, index - context), index):
+        out.append(f"      #{i:<6} {ref_lines[i]}")
+    for label, stream in ((ref_name, ref_lines), (name, lines)):
+        shown = stream[index:index + context]
+        out.append(f"    {label:>6}: " + (shown[0] if shown else "<end of stream>"))
+        for i, line in enumerate(shown[1:], index + 1):
+            out.append(f"      #{i:<6} {line}")
+    return "\n".join(out)
+
+
+def compare_point(trace, config, mapping, policy, queue_depth, mode, engines, record_commands=True, context=5, write_queue_depth=0,
+                  page_policy='open', auto_precharge=False):
+    """
+    Runs every engine on one point and returns a list of mismatch reports (empty if all agree).
+    於單一測試點執行所有引擎，回傳不一致報告列表 (全部一致時為空)。
+    write_queue_depth > 0 runs the controllers with a separate write queue (default watermarks);
+    page_policy selects the page policy (adaptive with a timeout of PAGE_TIMEOUT);
+    auto_precharge enables RDA/WRA.
+    write_queue_depth > 0 時控制器使用獨立寫入隊列 (預設水位)；page_policy 選擇 Page 策略 (adaptive 的逾時為 PAGE_TIMEOUT)；
+    auto_precharge 啟用 RDA/WRA。
+    """
+    transactions = load_transactions(trace)
+    ref_name = engines[0]
+    ref = run_engine(ref_name, mode, config, mapping, transactions, policy, queue_depth, record_commands, write_queue_depth, page_policy, auto_precharge)
+
+    reports = []
+    for name in engines[1:]:
+        out = run_engine(name, mode, config, mapping, transactions, policy, queue_depth, record_commands, write_queue_depth, page_policy, auto_precharge)
+        for stream in sorted(set(ref) | set(out)):
+            if stream not in ref or stream not in out:
+                reports.append(f"  {stream}: present in only one of {ref_name}/{name}")
+                continue
+            (ref_metrics, ref_lines), (metrics, lines) = ref[stream], out[stream]
+            diffs = [f"{key}: {ref_metrics[key]} != {metrics[key]}" for key in METRICS if ref_metrics[key] != metrics[key]]
+            index = first_divergence(ref_lines, lines) if record_commands else None
+            if not diffs and index is None:
+                continue
+            report = [f"  {stream} {name} vs {ref_name}: " + ("; ".join(diffs) if diffs else "metrics equal, command streams differ")]
+            if index is not None:
+                report.append(format_divergence(ref_name, ref_lines, name, lines, index, context))
+            reports.append("\n".join(report))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that every scheduler engine produces identical simulations (確認所有排程引擎的模擬結果完全相同)')
+    parser.add_argument('--traces', nargs='+', default=list(GENERATED) + ['traces/mix/rand_mix_128B.trace', 'traces/basic100/seq_write_256B.trace'],
+                        help=f"Trace files and/or generated patterns {list(GENERATED)} (Trace 檔案及/或產生樣式)")
+    parser.add_argument('--configs', nargs='+', default=sorted(glob.glob('configs/*_cfg.json')), help='Timing config JSON files, default all (時序設定檔，預設為全部)')
+    parser.add_argument('--mappings', nargs='+', default=sorted(glob.glob('configs/mapping_*.json')), help='Address mapping JSON files, default all (位址映射檔，預設為全部)')
+    parser.add_argument('--policies', nargs='+', default=list(POLICIES), choices=list(POLICIES), help='Scheduling policies (排程策略)')
+    parser.add_argument('--queue_depths', nargs='+', type=int, default=[16], help='Command queue depths (指令隊列深度)')
+    parser.add_argument('--write_queue_depths', nargs='+', type=int, default=[0], help='Write queue depths, 0 = shared read/write queue (寫入隊列深度，0 = 讀寫共用隊列)')
+    parser.add_argument('--page_policies', nargs='+', default=['open'], choices=list(PAGE_POLICIES), help='Page policies (Page 策略)')
+    parser.add_argument('--auto_precharge', nargs='+', default=['off'], choices=['off', 'on'], help='Auto-precharge (RDA/WRA) settings to run (要執行的自動預充電 (RDA/WRA) 設定)')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES), help='Queue modes: shared (main.py) and/or per_channel (asyc_parall workers) (隊列模式)')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES), help='Engines to compare; the first is the reference (要比較的引擎，第一個為參考)')
+    parser.add_argument('--no_commands', action='store_true', help='Compare metrics only, not the command streams (只比較指標，不比較指令串流)')
+    parser.add_argument('--context', type=int, default=5, help='Commands shown around a divergence (分歧點前後顯示的指令數)')
+    parser.add_argument('--stop_on_failure', action='store_true', help='Stop at the first mismatch (遇到第一個不一致即停止)')
+    args = parser.parse_args()
+
+    if len(args.engines) < 2:
+        parser.error('--engines needs at least two engines to compare')
+
+    configs = {path: load_config(path) for path in args.configs}
+    mappings = {path: load_mapping(path) for path in args.mappings}
+    points = list(itertools.product(args.traces, args.configs, args.mappings, args.policies, args.queue_depths, args.write_queue_depths,
+                                    args.page_policies, args.auto_precharge, args.modes))
+
+    print(f"Comparing {', '.join(args.engines)} (reference: {args.engines[0]}) on {len(points)} point(s)")
+    failures = 0
+    for i, (trace, config, mapping, policy, qd, wqd, page_policy, auto_precharge, mode) in enumerate(points, 1):
+        reports = compare_point(trace, configs[config], mappings[mapping], policy, qd, mode, args.engines,
+                                record_commands=not args.no_commands, context=args.context, write_queue_depth=wqd, page_policy=page_policy,
+                                auto_precharge=auto_precharge == 'on')
+        label = (f"{os.path.basename(trace)} {os.path.basename(config)} {os.path.basename(mapping)} {policy} QD={qd}"
+                 f"{f' WQ={wqd}' if wqd else ''}{f' page={page_policy}' if page_policy != 'open' else ''}{' RDA/WRA' if auto_precharge == 'on' else ''} {mode}")
+        if reports:
+            failures += 1
+            print(f"[{i}/{len(points)}] MISMATCH {label}")
+            for report in reports:
+                print(report)
+            if args.stop_on_failure:
+                break
+        else:
+            print(f"[{i}/{len(points)}] ok {label}")
+
+    print()
+    print(f"{failures} mismatching point(s) out of {len(points)}" if failures else f"All {len(points)} point(s) identical")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
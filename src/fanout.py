@@ -0,0 +1,206 @@
+import multiprocessing
+import queue
+import struct
+import traceback
+from multiprocessing import shared_memory
+
+from shard import SHARD_RECORD, pack_request, unpack_requests
+
+# ----------------------------------------------------------------------------
+# Shared-memory channel rings (共享記憶體 Channel 環形緩衝區)
+#
+# One SharedMemory block per channel, split into RING_SLOTS fixed-size slots.
+# Each slot holds a record count (u32) followed by up to RING_BATCH shard
+# records (see shard.py). A count of 0 marks the end of the stream.
+# Two semaphores count free and filled slots: the producer blocks when every
+# slot of a channel is full (backpressure), the consumer blocks when none is.
+# 每個 Channel 一塊 SharedMemory，切分為 RING_SLOTS 個固定大小的槽位。
+# 每個槽位包含紀錄數量 (u32) 與最多 RING_BATCH 筆分片紀錄 (見 shard.py)，數量為 0 代表串流結束。
+# 以兩個號誌計算空槽與滿槽：該 Channel 的槽位全滿時生產者等待 (背壓)，全空時消費者等待。
+# ----------------------------------------------------------------------------
+
+RING_SLOTS = 8
+RING_BATCH = 4096
+
+SLOT_HEADER = struct.Struct('<I4x')
+
+
+class ChannelRing:
+    """
+    Single-producer, single-consumer ring of shard record batches in shared memory.
+    位於共享記憶體、單一生產者與單一消費者的分片紀錄批次環形緩衝區。
+    """
+    def __init__(self, channel, slots=RING_SLOTS, batch_size=RING_BATCH):
+        self.channel = channel
+        self.slots = slots
+        self.batch_size = batch_size
+        self.slot_size = SLOT_HEADER.size + batch_size * SHARD_RECORD.size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_size)
+        self.free = multiprocessing.Semaphore(slots)
+        self.filled = multiprocessing.Semaphore(0)
+        # Next slot index, local to the producer or the consumer side
+        # 下一個槽位索引，生產者與消費者各自維護
+        self.index = 0
+
+    def put(self, data, count, consumer=None):
+        """
+        Writes one batch of packed records, waiting for a free slot.
+        寫入一批已打包的紀錄，必要時等待空槽。
+        Raises RuntimeError if the consumer process exits before freeing a slot.
+        若消費者行程在釋放槽位前結束則拋出 RuntimeError。
+        """
+        while not self.free.acquire(timeout=1.0):
+            if consumer is not None and not consumer.is_alive():
+                raise RuntimeError(f"CH{self.channel} worker exited with code {consumer.exitcode}")
+
+        offset = (self.index % self.slots) * self.slot_size
+        SLOT_HEADER.pack_into(self.shm.buf, offset, count)
+        start = offset + SLOT_HEADER.size
+        self.shm.buf[start:start + len(data)] = data
+        self.index += 1
+        self.filled.release()
+
+    def close(self, consumer=None):
+        """
+        Marks the end of the stream.
+        標記串流結束。
+        """
+        self.put(b'', 0, consumer)
+
+    def release(self):
+        """
+        Frees the shared memory block; call once the consumer has finished.
+        釋放共享記憶體區塊；需在消費者結束後呼叫。
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RingReader:
+    """
+    TraceReader variant that consumes a ChannelRing in the worker process and
+    yields its pre-mapped Request chunks in trace order.
+    於 Worker 行程中消費 ChannelRing，並依 Trace 順序產生已映射 Request 區塊的 TraceReader 版本。
+    """
+    def __init__(self, ring):
+        self.ring = ring
+        self.requests = self._iter_requests()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.requests)
+
+    def _iter_requests(self):
+        ring = self.ring
+        buf = ring.shm.buf
+        while True:
+            ring.filled.acquire()
+            offset = (ring.index % ring.slots) * ring.slot_size
+            count, = SLOT_HEADER.unpack_from(buf, offset)
+            start = offset + SLOT_HEADER.size
+            # Copy the batch out so the slot can be handed back immediately
+            # 先將批次複製出來，以便立即歸還槽位
+            data = bytes(buf[start:start + count * SHARD_RECORD.size])
+            ring.index += 1
+            ring.free.release()
+
+            if count == 0:
+                return
+            yield from unpack_requests(ring.channel, data)
+
+
+def fan_out_trace(trace_reader, mapper, start_consumer, slots=RING_SLOTS, batch_size=RING_BATCH):
+    """
+    Producer side: streams a trace into one ChannelRing per channel.
+    生產者端：將 Trace 串流寫入每個 Channel 各自的 ChannelRing。
+
+    Requests from trace_reader are mapped if needed and batched per channel.
+    The first request of a channel creates its ring and calls
+    start_consumer(channel_id, ring), which must start and return the worker
+    process; consumers run concurrently, so the rings only hold a bounded
+    window of the trace.
+    trace_reader 的請求於必要時映射，並依 Channel 分批。某 Channel 的第一個請求會建立其環形緩衝區並呼叫
+    start_consumer(channel_id, ring)，該函式需啟動並回傳 Worker 行程；消費者同時執行，因此緩衝區只保存 Trace 的有限片段。
+    Returns {channel_id: (ring, process)} for every channel seen.
+    回傳所有出現過的 Channel 之 {channel_id: (ring, process)}。
+    """
+    channels = {}
+    batches = {}
+
+    try:
+        for req in trace_reader:
+            if req.channel is None:
+                req.map(mapper)
+            ch = req.channel
+
+            batch = batches.get(ch)
+            if batch is None:
+                ring = ChannelRing(ch, slots, batch_size)
+                # Registered before the worker starts so it is released on failure
+                # 在啟動 Worker 前先登記，失敗時才能釋放
+                channels[ch] = (ring, None)
+                channels[ch] = (ring, start_consumer(ch, ring))
+                batch = batches[ch] = []
+
+            batch.append(pack_request(req))
+            if len(batch) >= batch_size:
+                ring, proc = channels[ch]
+                ring.put(b''.join(batch), len(batch), proc)
+                batch.clear()
+
+        for ch, (ring, proc) in channels.items():
+            batch = batches[ch]
+            if batch:
+                ring.put(b''.join(batch), len(batch), proc)
+            ring.close(proc)
+    except BaseException:
+        for ring, proc in channels.values():
+            if proc is not None:
+                proc.terminate()
+                proc.join()
+            ring.release()
+        raise
+
+    return channels
+
+
+def ring_worker(result_queue, target, channel_id, ring, *args):
+    """
+    Worker process entry: runs target(channel_id, RingReader(ring), *args)
+    and reports (channel_id, result, error_traceback) on result_queue.
+    Worker 行程進入點：執行 target(channel_id, RingReader(ring), *args)，並將 (channel_id, 結果, 錯誤追蹤) 回報至 result_queue。
+    """
+    try:
+        result_queue.put((channel_id, target(channel_id, RingReader(ring), *args), None))
+    except BaseException:
+        result_queue.put((channel_id, None, traceback.format_exc()))
+
+
+def collect_ring_results(result_queue, channels):
+    """
+    Waits for one result per channel started by fan_out_trace.
+    等待 fan_out_trace 啟動的每個 Channel 回報結果。
+    Raises RuntimeError if a worker fails or exits without reporting.
+    若 Worker 失敗或未回報即結束則拋出 RuntimeError。
+    """
+    results = {}
+    suspects = set()
+    while len(results) < len(channels):
+        try:
+            ch, result, error = result_queue.get(timeout=1.0)
+        except queue.Empty:
+            # A worker that exited without reporting is given one more poll,
+            # since its result may still be in flight.
+            # 未回報即結束的 Worker 再多等待一輪，因其結果可能仍在傳送中。
+            missing = {ch for ch, (_, proc) in channels.items() if ch not in results and not proc.is_alive()}
+            lost = missing & suspects
+            if lost:
+                raise RuntimeError(f"Worker(s) for channel(s) {sorted(lost)} exited without a result")
+            suspects = missing
+            continue
+        if error is not None:
+            raise RuntimeError(f"CH{ch} worker failed:\n{error}")
+        results[ch] = result
+    return list(results.values())
@@ -1,4 +1,5 @@
 import argparse
+import json
 import sys
 import os
 
@@ -7,97 +8,38 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
 
 from config import load_config, load_mapping
 from mapper import AddressMapper
-from dram_sim import DRAMController
-
-class TraceReader:
-    """
-    Reads and parses trace files with hardware-aligned chunking.
-    讀取並解析 Trace 檔案，並進行硬體對齊的區塊切割。
-    """
-    def __init__(self, filepath, mapper):
-        self.filepath = filepath
-        self.file = open(filepath, 'r')
-        self.mapper = mapper
-        self.pending_chunks = []
-
-    def __iter__(self):
-        return self
-
-    def __next__(self):
-        # Return pending chunks if any exist
-        # 如果有待處理的區塊，先回傳
-        if self.pending_chunks:
-            return self.pending_chunks.pop(0)
-
-        line = self.file.readline()
-        if not line:
-            self.file.close()
-            raise StopIteration
-
-        parts = line.strip().split()
-        if not parts:
-            return self.__next__()
-
-        # Format: [R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # 格式：[R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code]
-        # Data Size = (2^Bus_Width_Log2) * (Burst_Length_Code + 1)
-
-        type_str = parts[0]
-        addr_str = parts[1]
-        bus_width_log2 = int(parts[2])
-        burst_len_code = int(parts[3], 16)
-
-        is_write = 'W' in type_str
-        start_address = int(addr_str, 16)
-
-        # Calculate total Request Size
-        # 計算總請求大小
-        beats = burst_len_code + 1
-        bytes_per_beat = 2**bus_width_log2
-        total_size = bytes_per_beat * beats
-
-        curr_addr = start_address
-        remaining_size = total_size
-
-        # Max chunk size logic: Limit to 2 DRAM Burst Lengths (2BL).
-        # LPDDR4/5 Burst Length = 16. So 2 BL = 32 transfers.
-        # However, the `bus_width_log2` in the trace is typically 6 (64 Bytes per AXI beat, which is already an entire 2-channel 32-bit DRAM burst or a single 64-bit DRAM burst).
-        # A single 16-beat BL on a 64-bit (8-Byte) bus is 16 * 8 = 128 Bytes.
-        # 2 BL = 2 * 128 = 256 Bytes.
-        # 最大區塊大小邏輯：限制為 2 個 DRAM Burst Length (2BL)。
-        # 單一 64-bit 匯流排的 16-beat BL 為 128 Bytes。2 BL = 256 Bytes。
-        max_chunk_size = 256
-
-        while remaining_size > 0:
-            next_boundary = self.mapper.get_next_boundary(curr_addr)
-
-            # Chunk size is limited by the remaining size, the next hardware boundary, and the 2BL max limit.
-            # 區塊大小受限於剩餘大小、下一個硬體邊界、以及 2BL 的最大限制。
-            chunk_size = min(remaining_size, next_boundary - curr_addr, max_chunk_size)
-
-            # Important: Hardware alignment means that a single request must not cross boundary.
-            # 重要：硬體對齊代表單一請求不能跨越邊界。
-            self.pending_chunks.append({
-                'is_write': is_write,
-                'address': curr_addr,
-                'size': chunk_size,
-                'beats': chunk_size // bytes_per_beat
-            })
-
-            curr_addr += chunk_size
-            remaining_size -= chunk_size
-
-        return self.pending_chunks.pop(0)
+from dram_sim import FRFCFS_AGE_CAP, PAGE_POLICIES, PAGE_TIMEOUT, POLICIES, DRAMController
+from chunker import BlockTraceReader, TraceReader
+from simulate import result_from_controller
+from trace_bin import BinaryTraceReader, is_binary_trace
+from profiler import Profiler, format_profile, phase
+from checkpoint import PositionedTraceReader, checkpoint_path, load_checkpoint, next_checkpoint, restore_controller, resume_interval, save_checkpoint
+from trace_index import get_index
 
 def main():
     parser = argparse.ArgumentParser(description='Simple DRAM Simulator')
     parser.add_argument('--config', required=True, help='Path to timing config JSON (時序設定檔路徑)')
     parser.add_argument('--mapping', required=True, help='Path to address mapping JSON (位址映射檔路徑)')
     parser.add_argument('--trace', required=True, help='Path to trace file (Trace 檔案路徑)')
-    parser.add_argument('--policy', default='PageHitFirst', choices=['FIFO', 'PageHitFirst'], help='Scheduling policy (排程策略)')
+    parser.add_argument('--policy', default='PageHitFirst', choices=list(POLICIES), help='Scheduling policy (排程策略)')
     parser.add_argument('--queue_depth', type=int, default=16, help='Command queue depth (指令隊列深度)')
+    parser.add_argument('--age_cap', type=int, default=FRFCFS_AGE_CAP, help='FRFCFS: cycles a request may wait before row hits stop bypassing it (FRFCFS：請求等待超過此週期數後，Row 命中不再可越過它)')
+    parser.add_argument('--write_queue_depth', type=int, default=0, help='Per-channel write queue depth, 0 = reads and writes share --queue_depth (每 Channel 獨立寫入隊列深度，0 = 讀寫共用 --queue_depth)')
+    parser.add_argument('--write_high', type=int, default=None, help='Queued writes of a channel that start its write drain, default 3/4 of the write queue (Channel 開始排空寫入的寫入筆數，預設為寫入隊列的 3/4)')
+    parser.add_argument('--write_low', type=int, default=None, help='Queued writes of a channel that end its write drain, default 1/4 of the write queue (Channel 結束排空寫入的寫入筆數，預設為寫入隊列的 1/4)')
+    parser.add_argument('--page_policy', default='open', choices=list(PAGE_POLICIES), help='Page policy: open, closed (precharge once no queued request hits the row) or adaptive (precharge after an idle timeout) (Page 策略：open、closed (沒有隊列請求命中該 Row 即預充電) 或 adaptive (閒置逾時後預充電))')
+    parser.add_argument('--page_timeout', type=int, default=PAGE_TIMEOUT, help='Adaptive page policy: initial idle cycles before a bank is precharged (adaptive Page 策略：Bank 預充電前的初始閒置週期數)')
+    parser.add_argument('--auto_precharge', action='store_true', help='Issue the last queued RD/WR to a row as RDA/WRA, closing it without a PRE command (對 Row 的最後一個隊列 RD/WR 以 RDA/WRA 發出，不需 PRE 指令即關閉該 Row)')
+    parser.add_argument('--engine', default='scan', choices=['scan', 'event'], help='Scheduler engine: per-bank scan or event-driven (排程引擎：逐 Bank 掃描或事件驅動)')
+    parser.add_argument('--fast_forward', action='store_true', help='Issue row-hit streaks in one batch, same results (Row 命中連續段批次發出，結果相同)')
     parser.add_argument('--interval_us', type=float, default=None, help='Interval in microseconds for calculating utilization (計算利用率的時間區間，單位為 us)')
+    parser.add_argument('--chunk_block', type=int, default=0, help='Chunk and map the trace with NumPy in blocks of N transactions, 0 = per-transaction reader (以 NumPy 每 N 筆交易為一批進行切割與映射，0 = 逐筆讀取)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results as JSON to this file (另將結果以 JSON 格式寫入此檔案)')
+    parser.add_argument('--profile', action='store_true', help='Report simulator wall time per phase, throughput and peak RSS (回報模擬器各階段執行時間、吞吐量與峰值記憶體)')
     parser.add_argument('--log_dir', type=str, default='.', help='Directory to save the interval log files (存放 interval log 檔案的資料夾)')
+    parser.add_argument('--checkpoint_us', type=float, default=None, help='Write a controller checkpoint every N microseconds of simulated time (每隔 N 微秒模擬時間寫入控制器檢查點)')
+    parser.add_argument('--checkpoint_dir', type=str, default='.', help='Directory to save the checkpoint files (存放檢查點檔案的資料夾)')
+    parser.add_argument('--resume', type=str, default=None, help='Resume from this checkpoint file; results are identical to an uninterrupted run (由此檢查點檔繼續執行，結果與未中斷的執行相同)')
 
     args = parser.parse_args()
 
@@ -113,15 +55,62 @@ def main():
     # Initialize Components
     # 初始化元件
     mapper = AddressMapper(mapping)
-    controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth)
+    try:
+        controller = DRAMController(config, mapper, scheduler_type=args.policy, queue_depth=args.queue_depth, engine=args.engine, age_cap=args.age_cap,
+                                    write_queue_depth=args.write_queue_depth, write_high=args.write_high, write_low=args.write_low,
+                                    page_policy=args.page_policy, page_timeout=args.page_timeout, auto_precharge=args.auto_precharge)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    # Checkpointing reads the trace through a reader that tracks (and can seek to) positions
+    # 使用檢查點時，以可追蹤 (並可跳轉至) 讀取位置的讀取器讀取 Trace
+    checkpoint = None
+    trace_info = None
+    if args.checkpoint_us is not None or args.resume is not None:
+        trace_info = {'path': args.trace, 'sha256': get_index(args.trace).trace['sha256']}
+    if args.resume is not None:
+        try:
+            checkpoint = load_checkpoint(args.resume)
+            if checkpoint['trace']['sha256'] != trace_info['sha256']:
+                raise ValueError("Checkpoint was taken on a different trace")
+            restore_controller(controller, checkpoint['state'])
+        except (OSError, ValueError) as e:
+            print(f"Error loading checkpoint: {e}")
+            return
+
+    # Opt-in self-profiling: without --profile nothing is wrapped
+    # 選用的自身效能剖析：未指定 --profile 時不包裝任何東西
+    profiler = Profiler() if args.profile else None
+    if profiler is not None:
+        profiler.instrument_mapper(mapper)
+        profiler.instrument_controller(controller)
 
     # Trace Reader
     # Trace 讀取器
-    trace_reader = TraceReader(args.trace, mapper)
+    if checkpoint is not None:
+        position = checkpoint['position']
+        trace_reader = PositionedTraceReader(args.trace, mapper, start=position) if position is not None else iter(())
+    elif trace_info is not None:
+        trace_reader = PositionedTraceReader(args.trace, mapper)
+    elif args.chunk_block > 0:
+        trace_reader = BlockTraceReader(args.trace, mapper, block_size=args.chunk_block)
+    elif is_binary_trace(args.trace):
+        trace_reader = BinaryTraceReader(args.trace, mapper)
+    else:
+        trace_reader = TraceReader(args.trace, mapper)
     trace_iter = iter(trace_reader)
+    if profiler is not None:
+        trace_iter = profiler.instrument_iter('trace_parse', trace_iter)
 
     print(f"Starting simulation with {args.config} and {args.mapping}")
     print(f"Policy: {args.policy}, Queue Depth: {args.queue_depth}")
+    if controller.write_queue_depth:
+        print(f"Write Queue Depth: {controller.write_queue_depth}, Watermarks: high {controller.write_high}, low {controller.write_low}")
+    if controller.page_policy != 'open':
+        print(f"Page Policy: {controller.page_policy}" + (f", Timeout: {controller.page_timeout}" if controller.page_policy == 'adaptive' else ""))
+    if controller.auto_precharge:
+        print("Auto-Precharge: RDA/WRA")
 
     interval_log_file = None
     interval_cycles = None
@@ -148,64 +137,104 @@ def main():
         print(f"Interval Logging Enabled: {args.interval_us} us (approx {int(interval_cycles)} cycles)")
         interval_log_file.write(f"Interval Logging Enabled: {args.interval_us} us\n")
         interval_log_file.write(f"Interval (us), Utilization (%), Completed AXI Reqs, Interval Bytes, Idle Cycles\n")
+        if checkpoint is not None:
+            interval_count, next_interval_cycle, last_bus_busy_cycles, last_completed_reqs, last_total_bytes = resume_interval(
+                checkpoint['driver'], args.interval_us, interval_cycles, controller)
+
+    checkpoint_cycles = None
+    next_checkpoint_cycle = None
+    if args.checkpoint_us is not None:
+        checkpoint_cycles = args.checkpoint_us * 1000.0 / (1000.0 / config['ClockFrequencyMHz'])
+        next_checkpoint_cycle = checkpoint_cycles
+        if checkpoint is not None:
+            next_checkpoint_cycle = next_checkpoint(checkpoint['driver'], args.checkpoint_us, checkpoint_cycles, controller.current_time)
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+    if checkpoint is not None:
+        print(f"Resumed from {args.resume} at cycle {controller.current_time}")
 
     # Simulation Loop
     # 模擬迴圈
     next_req = next(trace_iter, None)
 
+    def fill_queue():
+        nonlocal next_req
+        while next_req is not None and controller.has_room(next_req):
+            if next_req.channel is None:
+                next_req.map(mapper)
+            controller.queue.append(next_req)
+            next_req = next(trace_iter, None)
+
     while next_req is not None or len(controller.queue) > 0:
         # Fill Queue
         # 填充隊列
-        while next_req is not None and len(controller.queue) < args.queue_depth:
-            next_req['mapped'] = mapper.map_address(next_req['address'])
-            controller.queue.append(next_req)
-            next_req = next(trace_iter, None)
+        fill_queue()
 
-        # Run Simulator Step
-        # 執行模擬器步進
-        controller.tick()
+        # Run Simulator Step (or a whole row-hit streak, stopping at the next interval or checkpoint boundary)
+        # 執行模擬器步進 (或整段 Row 命中連續段，於下一個區間或檢查點邊界停止)
+        if not (args.fast_forward and controller.fast_forward(fill_queue, min(
+                (cycle for cycle in (next_interval_cycle, next_checkpoint_cycle) if cycle is not None), default=None))):
+            controller.tick()
 
         # Interval utilization logging
         if interval_cycles is not None and controller.current_time >= next_interval_cycle:
-            num_channels = max(1, len(controller.data_bus_free_time) if controller.data_bus_free_time else 1)
-
-            # Calculate cycles in this interval
-            # 計算這個區間的週期數
-            current_bus_busy_cycles = controller.stats['bus_busy_cycles']
-            interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
-
-            current_completed_reqs = controller.completed_requests
-            interval_reqs = current_completed_reqs - last_completed_reqs
-
-            current_total_bytes = controller.stats['total_bytes']
-            interval_bytes = current_total_bytes - last_total_bytes
-
-            # Available cycles across all channels in this interval
-            interval_total_available = interval_cycles * num_channels
-            interval_idle_cycles = max(0, interval_total_available - interval_busy)
-
-            # If busy cycles overshoot due to burst durations spanning across intervals, clamp it to 100%
-            capped_busy = min(interval_busy, interval_total_available)
-            interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
-
-            interval_time_us = args.interval_us * interval_count
-
-            # 強制轉換為整數並加入千分位逗號，避免科學記號
-            formatted_time = f"{int(interval_time_us):,}"
-
-            msg = f"Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
-            print(msg)
-            interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
-
-            last_bus_busy_cycles = current_bus_busy_cycles
-            last_completed_reqs = current_completed_reqs
-            last_total_bytes = current_total_bytes
-            interval_count += 1
-            next_interval_cycle += interval_cycles
+            with phase(profiler, 'interval_log'):
+                num_channels = max(1, len(controller.data_bus_free_time) if controller.data_bus_free_time else 1)
+
+                # Calculate cycles in this interval
+                # 計算這個區間的週期數
+                current_bus_busy_cycles = controller.stats['bus_busy_cycles']
+                interval_busy = current_bus_busy_cycles - last_bus_busy_cycles
+
+                current_completed_reqs = controller.completed_requests
+                interval_reqs = current_completed_reqs - last_completed_reqs
+
+                current_total_bytes = controller.stats['total_bytes']
+                interval_bytes = current_total_bytes - last_total_bytes
+
+                # Available cycles across all channels in this interval
+                interval_total_available = interval_cycles * num_channels
+                interval_idle_cycles = max(0, interval_total_available - interval_busy)
+
+                # If busy cycles overshoot due to burst durations spanning across intervals, clamp it to 100%
+                capped_busy = min(interval_busy, interval_total_available)
+                interval_utilization = (capped_busy / interval_total_available) * 100 if interval_total_available > 0 else 0
+
+                interval_time_us = args.interval_us * interval_count
+
+                # 強制轉換為整數並加入千分位逗號，避免科學記號
+                formatted_time = f"{int(interval_time_us):,}"
+
+                msg = f"Interval {formatted_time} us: Utilization = {interval_utilization:.2f} % | Reqs: {interval_reqs} | Bytes: {interval_bytes} | Idle: {int(interval_idle_cycles)}"
+                print(msg)
+                interval_log_file.write(f"{formatted_time}, {interval_utilization:.2f}, {interval_reqs}, {interval_bytes}, {int(interval_idle_cycles)}\n")
+
+                last_bus_busy_cycles = current_bus_busy_cycles
+                last_completed_reqs = current_completed_reqs
+                last_total_bytes = current_total_bytes
+                interval_count += 1
+                next_interval_cycle += interval_cycles
+
+        # Periodic checkpoint
+        # 週期性檢查點
+        if checkpoint_cycles is not None and controller.current_time >= next_checkpoint_cycle:
+            while next_checkpoint_cycle <= controller.current_time:
+                next_checkpoint_cycle += checkpoint_cycles
+            driver = {'checkpoint_us': args.checkpoint_us, 'next_checkpoint_cycle': next_checkpoint_cycle, 'interval': None}
+            if interval_cycles is not None:
+                driver['interval'] = {
+                    'interval_us': args.interval_us, 'interval_count': interval_count, 'next_interval_cycle': next_interval_cycle,
+                    'last_bus_busy_cycles': last_bus_busy_cycles, 'last_completed_reqs': last_completed_reqs, 'last_total_bytes': last_total_bytes,
+                }
+            path = save_checkpoint(checkpoint_path(args.checkpoint_dir, os.path.splitext(os.path.basename(args.trace))[0], controller.current_time),
+                                   controller, trace_reader.position if next_req is not None else None, driver, trace_info)
+            print(f"Checkpoint: {path}")
 
     if interval_log_file is not None:
         interval_log_file.close()
 
+    if profiler is not None:
+        profiler.finish(controller)
+
     # Stats Calculation
     # 統計計算
     stats = controller.stats
@@ -248,6 +277,22 @@ def main():
     print(f"Page Hits (Page 命中): {stats['page_hits']}")
     print(f"Page Misses (Page 未命中): {stats['page_misses']}")
     print(f"Page Conflicts (Page 衝突): {stats['page_conflicts']}")
+    print(f"Bus Turnarounds (匯流排轉向次數): {stats['turnarounds']}")
+    if controller.page_policy != 'open':
+        print(f"Idle Precharges (閒置預充電次數): {stats['idle_precharges']}")
+    if controller.auto_precharge:
+        print(f"Auto Precharges (自動預充電次數): {stats['auto_precharges']}")
+
+    if profiler is not None:
+        print()
+        print(format_profile(profiler.summary))
+
+    if args.json:
+        data = result_from_controller(controller).to_dict()
+        if profiler is not None:
+            data['profile'] = profiler.summary
+        with open(args.json, 'w') as f:
+            json.dump(data, f, indent=2)
 
 if __name__ == "__main__":
     main()
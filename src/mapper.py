@@ -1,14 +1,63 @@
+FIELDS = ("Channel", "Rank", "Bank", "Row", "Column")
+
+
 class AddressMapper:
     def __init__(self, mapping_config):
         self.mapping = mapping_config
+        self._compile()
 
-    def _extract_bits(self, addr, msb, lsb):
+    def _compile(self):
         """
-        Extracts bits from address within range [msb, lsb] (inclusive).
-        從位址中擷取 [msb, lsb] (包含) 範圍內的位元。
+        Compiles the mapping JSON once into a fixed plan.
+        將映射 JSON 一次編譯為固定的映射計畫。
+
+        self.plan holds, for each of FIELDS, a tuple of (lsb, mask, shift):
+        the field value is the OR of ((addr >> lsb) & mask) << shift.
+        self.boundary_size is the interleaving granularity used by get_next_boundary().
+        self.plan 對 FIELDS 中每個欄位保存 (lsb, mask, shift) 的 tuple：
+        欄位值為 ((addr >> lsb) & mask) << shift 的 OR 結果。
+        self.boundary_size 為 get_next_boundary() 使用的交錯粒度。
+        self.bank_group_shift is the position of the BankGroup bits within the
+        bank index, or None if the mapping has no BankGroup field.
+        self.bank_group_shift 為 BankGroup 位元在 Bank 索引中的位置；映射沒有 BankGroup 欄位時為 None。
         """
-        mask = (1 << (msb - lsb + 1)) - 1
-        return (addr >> lsb) & mask
+        # An optional BankGroup field forms the high bits of the bank index, so a
+        # bank stays identified by (channel, rank, bank) and its group is bank >> bank_group_shift
+        # 選用的 BankGroup 欄位構成 Bank 索引的高位元，因此 Bank 仍以 (channel, rank, bank) 識別，
+        # 其 Bank Group 為 bank >> bank_group_shift
+        self.bank_group_shift = None
+        plan = []
+        for key in FIELDS:
+            field_plan = []
+            current_shift = 0
+            ranges = self.mapping.get(key, [])
+            if key == "Bank" and "BankGroup" in self.mapping:
+                self.bank_group_shift = sum(msb - lsb + 1 for msb, lsb in ranges)
+                ranges = self.mapping["BankGroup"] + ranges
+
+            # LSB range first, so each range lands above the ones already placed
+            # 由低位區段開始，使每個區段排列在已放置的區段之上
+            for msb, lsb in reversed(ranges):
+                width = msb - lsb + 1
+                field_plan.append((lsb, (1 << width) - 1, current_shift))
+                current_shift += width
+            plan.append(tuple(field_plan))
+        self.plan = tuple(plan)
+
+        # We only care about bits that determine Channel, Rank, Bank, and Row.
+        # Column bits represent addresses within the same page/bank, so they don't break hardware parallelism boundaries.
+        # 我們只關心決定 Channel, Rank, Bank 和 Row 的位元。
+        # Column 位元代表同一 page/bank 內的位址，因此不會跨越硬體平行處理的邊界。
+        # The lowest LSB among all critical fields dictates the finest interleaving granularity
+        # 所有關鍵欄位中最低的 LSB 決定了最細的交錯粒度
+        critical_lsbs = [lsb for key in ["Channel", "Rank", "BankGroup", "Bank", "Row"] for _, lsb in self.mapping.get(key, [])]
+
+        # If no critical fields are found (e.g. invalid config), fallback to 1KB (bit 10)
+        # 如果沒有找到關鍵欄位（如無效設定），預設為 1KB (bit 10)
+        lowest_critical_lsb = min(critical_lsbs) if critical_lsbs else 10
+
+        self.boundary_size = 1 << lowest_critical_lsb
+        self.boundary_mask = ~(self.boundary_size - 1)
 
     def map_address(self, phys_addr):
         """
@@ -18,35 +67,53 @@ class AddressMapper:
         Returns a dictionary.
         回傳一個字典。
         """
-        result = {}
-        # Required keys: Channel, Rank, Bank, Row, Column
-        # 必要鍵值：Channel, Rank, Bank, Row, Column
-        for key in ["Channel", "Rank", "Bank", "Row", "Column"]:
-            ranges = self.mapping.get(key, [])
+        return dict(zip(FIELDS, self.map_fields(phys_addr)))
+
+    def map_fields(self, phys_addr):
+        """
+        Maps a physical address using the compiled plan.
+        使用編譯後的映射計畫映射實體位址。
+
+        Returns a tuple (channel, rank, bank, row, column).
+        回傳 tuple (channel, rank, bank, row, column)。
+        """
+        # Example: [[16, 14], [5, 4]] compiles to ((4, 0b11, 0), (14, 0b111, 2))
+        # Result = (Range0_Value << 2) | Range1_Value
+        # 範例：[[16, 14], [5, 4]] 編譯為 ((4, 0b11, 0), (14, 0b111, 2))
+        values = []
+        for field_plan in self.plan:
             value = 0
+            for lsb, mask, shift in field_plan:
+                value |= ((phys_addr >> lsb) & mask) << shift
+            values.append(value)
+        return tuple(values)
 
-            # Example: [[16, 14], [5, 4]]
-            # Range 0 (MSB part): [16, 14] -> 3 bits
-            # Range 1 (LSB part): [5, 4] -> 2 bits
-            # Result = (Range0_Value << 2) | Range1_Value
-            # 範例：[[16, 14], [5, 4]]
-            # 區段 0 (高位部分): [16, 14] -> 3 bits
-            # 區段 1 (低位部分): [5, 4] -> 2 bits
-            # 結果 = (區段0_數值 << 2) | 區段1_數值
+    def map_many(self, phys_addrs):
+        """
+        Vectorized map_address for a batch of physical addresses.
+        批次版本的 map_address，一次映射多個實體位址。
 
-            current_shift = 0
-            temp_value = 0
+        phys_addrs: NumPy array (or sequence) of addresses, converted to uint64.
+        Returns a dictionary of int64 arrays keyed like map_address().
+        phys_addrs：位址的 NumPy 陣列 (或序列)，會轉為 uint64。
+        回傳與 map_address() 相同鍵值的 int64 陣列字典。
 
-            # Iterate in reverse order (LSB first) to construct the value
-            # 以反向順序 (從低位區段開始) 迭代以建構數值
-            for r in reversed(ranges):
-                msb, lsb = r
-                width = msb - lsb + 1
-                part = self._extract_bits(phys_addr, msb, lsb)
-                temp_value |= (part << current_shift)
-                current_shift += width
+        Requires NumPy, which is only imported when this method is used.
+        需要 NumPy，僅在呼叫此方法時才匯入。
+        """
+        import numpy as np
 
-            result[key] = temp_value
+        addrs = np.asarray(phys_addrs, dtype=np.uint64)
+        result = {}
+        for key, field_plan in zip(FIELDS, self.plan):
+            value = np.zeros(addrs.shape, dtype=np.uint64)
+
+            # One shift/mask per range for the whole batch
+            # 每個區段對整批位址只做一次移位與遮罩
+            for lsb, mask, shift in field_plan:
+                value |= ((addrs >> np.uint64(lsb)) & np.uint64(mask)) << np.uint64(shift)
+
+            result[key] = value.astype(np.int64)
 
         return result
 
@@ -58,30 +125,6 @@ class AddressMapper:
         計算下一個會導致 Channel, Rank, Bank 或 Row 改變的實體位址邊界。
         這對於將大型 AXI burst 切割成硬體對齊的較小傳輸非常重要。
         """
-        # We only care about bits that determine Channel, Rank, Bank, and Row.
-        # Column bits represent addresses within the same page/bank, so they don't break hardware parallelism boundaries.
-        # 我們只關心決定 Channel, Rank, Bank 和 Row 的位元。
-        # Column 位元代表同一 page/bank 內的位址，因此不會跨越硬體平行處理的邊界。
-
-        lowest_critical_lsb = 64 # Start with an arbitrarily high bit
-
-        for key in ["Channel", "Rank", "Bank", "Row"]:
-            ranges = self.mapping.get(key, [])
-            for r in ranges:
-                # The lowest LSB among all critical fields dictates the finest interleaving granularity
-                # 所有關鍵欄位中最低的 LSB 決定了最細的交錯粒度
-                msb, lsb = r
-                if lsb < lowest_critical_lsb:
-                    lowest_critical_lsb = lsb
-
-        # If no critical fields are found (e.g. invalid config), fallback to 1KB (bit 10)
-        # 如果沒有找到關鍵欄位（如無效設定），預設為 1KB (bit 10)
-        if lowest_critical_lsb == 64:
-            lowest_critical_lsb = 10
-
-        boundary_size = 1 << lowest_critical_lsb
-
         # Calculate next boundary by clearing lower bits and adding boundary_size
         # 透過清除低位元並加上邊界大小來計算下一個邊界
-        next_boundary = (phys_addr & ~(boundary_size - 1)) + boundary_size
-        return next_boundary
+        return (phys_addr & self.boundary_mask) + self.boundary_size
@@ -0,0 +1,201 @@
+import contextlib
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then reported as None
+    # Windows 上無此模組；此時峰值 RSS 回報為 None
+    resource = None
+
+# ----------------------------------------------------------------------------
+# Opt-in self-performance instrumentation (選用的模擬器自身效能量測)
+#
+# A Profiler wraps the bound methods of one mapper / controller / trace
+# iterator in timing closures. Nothing is patched unless a Profiler is
+# created, so a run without --profile executes exactly the original code.
+# Times are exclusive: a phase called from inside another (e.g. address
+# mapping while a reader chunks the trace) is subtracted from its caller.
+# Profiler 以計時閉包包裝單一 mapper / controller / Trace 迭代器的方法。
+# 未建立 Profiler 時不會修改任何東西，因此未使用 --profile 的執行完全是原本的程式碼。
+# 時間為獨佔時間：在其他階段內呼叫的階段 (例如讀取器切割 Trace 時的位址映射) 會從呼叫者扣除。
+# ----------------------------------------------------------------------------
+
+# Controller methods -> phase name
+# 控制器方法 -> 階段名稱
+CONTROLLER_PHASES = (
+    ('tick', 'tick'),
+    ('get_command_status', 'command_status'),
+    ('get_command_ready_time', 'command_status'),
+    ('issue_command', 'issue_command'),
+    ('fast_forward', 'fast_forward'),
+)
+MAPPER_PHASES = (
+    ('map_fields', 'address_map'),
+    ('map_many', 'address_map'),
+    ('get_next_boundary', 'address_map'),
+)
+
+
+def peak_rss_kb():
+    """
+    Returns the peak resident set size of this process in KiB, or None if unknown.
+    回傳此行程的峰值常駐記憶體 (KiB)，無法取得時回傳 None。
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, KiB elsewhere
+    # ru_maxrss 在 macOS 上以 bytes 為單位，其他平台為 KiB
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class Profiler:
+    """
+    Collects exclusive wall time and call counts per phase.
+    收集各階段的獨佔執行時間與呼叫次數。
+    """
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        # Child time accumulators of the phases currently running
+        # 目前執行中各階段的子階段時間累計
+        self._stack = []
+        self.start = time.perf_counter()
+        self.summary = None
+
+    def wrap(self, name, func):
+        """
+        Returns func wrapped so that its calls are timed under phase name.
+        回傳包裝後的 func，其呼叫會計入階段 name。
+        """
+        seconds = self.seconds
+        calls = self.calls
+        stack = self._stack
+        clock = time.perf_counter
+        seconds.setdefault(name, 0.0)
+        calls.setdefault(name, 0)
+
+        def timed(*args, **kwargs):
+            start = clock()
+            stack.append(0.0)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                seconds[name] += elapsed - stack.pop()
+                calls[name] += 1
+                if stack:
+                    stack[-1] += elapsed
+        return timed
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager timing its body under phase name.
+        以階段 name 計時其內容的 context manager。
+        """
+        self.seconds.setdefault(name, 0.0)
+        self.calls.setdefault(name, 0)
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] += elapsed - self._stack.pop()
+            self.calls[name] += 1
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def instrument(self, obj, phases):
+        """
+        Replaces the given methods of obj (an instance) with timed wrappers.
+        以計時包裝取代 obj (實例) 的指定方法。
+        """
+        for method, name in phases:
+            func = getattr(obj, method, None)
+            if func is not None:
+                setattr(obj, method, self.wrap(name, func))
+        return obj
+
+    def instrument_mapper(self, mapper):
+        return self.instrument(mapper, MAPPER_PHASES)
+
+    def instrument_controller(self, controller):
+        return self.instrument(controller, CONTROLLER_PHASES)
+
+    def instrument_iter(self, name, iterable):
+        """
+        Returns an iterator over iterable whose next() calls are timed under phase name.
+        回傳一個迭代器，其 next() 呼叫計入階段 name。
+        """
+        timed_next = self.wrap(name, iter(iterable).__next__)
+        while True:
+            try:
+                item = timed_next()
+            except StopIteration:
+                return
+            yield item
+
+    def finish(self, controller=None, requests=None):
+        """
+        Stops the clock and returns (and keeps in .summary) the profile as plain data.
+        停止計時並以純資料回傳 (並保存於 .summary) 剖析結果。
+        With a controller, adds tick vs time-skipped cycles and simulation
+        throughput; requests defaults to the controller's completed requests.
+        若提供 controller，另加入步進次數與時間跳躍週期數以及模擬吞吐量；requests 預設為控制器完成的請求數。
+        """
+        wall = time.perf_counter() - self.start
+        phases = {name: {'seconds': self.seconds[name], 'calls': self.calls[name]} for name in self.seconds}
+        phases['other'] = {'seconds': max(0.0, wall - sum(self.seconds.values())), 'calls': None}
+        summary = {'wall_seconds': wall, 'phases': phases, 'peak_rss_kb': peak_rss_kb()}
+
+        if controller is not None:
+            ticks = self.calls.get('tick', 0)
+            cycles = controller.current_time
+            if controller.data_bus_free_time:
+                cycles = max(cycles, max(controller.data_bus_free_time.values()))
+            if requests is None:
+                requests = controller.completed_requests
+            summary.update({
+                'ticks': ticks,
+                # Cycles advanced beyond one per tick() by time skipping
+                # 因時間跳躍而超過每次 tick() 一個週期的推進週期數
+                'skipped_cycles': max(0, controller.current_time - ticks),
+                'sim_cycles': cycles,
+                'sim_cycles_per_second': cycles / wall if wall > 0 else 0,
+                'requests': requests,
+                'requests_per_second': requests / wall if wall > 0 else 0,
+            })
+
+        self.summary = summary
+        return summary
+
+
+def format_profile(summary, title='Profile (效能剖析)'):
+    """
+    Formats a Profiler summary as console lines.
+    將 Profiler 剖析結果格式化為終端機輸出。
+    """
+    wall = summary['wall_seconds']
+    lines = [f"--- {title} ---", f"Wall Time: {wall:.3f} s"]
+    for name, phase in sorted(summary['phases'].items(), key=lambda item: -item[1]['seconds']):
+        share = phase['seconds'] / wall * 100 if wall > 0 else 0
+        calls = f", {phase['calls']} calls" if phase['calls'] is not None else ""
+        lines.append(f"  {name}: {phase['seconds']:.3f} s ({share:.1f} %){calls}")
+    if 'ticks' in summary:
+        lines.append(f"Ticks: {summary['ticks']}, Time-Skipped Cycles: {summary['skipped_cycles']}")
+        lines.append(f"Sim Cycles/s: {summary['sim_cycles_per_second']:.0f}, Requests/s: {summary['requests_per_second']:.0f}")
+    if summary['peak_rss_kb'] is not None:
+        lines.append(f"Peak RSS: {summary['peak_rss_kb'] / 1024:.1f} MB")
+    return "\n".join(lines)
+
+
+def phase(profiler, name):
+    """
+    profiler.phase(name), or a no-op context when profiling is disabled (profiler is None).
+    回傳 profiler.phase(name)，未啟用剖析 (profiler 為 None) 時回傳無作用的 context。
+    """
+    return profiler.phase(name) if profiler is not None else contextlib.nullcontext()
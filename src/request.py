@@ -0,0 +1,55 @@
+class Request:
+    """
+    A single hardware-aligned queue entry produced by the trace readers.
+    由 Trace 讀取器產生的單一硬體對齊隊列項目。
+
+    Uses __slots__ instead of a dict: the fields are fixed, so every request
+    costs a small fixed-size object and attribute access in the scheduler's hot
+    loop avoids hashing string keys.
+    使用 __slots__ 取代字典：欄位固定，每個請求只佔用固定大小的物件，
+    排程熱迴圈中的屬性存取也不需對字串鍵值進行雜湊。
+    """
+    __slots__ = (
+        'is_write', 'address', 'size', 'beats',
+        # Mapped address (filled by map())
+        # 映射後的位址 (由 map() 填入)
+        'channel', 'rank', 'bank', 'row', 'column',
+        # Page classification: 'HIT', 'MISS', 'CONFLICT' or None
+        # Page 分類：'HIT', 'MISS', 'CONFLICT' 或 None
+        'status',
+        # Cached next command and its ready time (None when not cached)
+        # 快取的下一個指令與其就緒時間 (未快取時為 None)
+        'cached_ready_time', 'cached_cmd_type',
+        # Arrival order, cache generation and arrival time, maintained by DRAMController
+        # 到達順序、快取世代與到達時間，由 DRAMController 維護
+        'seq', 'gen', 'arrival',
+    )
+
+    def __init__(self, is_write, address, size, beats):
+        self.is_write = is_write
+        self.address = address
+        self.size = size
+        self.beats = beats
+        self.channel = None
+        self.rank = None
+        self.bank = None
+        self.row = None
+        self.column = None
+        self.status = None
+        self.cached_ready_time = None
+        self.cached_cmd_type = None
+        self.seq = None
+        self.gen = 0
+        self.arrival = None
+
+    def map(self, mapper):
+        """
+        Fills the Channel/Rank/Bank/Row/Column fields from the address mapper.
+        依位址映射器填入 Channel/Rank/Bank/Row/Column 欄位。
+        """
+        self.channel, self.rank, self.bank, self.row, self.column = mapper.map_fields(self.address)
+        return self
+
+    def __repr__(self):
+        kind = 'W' if self.is_write else 'R'
+        return f"Request({kind} 0x{self.address:x}, {self.size}B, CH{self.channel} RK{self.rank} BK{self.bank} ROW{self.row})"
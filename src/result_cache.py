@@ -0,0 +1,268 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+# Add src to path if needed, or assume running from root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from dram_sim import SIM_VERSION
+
+# ----------------------------------------------------------------------------
+# Content-addressed result cache (內容定址結果快取)
+#
+# <cache_dir>/results/<key[:2]>/<key>.json   one entry per simulation point
+# <cache_dir>/traces/<sha256(path)>.json     trace hash memo: size, mtime_ns, sha256
+#
+# key = sha256 of the trace content hash, the normalized config and mapping
+# (as returned by load_config/load_mapping), the policy, the queue depth, the
+# simulator mode and SIM_VERSION. Entry mtimes are refreshed on every hit,
+# so eviction by mtime is least-recently-used.
+# 鍵值為 Trace 內容雜湊、正規化後的 config 與 mapping (load_config/load_mapping 的結果)、
+# 排程策略、隊列深度、模擬模式與 SIM_VERSION 的 sha256。每次命中都會更新項目的 mtime，因此依 mtime 淘汰即為 LRU。
+# ----------------------------------------------------------------------------
+
+
+def default_cache_dir():
+    """
+    Returns $DRAM_SIM_CACHE, or ~/.cache/dram_bench.
+    回傳 $DRAM_SIM_CACHE，或 ~/.cache/dram_bench。
+    """
+    return os.environ.get('DRAM_SIM_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'dram_bench')
+
+
+def parse_size(text):
+    """
+    Parses a byte size such as '500M' or '2G' (K/M/G/T suffixes, base 1024).
+    解析如 '500M' 或 '2G' 的位元組大小 (K/M/G/T 字尾，以 1024 為基數)。
+    """
+    text = text.strip().upper().rstrip('B')
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class ResultCache:
+    """
+    Persistent on-disk cache of simulation results.
+    模擬結果的持久化磁碟快取。
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.results_dir = os.path.join(self.cache_dir, 'results')
+        self.traces_dir = os.path.join(self.cache_dir, 'traces')
+        self._trace_hashes = {}
+
+    def trace_hash(self, trace_path):
+        """
+        Returns the sha256 of the trace contents, memoized on disk by (size, mtime).
+        回傳 Trace 內容的 sha256，並依 (大小, mtime) 記錄於磁碟以避免重複計算。
+        """
+        path = os.path.abspath(trace_path)
+        st = os.stat(path)
+        stamp = (st.st_size, st.st_mtime_ns)
+
+        cached = self._trace_hashes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        memo_path = os.path.join(self.traces_dir, hashlib.sha256(path.encode()).hexdigest() + '.json')
+        digest = None
+        try:
+            with open(memo_path, 'r') as f:
+                memo = json.load(f)
+            if (memo['size'], memo['mtime_ns']) == stamp:
+                digest = memo['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            digest = h.hexdigest()
+            os.makedirs(self.traces_dir, exist_ok=True)
+            self._write_json(memo_path, {'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest})
+
+        self._trace_hashes[path] = (stamp, digest)
+        return digest
+
+    def key(self, trace_path, config, mapping, policy, queue_depth, mode='main', options=None):
+        """
+        Returns the cache key of one simulation point.
+        回傳單一模擬點的快取鍵值。
+        config and mapping are the loaded dicts; mode names the simulator
+        ('main' for the single-queue simulator) since the parallel ones give
+        different results for the same inputs. options is a dict of the
+        remaining controller options (age_cap, write queue, page policy, ...,
+        see sweep.OPTION_FIELDS).
+        config 與 mapping 為載入後的字典；mode 為模擬器名稱 (單一隊列模擬器為 'main')，因平行模擬器對相同輸入的結果不同。
+        options 為其餘控制器選項的字典 (age_cap、寫入隊列、Page 策略等，見 sweep.OPTION_FIELDS)。
+        """
+        material = {
+            'trace': self.trace_hash(trace_path),
+            'config': config,
+            'mapping': mapping,
+            'policy': policy,
+            'queue_depth': queue_depth,
+            'mode': mode,
+            'options': options or {},
+            'sim_version': SIM_VERSION,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.results_dir, key[:2], key + '.json')
+
+    def get(self, key):
+        """
+        Returns the cached result dict, or None on a miss. A hit refreshes the entry's LRU time.
+        回傳快取的結果字典，未命中時回傳 None。命中時會更新該項目的 LRU 時間。
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['result']
+
+    def put(self, key, result, info=None):
+        """
+        Stores a result dict; info is kept alongside for inspection only.
+        儲存結果字典；info 僅供檢視使用。
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_json(path, {'key': key, 'sim_version': SIM_VERSION, 'created': time.time(), 'info': info or {}, 'result': result})
+
+    @staticmethod
+    def _write_json(path, data):
+        # Write then rename, so concurrent readers never see a partial entry
+        # 先寫入暫存檔再改名，避免同時讀取者看到不完整的項目
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        """
+        Returns [(path, size, last_used)] for every entry, least recently used first.
+        依最久未使用優先的順序回傳所有項目的 [(路徑, 大小, 最後使用時間)]。
+        """
+        entries = []
+        if not os.path.isdir(self.results_dir):
+            return entries
+        for sub in os.listdir(self.results_dir):
+            sub_dir = os.path.join(self.results_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(sub_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def evict(self, max_bytes=None, max_entries=None, max_age_days=None):
+        """
+        Removes least-recently-used entries until every given limit holds.
+        移除最久未使用的項目，直到符合所有指定的限制。
+        Returns (removed_count, removed_bytes).
+        回傳 (移除數量, 移除位元組數)。
+        """
+        entries = self.entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        count = len(entries)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+
+        removed = 0
+        removed_bytes = 0
+        for path, size, last_used in entries:
+            over = ((max_bytes is not None and total_bytes > max_bytes) or
+                    (max_entries is not None and count > max_entries) or
+                    (cutoff is not None and last_used < cutoff))
+            if not over:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            count -= 1
+            removed += 1
+            removed_bytes += size
+        return removed, removed_bytes
+
+    def clear(self):
+        """
+        Removes every entry and trace hash memo.
+        移除所有項目與 Trace 雜湊紀錄。
+        """
+        removed, removed_bytes = self.evict(max_entries=0)
+        if os.path.isdir(self.traces_dir):
+            for name in os.listdir(self.traces_dir):
+                os.remove(os.path.join(self.traces_dir, name))
+        return removed, removed_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and evict the simulation result cache (檢視與清除模擬結果快取)')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Cache directory, defaults to $DRAM_SIM_CACHE or ~/.cache/dram_bench (快取資料夾，預設為 $DRAM_SIM_CACHE 或 ~/.cache/dram_bench)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats', help='Show entry count and total size (顯示項目數量與總大小)')
+    list_parser = sub.add_parser('list', help='List entries, least recently used first (列出項目，最久未使用者優先)')
+    list_parser.add_argument('--limit', type=int, default=None, help='Show at most N entries (最多顯示 N 筆)')
+    evict_parser = sub.add_parser('evict', help='Evict least-recently-used entries (淘汰最久未使用的項目)')
+    evict_parser.add_argument('--max_size', type=parse_size, default=None, help='Keep the cache under this size, e.g. 500M (將快取維持在此大小以下，例如 500M)')
+    evict_parser.add_argument('--max_entries', type=int, default=None, help='Keep at most N entries (最多保留 N 筆)')
+    evict_parser.add_argument('--max_age_days', type=float, default=None, help='Remove entries unused for this many days (移除超過此天數未使用的項目)')
+    sub.add_parser('clear', help='Remove every entry (移除所有項目)')
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir)
+
+    if args.command == 'stats':
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"Cache: {cache.cache_dir}")
+        print(f"Entries: {len(entries)}, Size: {total} bytes")
+        if entries:
+            print(f"Least recently used: {time.ctime(entries[0][2])}, most recently used: {time.ctime(entries[-1][2])}")
+    elif args.command == 'list':
+        entries = cache.entries()
+        if args.limit is not None:
+            entries = entries[:args.limit]
+        for path, size, last_used in entries:
+            try:
+                with open(path, 'r') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            info = entry.get('info', {})
+            desc = ' '.join(f"{k}={os.path.basename(str(v))}" for k, v in info.items())
+            print(f"{entry['key'][:16]}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}  {size:6d}B  v{entry['sim_version']}  {desc}")
+    elif args.command == 'evict':
+        if args.max_size is None and args.max_entries is None and args.max_age_days is None:
+            parser.error('evict needs --max_size, --max_entries or --max_age_days')
+        removed, removed_bytes = cache.evict(args.max_size, args.max_entries, args.max_age_days)
+        print(f"Evicted {removed} entries ({removed_bytes} bytes)")
+    elif args.command == 'clear':
+        removed, removed_bytes = cache.clear()
+        print(f"Removed {removed} entries ({removed_bytes} bytes)")
+
+if __name__ == "__main__":
+    main()
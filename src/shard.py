@@ -0,0 +1,191 @@
+import json
+import mmap
+import os
+import struct
+
+from request import Request
+
+# ----------------------------------------------------------------------------
+# Channel shard format (Channel 分片格式)
+#
+# Header (32 bytes, little-endian):
+#   magic (8s) | version (u16) | channel (u16) | record_count (u64) | reserved (12 bytes)
+# Followed by record_count fixed-width records, one per hardware-aligned chunk:
+#   address (u64) | row (u32) | column (u32) | size (u16) | beats (u16) | rank (u8) | bank (u8) | is_write (u8) | pad (u8)
+#
+# Chunks are already split and mapped by the sharding pass, so a worker only
+# unpacks its own channel's records instead of re-parsing the whole trace.
+# 區塊已於分片階段切割並映射完成，Worker 只需解包自己 Channel 的紀錄，不必重新解析整個 Trace。
+# ----------------------------------------------------------------------------
+
+SHARD_MAGIC = b'DRAMSHRD'
+SHARD_VERSION = 1
+
+SHARD_HEADER = struct.Struct('<8sHHQ12x')
+SHARD_RECORD = struct.Struct('<QIIHHBBBx')
+
+
+def pack_request(req):
+    """
+    Packs a mapped Request into one shard record.
+    將已映射的 Request 打包為一筆分片紀錄。
+    """
+    return SHARD_RECORD.pack(req.address, req.row, req.column, req.size, req.beats,
+                             req.rank, req.bank, req.is_write)
+
+
+def unpack_requests(channel, buffer):
+    """
+    Yields the pre-mapped Requests stored in a buffer of shard records.
+    逐筆產生分片紀錄緩衝區中已映射的 Request。
+    """
+    for address, row, column, size, beats, rank, bank, is_write in SHARD_RECORD.iter_unpack(buffer):
+        req = Request(bool(is_write), address, size, beats)
+        req.channel = channel
+        req.rank = rank
+        req.bank = bank
+        req.row = row
+        req.column = column
+        yield req
+
+
+def shard_trace(trace_reader, mapper, out_dir, prefix='shard', flush_size=65536):
+    """
+    Splits a stream of Request chunks into one shard file per channel in a single pass.
+    以單次掃描將 Request 區塊串流依 Channel 分割為各自的分片檔。
+
+    trace_reader may be any of the TraceReader variants; requests it yields
+    unmapped are mapped here, pre-mapped ones (BlockTraceReader) are used as is.
+    trace_reader 可為任一 TraceReader 版本；未映射的請求於此映射，已映射者 (BlockTraceReader) 直接使用。
+    Returns {channel_id: (shard_path, record_count)} for every channel seen.
+    回傳所有出現過的 Channel 之 {channel_id: (分片路徑, 紀錄數量)}。
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    files = {}
+    batches = {}
+    counts = {}
+
+    try:
+        for req in trace_reader:
+            if req.channel is None:
+                req.map(mapper)
+            ch = req.channel
+
+            batch = batches.get(ch)
+            if batch is None:
+                path = os.path.join(out_dir, f'{prefix}_CH{ch}.shard')
+                f = open(path, 'wb')
+                # Placeholder header, rewritten once the record count is known
+                # 先寫入暫時標頭，待得知紀錄數量後再覆寫
+                f.write(SHARD_HEADER.pack(SHARD_MAGIC, SHARD_VERSION, ch, 0))
+                files[ch] = f
+                batch = batches[ch] = []
+                counts[ch] = 0
+
+            batch.append(pack_request(req))
+            if len(batch) >= flush_size:
+                files[ch].write(b''.join(batch))
+                counts[ch] += len(batch)
+                batch.clear()
+
+        for ch, f in files.items():
+            f.write(b''.join(batches[ch]))
+            counts[ch] += len(batches[ch])
+            f.seek(0)
+            f.write(SHARD_HEADER.pack(SHARD_MAGIC, SHARD_VERSION, ch, counts[ch]))
+    finally:
+        for f in files.values():
+            f.close()
+
+    return {ch: (files[ch].name, counts[ch]) for ch in files}
+
+
+def write_shard_manifest(out_dir, prefix, shards, source):
+    """
+    Records which trace and mapping the shards in out_dir were built from.
+    記錄 out_dir 中的分片是由哪個 Trace 與 mapping 建立。
+    source is a JSON-serializable dict identifying the inputs, e.g. the trace
+    sha256 and mapping key of a trace_index.TraceIndex.
+    source 為可序列化為 JSON、用以識別輸入的字典，例如 trace_index.TraceIndex 的 Trace sha256 與 mapping 鍵值。
+    """
+    manifest = {
+        'version': SHARD_VERSION,
+        'source': source,
+        'shards': {str(ch): [os.path.basename(path), count] for ch, (path, count) in shards.items()},
+    }
+    with open(os.path.join(out_dir, f'{prefix}.shards.json'), 'w') as f:
+        json.dump(manifest, f)
+
+
+def load_shards(out_dir, prefix, source):
+    """
+    Returns {channel_id: (shard_path, record_count)} of the shards previously
+    written to out_dir for the same source, or None if any is missing or stale.
+    回傳先前為相同 source 寫入 out_dir 之分片的 {channel_id: (分片路徑, 紀錄數量)}；若有任何分片遺失或過期則回傳 None。
+    """
+    try:
+        with open(os.path.join(out_dir, f'{prefix}.shards.json'), 'r') as f:
+            manifest = json.load(f)
+        if manifest['version'] != SHARD_VERSION or manifest['source'] != source:
+            return None
+
+        shards = {}
+        for ch, (name, count) in manifest['shards'].items():
+            path = os.path.join(out_dir, name)
+            with open(path, 'rb') as f:
+                header = f.read(SHARD_HEADER.size)
+            if len(header) < SHARD_HEADER.size:
+                return None
+            if SHARD_HEADER.unpack(header) != (SHARD_MAGIC, SHARD_VERSION, int(ch), count):
+                return None
+            if os.path.getsize(path) < SHARD_HEADER.size + count * SHARD_RECORD.size:
+                return None
+            shards[int(ch)] = (path, count)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return shards
+
+
+class ShardReader:
+    """
+    TraceReader variant that memory-maps one channel shard and yields its
+    pre-mapped Request chunks in trace order.
+    以記憶體映射讀取單一 Channel 分片，並依 Trace 順序產生已映射 Request 區塊的 TraceReader 版本。
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            header = f.read(SHARD_HEADER.size)
+            if len(header) < SHARD_HEADER.size:
+                raise ValueError(f"Truncated shard header: {filepath}")
+            magic, version, channel, count = SHARD_HEADER.unpack(header)
+            if magic != SHARD_MAGIC:
+                raise ValueError(f"Not a channel shard file: {filepath}")
+            if version != SHARD_VERSION:
+                raise ValueError(f"Unsupported shard version {version}: {filepath}")
+            self.channel = channel
+            self.count = count
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = SHARD_HEADER.size + count * SHARD_RECORD.size
+        if len(self.data) < end:
+            raise ValueError(f"Truncated shard body: {filepath}")
+        self.requests = self._iter_requests(end)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.requests)
+
+    def _iter_requests(self, end):
+        view = memoryview(self.data)[SHARD_HEADER.size:end]
+        try:
+            yield from unpack_requests(self.channel, view)
+        finally:
+            view.release()
+            self.data.close()
@@ -0,0 +1,262 @@
+from config import load_config, load_mapping
+from mapper import AddressMapper
+from dram_sim import FRFCFS_AGE_CAP, PAGE_TIMEOUT, DRAMController
+from chunker import BlockTraceReader, iter_chunks
+from trace_bin import iter_transactions
+
+
+def _bandwidth_gbs(total_bytes, cycles, cycle_time_ns):
+    time_sec = cycles * cycle_time_ns / 1e9
+    return (total_bytes / 1e9) / time_sec if time_sec > 0 else 0
+
+
+class ChannelResult:
+    """
+    Results of a single channel.
+    單一 Channel 的模擬結果。
+    avg_queue_depth is None when the channel shared one queue with the others (src/main.py).
+    若該 Channel 與其他 Channel 共用同一隊列 (src/main.py)，avg_queue_depth 為 None。
+    turnarounds counts data bus direction changes (RD <-> WR); idle_precharges
+    counts the background PREs of the closed/adaptive page policies, and
+    auto_precharges the RDA/WRA commands.
+    turnarounds 為資料匯流排方向切換 (RD <-> WR) 的次數；idle_precharges 為 closed/adaptive Page 策略的背景 PRE 次數；
+    auto_precharges 為 RDA/WRA 指令次數。
+    """
+    def __init__(self, channel_id, total_cycles, total_bytes, bus_busy_cycles, page_hits, page_misses, page_conflicts, cycle_time_ns, avg_queue_depth=None,
+                 turnarounds=0, idle_precharges=0, auto_precharges=0):
+        self.channel_id = channel_id
+        self.total_cycles = total_cycles
+        self.total_bytes = total_bytes
+        self.bus_busy_cycles = bus_busy_cycles
+        self.bandwidth_gbs = _bandwidth_gbs(total_bytes, total_cycles, cycle_time_ns)
+        self.utilization = (bus_busy_cycles / total_cycles) * 100 if total_cycles > 0 else 0
+        self.avg_queue_depth = avg_queue_depth
+        self.page_hits = page_hits
+        self.page_misses = page_misses
+        self.page_conflicts = page_conflicts
+        self.turnarounds = turnarounds
+        self.idle_precharges = idle_precharges
+        self.auto_precharges = auto_precharges
+
+    def to_dict(self):
+        return {
+            'channel_id': self.channel_id,
+            'total_cycles': self.total_cycles,
+            'total_bytes': self.total_bytes,
+            'bus_busy_cycles': self.bus_busy_cycles,
+            'bandwidth_gbs': self.bandwidth_gbs,
+            'utilization': self.utilization,
+            'avg_queue_depth': self.avg_queue_depth,
+            'page_hits': self.page_hits,
+            'page_misses': self.page_misses,
+            'page_conflicts': self.page_conflicts,
+            'turnarounds': self.turnarounds,
+            'idle_precharges': self.idle_precharges,
+            'auto_precharges': self.auto_precharges,
+        }
+
+
+class SimulationResult:
+    """
+    Machine-readable results of one simulation, with the same numbers the CLIs print.
+    單次模擬的機器可讀結果，數值與 CLI 輸出相同。
+    channels maps Channel ID -> ChannelResult. write_queue holds the configured
+    queue sizes and watermarks of a run with a separate write queue (see
+    DRAMController.write_queue_config), else None; page_policy likewise holds a
+    closed/adaptive page policy (see DRAMController.page_policy_config), and
+    auto_precharge tells whether RDA/WRA were enabled.
+    channels 為 Channel ID -> ChannelResult 的對應。write_queue 為使用獨立寫入隊列時設定的隊列大小與水位
+    (見 DRAMController.write_queue_config)，否則為 None；page_policy 同樣保存 closed/adaptive Page 策略 (見 DRAMController.page_policy_config)；
+    auto_precharge 表示是否啟用 RDA/WRA。
+    """
+    def __init__(self, total_cycles, total_bytes, bus_busy_cycles, num_channels, avg_queue_depth, page_hits, page_misses, page_conflicts, cycle_time_ns, channels,
+                 turnarounds=0, write_queue=None, idle_precharges=0, page_policy=None, auto_precharges=0, auto_precharge=False):
+        self.total_cycles = total_cycles
+        self.total_bytes = total_bytes
+        self.bus_busy_cycles = bus_busy_cycles
+        self.num_channels = num_channels
+        self.cycle_time_ns = cycle_time_ns
+        self.bandwidth_gbs = _bandwidth_gbs(total_bytes, total_cycles, cycle_time_ns)
+
+        # Utilization across all available channels: busy / (cycles * channels)
+        # 所有可用通道的利用率：忙碌週期 / (週期 * 通道數)
+        total_available_cycles = total_cycles * num_channels
+        self.utilization = (bus_busy_cycles / total_available_cycles) * 100 if total_available_cycles > 0 else 0
+        self.avg_queue_depth = avg_queue_depth
+        self.page_hits = page_hits
+        self.page_misses = page_misses
+        self.page_conflicts = page_conflicts
+        self.turnarounds = turnarounds
+        self.write_queue = write_queue
+        self.idle_precharges = idle_precharges
+        self.page_policy = page_policy
+        self.auto_precharges = auto_precharges
+        self.auto_precharge = auto_precharge
+        self.channels = channels
+
+    def to_dict(self):
+        """
+        Returns the result as plain JSON-serializable data.
+        以可直接序列化為 JSON 的資料回傳結果。
+        """
+        return {
+            'total_cycles': self.total_cycles,
+            'total_bytes': self.total_bytes,
+            'bus_busy_cycles': self.bus_busy_cycles,
+            'num_channels': self.num_channels,
+            'cycle_time_ns': self.cycle_time_ns,
+            'bandwidth_gbs': self.bandwidth_gbs,
+            'utilization': self.utilization,
+            'avg_queue_depth': self.avg_queue_depth,
+            'page_hits': self.page_hits,
+            'page_misses': self.page_misses,
+            'page_conflicts': self.page_conflicts,
+            'turnarounds': self.turnarounds,
+            'write_queue': self.write_queue,
+            'idle_precharges': self.idle_precharges,
+            'page_policy': self.page_policy,
+            'auto_precharges': self.auto_precharges,
+            'auto_precharge': self.auto_precharge,
+            'channels': [self.channels[ch].to_dict() for ch in sorted(self.channels)],
+        }
+
+
+def result_from_controller(controller):
+    """
+    Builds the SimulationResult of a finished single-queue simulation (src/main.py).
+    建立已完成的單一隊列模擬 (src/main.py) 之 SimulationResult。
+    """
+    stats = controller.stats
+    # Total cycles should account for the last data transfer completion across all channels
+    # 總週期數應包含所有通道最後一次資料傳輸完成的時間
+    max_data_bus_free_time = 0
+    if controller.data_bus_free_time:
+        max_data_bus_free_time = max(controller.data_bus_free_time.values())
+    total_cycles = max(1, controller.current_time, max_data_bus_free_time)
+    num_channels = max(1, len(controller.data_bus_free_time))
+    cycle_time_ns = 1000.0 / controller.config['ClockFrequencyMHz']
+
+    # Channels share one timeline, so each is measured over the whole run
+    # 各 Channel 共用同一時間軸，因此皆以整體執行時間衡量
+    channels = {
+        ch: ChannelResult(ch, total_cycles, ch_stats['total_bytes'], ch_stats['bus_busy_cycles'],
+                          ch_stats['page_hits'], ch_stats['page_misses'], ch_stats['page_conflicts'], cycle_time_ns,
+                          turnarounds=ch_stats['turnarounds'], idle_precharges=ch_stats['idle_precharges'],
+                          auto_precharges=ch_stats['auto_precharges'])
+        for ch, ch_stats in controller.channel_stats.items()
+    }
+
+    avg_queue_depth = stats['cumulative_queue_depth'] / stats['queue_depth_samples'] if stats['queue_depth_samples'] > 0 else 0
+    return SimulationResult(total_cycles, stats['total_bytes'], stats['bus_busy_cycles'], num_channels, avg_queue_depth,
+                            stats['page_hits'], stats['page_misses'], stats['page_conflicts'], cycle_time_ns, channels,
+                            stats['turnarounds'], controller.write_queue_config(), stats['idle_precharges'], controller.page_policy_config(),
+                            stats['auto_precharges'], controller.auto_precharge)
+
+
+def result_from_channels(config, channel_results, write_queue=None, page_policy=None, auto_precharge=False):
+    """
+    Builds the SimulationResult of a parallel run from the per-channel worker
+    results ({'channel_id', 'total_cycles', 'stats'}) of src/asyc_parall*.py.
+    由 src/asyc_parall*.py 各 Channel Worker 的結果 ({'channel_id', 'total_cycles', 'stats'}) 建立平行模擬的 SimulationResult。
+    write_queue, page_policy and auto_precharge are the workers' write_queue_config(),
+    page_policy_config() and auto_precharge.
+    write_queue、page_policy 與 auto_precharge 為各 Worker 的 write_queue_config()、page_policy_config() 與 auto_precharge。
+    """
+    cycle_time_ns = 1000.0 / config['ClockFrequencyMHz']
+    channels = {}
+    for res in channel_results:
+        ch_stats = res['stats']
+        ch_avg_qd = ch_stats['cumulative_queue_depth'] / ch_stats['queue_depth_samples'] if ch_stats['queue_depth_samples'] > 0 else 0
+        channels[res['channel_id']] = ChannelResult(
+            res['channel_id'], res['total_cycles'], ch_stats['total_bytes'], ch_stats['bus_busy_cycles'],
+            ch_stats['page_hits'], ch_stats['page_misses'], ch_stats['page_conflicts'], cycle_time_ns, ch_avg_qd,
+            ch_stats['turnarounds'], ch_stats['idle_precharges'], ch_stats['auto_precharges'])
+
+    # Overall cycles are the slowest channel's; utilization is over MAX_CYCLES * NUM_CHANNELS
+    # 整體週期為最慢的 Channel；利用率分母為 MAX_CYCLES * NUM_CHANNELS
+    stats = [res['stats'] for res in channel_results]
+    total_cycles = max([1] + [res['total_cycles'] for res in channel_results])
+    samples = sum(s['queue_depth_samples'] for s in stats)
+    avg_queue_depth = sum(s['cumulative_queue_depth'] for s in stats) / samples if samples > 0 else 0
+    return SimulationResult(total_cycles, sum(s['total_bytes'] for s in stats), sum(s['bus_busy_cycles'] for s in stats),
+                            len(channel_results), avg_queue_depth, sum(s['page_hits'] for s in stats),
+                            sum(s['page_misses'] for s in stats), sum(s['page_conflicts'] for s in stats), cycle_time_ns, channels,
+                            sum(s['turnarounds'] for s in stats), write_queue, sum(s['idle_precharges'] for s in stats), page_policy,
+                            sum(s['auto_precharges'] for s in stats), auto_precharge)
+
+
+def simulate(config, mapping, trace, policy='PageHitFirst', queue_depth=16, engine='scan', chunk_block=0, on_tick=None, profiler=None, fast_forward=False, age_cap=FRFCFS_AGE_CAP,
+             write_queue_depth=0, write_high=None, write_low=None, page_policy='open', page_timeout=PAGE_TIMEOUT,
+             auto_precharge=False):
+    """
+    Runs one single-queue simulation (as src/main.py) in-process and returns a SimulationResult.
+    於行程內執行一次單一隊列模擬 (同 src/main.py) 並回傳 SimulationResult。
+
+    config and mapping are dicts or JSON file paths. trace is a text or
+    binary trace path, or an iterable of (is_write, address, bus_width_log2,
+    burst_len_code) transactions. chunk_block > 0 chunks and maps a trace
+    path with NumPy (see chunker.BlockTraceReader). on_tick, if given, is
+    called with the controller after every tick. With a profiler.Profiler as
+    profiler, the run is instrumented and profiler.summary holds the profile.
+    fast_forward issues row-hit streaks in batches (see
+    DRAMController.fast_forward); it is ignored when on_tick is given, since
+    a batch covers several ticks. age_cap is the FRFCFS starvation threshold
+    in cycles. write_queue_depth > 0 gives writes a separate queue drained
+    between the write_high / write_low watermarks (see DRAMController).
+    page_policy is 'open', 'closed' or 'adaptive' (idle timeout page_timeout
+    cycles); see dram_sim.PAGE_POLICIES. auto_precharge issues the last
+    queued RD/WR to a row as RDA/WRA.
+    config 與 mapping 可為字典或 JSON 檔案路徑。trace 為文字或二進位 Trace 路徑，
+    或逐筆產生 (is_write, address, bus_width_log2, burst_len_code) 的可迭代物件。
+    chunk_block > 0 時以 NumPy 切割並映射 Trace 檔案 (見 chunker.BlockTraceReader)。若提供 on_tick，每次步進後以控制器呼叫。
+    若以 profiler.Profiler 作為 profiler，執行過程會被量測，剖析結果存於 profiler.summary。
+    fast_forward 以批次發出 Row 命中連續段 (見 DRAMController.fast_forward)；因一個批次涵蓋多次步進，提供 on_tick 時忽略此參數。
+    age_cap 為 FRFCFS 的飢餓門檻 (週期數)。write_queue_depth > 0 時寫入使用獨立隊列，於 write_high / write_low 水位間排空 (見 DRAMController)。
+    page_policy 為 'open'、'closed' 或 'adaptive' (閒置逾時為 page_timeout 週期)；見 dram_sim.PAGE_POLICIES。auto_precharge 以 RDA/WRA 發出對 Row 的最後一個隊列 RD/WR。
+    """
+    if isinstance(config, str):
+        config = load_config(config)
+    if isinstance(mapping, str):
+        mapping = load_mapping(mapping)
+
+    mapper = AddressMapper(mapping)
+    controller = DRAMController(config, mapper, scheduler_type=policy, queue_depth=queue_depth, engine=engine, age_cap=age_cap,
+                                write_queue_depth=write_queue_depth, write_high=write_high, write_low=write_low,
+                                page_policy=page_policy, page_timeout=page_timeout, auto_precharge=auto_precharge)
+    if profiler is not None:
+        profiler.instrument_mapper(mapper)
+        profiler.instrument_controller(controller)
+
+    if not isinstance(trace, str):
+        trace_iter = iter_chunks(trace, mapper)
+    elif chunk_block > 0:
+        trace_iter = iter(BlockTraceReader(trace, mapper, block_size=chunk_block))
+    else:
+        trace_iter = iter_chunks(iter_transactions(trace), mapper)
+    if profiler is not None:
+        trace_iter = profiler.instrument_iter('trace_parse', trace_iter)
+
+    # Same fill/tick loop as src/main.py
+    # 與 src/main.py 相同的填充/步進迴圈
+    next_req = next(trace_iter, None)
+
+    def fill_queue():
+        nonlocal next_req
+        while next_req is not None and controller.has_room(next_req):
+            if next_req.channel is None:
+                next_req.map(mapper)
+            controller.queue.append(next_req)
+            next_req = next(trace_iter, None)
+
+    fast_forward = fast_forward and on_tick is None
+    while next_req is not None or len(controller.queue) > 0:
+        fill_queue()
+
+        if not (fast_forward and controller.fast_forward(fill_queue)):
+            controller.tick()
+        if on_tick is not None:
+            on_tick(controller)
+
+    if profiler is not None:
+        profiler.finish(controller)
+    return result_from_controller(controller)
@@ -0,0 +1,252 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+# Add src to path if needed, or assume running from root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from config import load_config, load_mapping
+from dram_sim import FRFCFS_AGE_CAP, PAGE_POLICIES, PAGE_TIMEOUT, POLICIES
+from simulate import simulate
+from result_cache import ResultCache
+from trace_bin import RECORD, iter_transactions
+
+# Controller options shared by every point of a sweep, forwarded to simulate() (see DRAMController)
+# 同一次掃描所有點共用的控制器選項，轉交給 simulate() (見 DRAMController)
+OPTION_FIELDS = ('age_cap', 'write_queue_depth', 'write_high', 'write_low', 'page_policy', 'page_timeout', 'auto_precharge')
+# Result record fields, in table order: the sweep point and its options, then its SimulationResult metrics
+# 結果紀錄欄位，依表格順序：掃描點參數及其選項，接著為其 SimulationResult 指標
+JOB_FIELDS = ('trace', 'config', 'mapping', 'policy', 'queue_depth') + OPTION_FIELDS
+METRIC_FIELDS = (
+    'total_cycles', 'total_bytes', 'bandwidth_gbs', 'utilization', 'avg_queue_depth',
+    'page_hits', 'page_misses', 'page_conflicts',
+)
+RESULT_FIELDS = JOB_FIELDS + METRIC_FIELDS
+
+
+def load_packed_trace(trace_path):
+    """
+    Parses a text or binary trace once into packed binary trace records (trace_bin.RECORD).
+    將文字或二進位 Trace 解析一次，打包為二進位 Trace 紀錄 (trace_bin.RECORD)。
+    The bytes are compact and cheap to hand to pool workers, and every sweep
+    point re-reads them with struct.iter_unpack instead of re-parsing text.
+    打包後的位元組精簡，可低成本交給行程池 Worker，每個掃描點以 struct.iter_unpack 讀取，不必重新解析文字。
+    """
+    pack = RECORD.pack
+    return b''.join(pack(address, is_write, bus_width_log2, burst_len_code)
+                    for is_write, address, bus_width_log2, burst_len_code in iter_transactions(trace_path))
+
+
+def iter_packed_transactions(packed):
+    """
+    Yields (is_write, address, bus_width_log2, burst_len_code) from load_packed_trace() bytes.
+    從 load_packed_trace() 的位元組逐筆產生 (is_write, address, bus_width_log2, burst_len_code)。
+    """
+    for address, is_write, bus_width_log2, burst_len_code in RECORD.iter_unpack(packed):
+        yield is_write, address, bus_width_log2, burst_len_code
+
+
+def run_point(config, mapping, packed, policy, queue_depth, engine='scan', fast_forward=False, age_cap=FRFCFS_AGE_CAP,
+              write_queue_depth=0, write_high=None, write_low=None, page_policy='open', page_timeout=PAGE_TIMEOUT,
+              auto_precharge=False):
+    """
+    Runs one sequential (src/main.py) simulation in-process and returns SimulationResult.to_dict().
+    於行程內執行一次循序 (src/main.py) 模擬並回傳 SimulationResult.to_dict()。
+    The OPTION_FIELDS keywords are passed to simulate() unchanged.
+    OPTION_FIELDS 各關鍵字參數原樣傳給 simulate()。
+    """
+    return simulate(config, mapping, iter_packed_transactions(packed), policy, queue_depth, engine, fast_forward=fast_forward,
+                    age_cap=age_cap, write_queue_depth=write_queue_depth, write_high=write_high, write_low=write_low,
+                    page_policy=page_policy, page_timeout=page_timeout, auto_precharge=auto_precharge).to_dict()
+
+
+def make_record(job, result):
+    """
+    Builds a sweep record from a JOB_FIELDS job tuple and its result dict.
+    由 JOB_FIELDS 工作元組與其結果字典建立掃描紀錄。
+    """
+    record = dict(zip(JOB_FIELDS, job))
+    record.update((field, result[field]) for field in METRIC_FIELDS)
+    return record
+
+
+# Per-worker shared inputs, set once by the pool initializer
+# 每個 Worker 共用的輸入，由行程池初始化函式設定一次
+_shared = {}
+
+
+def _init_worker(traces, configs, mappings, engine, fast_forward=False):
+    _shared['traces'] = traces
+    _shared['configs'] = configs
+    _shared['mappings'] = mappings
+    _shared['engine'] = engine
+    _shared['fast_forward'] = fast_forward
+
+
+def _run_job(indexed_job):
+    index, (trace, config, mapping, policy, queue_depth, *options) = indexed_job
+    return index, run_point(_shared['configs'][config], _shared['mappings'][mapping],
+                            _shared['traces'][trace], policy, queue_depth, _shared['engine'], _shared['fast_forward'],
+                            **dict(zip(OPTION_FIELDS, options)))
+
+
+def sweep(traces, configs, mappings, policies=('PageHitFirst',), queue_depths=(16,), engine='scan', processes=None, progress=None, cache=None, fast_forward=False,
+          age_cap=FRFCFS_AGE_CAP, write_queue_depth=0, write_high=None, write_low=None, page_policy='open', page_timeout=PAGE_TIMEOUT,
+          auto_precharge=False):
+    """
+    Runs every (trace, config, mapping, policy, queue_depth) combination and returns the result records.
+    執行所有 (trace, config, mapping, policy, queue_depth) 組合並回傳結果紀錄。
+
+    traces, configs and mappings are file paths. Each trace is parsed once
+    and each config/mapping loaded once in this process, then shared with
+    the worker pool through its initializer, so sweep points pay neither
+    interpreter startup nor trace parsing. Records are dicts with the
+    RESULT_FIELDS keys, in matrix order. processes=1 runs in-process;
+    progress, if given, is called with each record as it completes.
+    With a result_cache.ResultCache as cache, cached points are returned
+    without simulating and new results are stored. fast_forward batches
+    row-hit streaks (same results, see DRAMController.fast_forward). The
+    OPTION_FIELDS keywords apply to every point, as in simulate(); they are
+    part of each record and of its cache key.
+    traces、configs 與 mappings 為檔案路徑。每個 Trace 只在此行程解析一次、每個設定只載入一次，
+    再透過初始化函式分享給行程池，因此每個掃描點都不需啟動直譯器或解析 Trace。
+    結果為以 RESULT_FIELDS 為鍵值的字典，依矩陣順序排列。processes=1 時於行程內執行；若提供 progress，每完成一筆即以該紀錄呼叫。
+    若以 result_cache.ResultCache 作為 cache，已快取的點直接回傳而不模擬，新結果則存入快取。fast_forward 以批次處理 Row 命中連續段 (結果相同)。
+    OPTION_FIELDS 各關鍵字參數如同 simulate() 套用於每個點，並包含在每筆紀錄及其快取鍵值中。
+    """
+    configs_data = {path: load_config(path) for path in configs}
+    mappings_data = {path: load_mapping(path) for path in mappings}
+    options = (age_cap, write_queue_depth, write_high, write_low, page_policy, page_timeout, auto_precharge)
+    jobs = [point + options for point in itertools.product(traces, configs, mappings, policies, queue_depths)]
+
+    results = [None] * len(jobs)
+    keys = {}
+    pending = []
+    for index, job in enumerate(jobs):
+        if cache is not None:
+            trace, config, mapping, policy, queue_depth = job[:5]
+            keys[index] = cache.key(trace, configs_data[config], mappings_data[mapping], policy, queue_depth,
+                                    options=dict(zip(OPTION_FIELDS, options)))
+            cached = cache.get(keys[index])
+            if cached is not None:
+                results[index] = make_record(job, cached)
+                if progress is not None:
+                    progress(results[index])
+                continue
+        pending.append((index, job))
+
+    if not pending:
+        return results
+
+    # Only the traces of points that still need simulating are parsed
+    # 只解析仍需模擬之點所用的 Trace
+    shared = (
+        {path: load_packed_trace(path) for path in dict.fromkeys(job[0] for _, job in pending)},
+        configs_data,
+        mappings_data,
+        engine,
+        fast_forward,
+    )
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(pending)))
+
+    if processes == 1:
+        _init_worker(*shared)
+        result_iter = map(_run_job, pending)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes=processes, initializer=_init_worker, initargs=shared)
+        result_iter = pool.imap(_run_job, pending)
+
+    try:
+        for index, result in result_iter:
+            job = jobs[index]
+            if cache is not None:
+                cache.put(keys[index], result, dict(zip(JOB_FIELDS, job)))
+            results[index] = make_record(job, result)
+            if progress is not None:
+                progress(results[index])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        _shared.clear()
+
+    return results
+
+
+def format_table(results):
+    """
+    Formats result records as a Markdown table.
+    將結果紀錄格式化為 Markdown 表格。
+    """
+    headers = ["Trace File", "Config", "Mapping", "Policy", "QD", "Total Cycles", "Bandwidth (GB/s)", "Utilization (%)", "Avg Queue Depth", "Page Hits", "Page Misses", "Page Conflicts"]
+    lines = ["| " + " | ".join(headers) + " |", "| " + " | ".join(["---"] * len(headers)) + " |"]
+    for res in results:
+        row = [
+            os.path.basename(res['trace']),
+            os.path.basename(res['config']),
+            os.path.basename(res['mapping']),
+            res['policy'],
+            str(res['queue_depth']),
+            str(res['total_cycles']),
+            f"{res['bandwidth_gbs']:.2f}",
+            f"{res['utilization']:.2f}",
+            f"{res['avg_queue_depth']:.2f}",
+            str(res['page_hits']),
+            str(res['page_misses']),
+            str(res['page_conflicts']),
+        ]
+        lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='In-process DRAM simulation sweep (行程內 DRAM 模擬參數掃描)')
+    parser.add_argument('--traces', nargs='+', required=True, help='Trace files (Trace 檔案)')
+    parser.add_argument('--configs', nargs='+', required=True, help='Timing config JSON files (時序設定檔)')
+    parser.add_argument('--mappings', nargs='+', required=True, help='Address mapping JSON files (位址映射檔)')
+    parser.add_argument('--policies', nargs='+', default=['PageHitFirst'], choices=list(POLICIES), help='Scheduling policies (排程策略)')
+    parser.add_argument('--queue_depths', nargs='+', type=int, default=[16], help='Command queue depths (指令隊列深度)')
+    parser.add_argument('--engine', default='scan', choices=['scan', 'event'], help='Scheduler engine: per-bank scan or event-driven (排程引擎：逐 Bank 掃描或事件驅動)')
+    parser.add_argument('--fast_forward', action='store_true', help='Issue row-hit streaks in one batch, same results (Row 命中連續段批次發出，結果相同)')
+    parser.add_argument('--age_cap', type=int, default=FRFCFS_AGE_CAP, help='FRFCFS: cycles a request may wait before row hits stop bypassing it (FRFCFS：請求等待超過此週期數後，Row 命中不再可越過它)')
+    parser.add_argument('--write_queue_depth', type=int, default=0, help='Per-channel write queue depth, 0 = reads and writes share the queue depth (每 Channel 獨立寫入隊列深度，0 = 讀寫共用隊列深度)')
+    parser.add_argument('--write_high', type=int, default=None, help='Queued writes of a channel that start its write drain, default 3/4 of the write queue (Channel 開始排空寫入的寫入筆數，預設為寫入隊列的 3/4)')
+    parser.add_argument('--write_low', type=int, default=None, help='Queued writes of a channel that end its write drain, default 1/4 of the write queue (Channel 結束排空寫入的寫入筆數，預設為寫入隊列的 1/4)')
+    parser.add_argument('--page_policy', default='open', choices=list(PAGE_POLICIES), help='Page policy: open, closed or adaptive (Page 策略：open、closed 或 adaptive)')
+    parser.add_argument('--page_timeout', type=int, default=PAGE_TIMEOUT, help='Adaptive page policy: initial idle cycles before a bank is precharged (adaptive Page 策略：Bank 預充電前的初始閒置週期數)')
+    parser.add_argument('--auto_precharge', action='store_true', help='Issue the last queued RD/WR to a row as RDA/WRA (對 Row 的最後一個隊列 RD/WR 以 RDA/WRA 發出)')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes, defaults to the CPU count (Worker 行程數，預設為 CPU 數量)')
+    parser.add_argument('--json', type=str, default=None, help='Write the result records to this JSON file (將結果紀錄寫入此 JSON 檔)')
+    parser.add_argument('--cache', action='store_true', help='Reuse and store results in the on-disk result cache (使用並寫入磁碟結果快取)')
+    parser.add_argument('--cache_dir', type=str, default=None, help='Result cache directory, implies --cache; defaults to $DRAM_SIM_CACHE or ~/.cache/dram_bench (結果快取資料夾，隱含 --cache)')
+    args = parser.parse_args()
+
+    total = len(args.traces) * len(args.configs) * len(args.mappings) * len(args.policies) * len(args.queue_depths)
+    done = [0]
+
+    def progress(record):
+        done[0] += 1
+        print(f"[{done[0]}/{total}] {os.path.basename(record['trace'])} {os.path.basename(record['config'])} "
+              f"{os.path.basename(record['mapping'])} {record['policy']} QD={record['queue_depth']}: {record['total_cycles']} cycles")
+
+    cache = ResultCache(args.cache_dir) if args.cache or args.cache_dir else None
+    results = sweep(args.traces, args.configs, args.mappings, args.policies, args.queue_depths,
+                    engine=args.engine, processes=args.jobs, progress=progress, cache=cache, fast_forward=args.fast_forward,
+                    age_cap=args.age_cap, write_queue_depth=args.write_queue_depth, write_high=args.write_high, write_low=args.write_low,
+                    page_policy=args.page_policy, page_timeout=args.page_timeout, auto_precharge=args.auto_precharge)
+
+    print()
+    print(format_table(results))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
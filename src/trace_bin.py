@@ -0,0 +1,237 @@
+import argparse
+import mmap
+import os
+import struct
+
+# ----------------------------------------------------------------------------
+# Binary trace format (二進位 Trace 格式)
+#
+# Header (32 bytes, little-endian):
+#   magic (8s) | version (u16) | flags (u16) | record_count (u64) | reserved (12 bytes)
+# Followed by record_count fixed-width records:
+#   address (u64) | [timestamp (u64) if FLAG_TIMESTAMP] | is_write (u8) | bus_width_log2 (u8) | burst_len_code (u8) | pad (u8)
+#
+# Each record holds exactly the fields of one text line
+# `[R/W]x [Address] [Bus_Width_Log2] [Burst_Length_Code] [Timestamp]`, so
+# readers can unpack it directly instead of splitting and parsing hex strings.
+# 每筆紀錄保存一行文字 Trace 的所有欄位，讀取時可直接解包，不需逐行切割與解析十六進位字串。
+# ----------------------------------------------------------------------------
+
+MAGIC = b'DRAMTRCB'
+VERSION = 1
+FLAG_TIMESTAMP = 0x1
+
+HEADER = struct.Struct('<8sHHQ12x')
+RECORD = struct.Struct('<QBBBx')
+RECORD_TS = struct.Struct('<QQBBBx')
+
+
+def is_binary_trace(filepath):
+    """
+    Returns True if the file starts with the binary trace magic.
+    若檔案以二進位 Trace 標頭開始則回傳 True。
+    """
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def parse_text_line(line):
+    """
+    Parses one text trace line into (is_write, address, bus_width_log2, burst_len_code, timestamp).
+    將一行文字 Trace 解析為 (is_write, address, bus_width_log2, burst_len_code, timestamp)。
+    Returns None for blank lines; timestamp is None when the optional fifth column is absent.
+    空白行回傳 None；若無第五欄 (選填) 則 timestamp 為 None。
+    """
+    parts = line.split()
+    if not parts:
+        return None
+    timestamp = int(parts[4]) if len(parts) > 4 else None
+    return 'W' in parts[0], int(parts[1], 16), int(parts[2]), int(parts[3], 16), timestamp
+
+
+def convert_text_trace(src_path, dst_path, batch_size=65536):
+    """
+    Converts a text trace into the binary format in a single streaming pass.
+    以單次串流方式將文字 Trace 轉換為二進位格式。
+    The timestamp column is kept if the first transaction has one.
+    若第一筆交易含有時間戳記，則保留時間戳記欄位。
+    Returns the number of records written.
+    回傳寫入的紀錄數量。
+    """
+    record = None
+    count = 0
+    batch = []
+
+    with open(src_path, 'r') as src, open(dst_path, 'wb') as dst:
+        # Placeholder header, rewritten once the record count is known
+        # 先寫入暫時標頭，待得知紀錄數量後再覆寫
+        dst.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+        for line_no, line in enumerate(src, 1):
+            parsed = parse_text_line(line)
+            if parsed is None:
+                continue
+            is_write, address, bus_width_log2, burst_len_code, timestamp = parsed
+
+            if record is None:
+                record = RECORD_TS if timestamp is not None else RECORD
+            if burst_len_code > 0xFF or bus_width_log2 > 0xFF:
+                raise ValueError(f"{src_path}:{line_no}: burst code / bus width does not fit in one byte")
+
+            if record is RECORD_TS:
+                if timestamp is None:
+                    raise ValueError(f"{src_path}:{line_no}: missing timestamp")
+                batch.append(record.pack(address, timestamp, is_write, bus_width_log2, burst_len_code))
+            else:
+                batch.append(record.pack(address, is_write, bus_width_log2, burst_len_code))
+            count += 1
+
+            if len(batch) >= batch_size:
+                dst.write(b''.join(batch))
+                batch = []
+
+        dst.write(b''.join(batch))
+
+        flags = FLAG_TIMESTAMP if record is RECORD_TS else 0
+        dst.seek(0)
+        dst.write(HEADER.pack(MAGIC, VERSION, flags, count))
+
+    return count
+
+
+class BinaryTrace:
+    """
+    Memory-mapped view of a binary trace file.
+    二進位 Trace 檔案的記憶體映射檢視。
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.file = open(filepath, 'rb')
+        header = self.file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Truncated binary trace header: {filepath}")
+        magic, version, flags, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not a binary trace file: {filepath}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary trace version {version}: {filepath}")
+
+        self.has_timestamp = bool(flags & FLAG_TIMESTAMP)
+        self.record = RECORD_TS if self.has_timestamp else RECORD
+        self.count = count
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = HEADER.size + count * self.record.size
+        if len(self.mm) < end:
+            raise ValueError(f"Truncated binary trace body: {filepath}")
+        self.view = memoryview(self.mm)[HEADER.size:end]
+
+    def __len__(self):
+        return self.count
+
+    def iter_records(self):
+        """
+        Yields (is_write, address, bus_width_log2, burst_len_code, timestamp) per record.
+        逐筆產生 (is_write, address, bus_width_log2, burst_len_code, timestamp)。
+        """
+        if self.has_timestamp:
+            for address, timestamp, is_write, bus_width_log2, burst_len_code in self.record.iter_unpack(self.view):
+                yield is_write, address, bus_width_log2, burst_len_code, timestamp
+        else:
+            for address, is_write, bus_width_log2, burst_len_code in self.record.iter_unpack(self.view):
+                yield is_write, address, bus_width_log2, burst_len_code, None
+
+    def to_numpy(self):
+        """
+        Returns the records as a zero-copy NumPy structured array (requires NumPy).
+        以零複製的 NumPy 結構化陣列回傳所有紀錄 (需要 NumPy)。
+        """
+        import numpy as np
+
+        fields = [('address', '<u8')]
+        if self.has_timestamp:
+            fields.append(('timestamp', '<u8'))
+        fields += [('is_write', 'u1'), ('bus_width_log2', 'u1'), ('burst_len_code', 'u1'), ('pad', 'u1')]
+        return np.frombuffer(self.view, dtype=np.dtype(fields), count=self.count)
+
+    def close(self):
+        if self.mm is None:
+            return
+        self.view.release()
+        self.mm.close()
+        self.file.close()
+        self.mm = None
+
+
+def iter_transactions(filepath):
+    """
+    Yields (is_write, address, bus_width_log2, burst_len_code) for a text or binary trace.
+    對文字或二進位 Trace 逐筆產生 (is_write, address, bus_width_log2, burst_len_code)。
+    """
+    if is_binary_trace(filepath):
+        trace = BinaryTrace(filepath)
+        try:
+            for is_write, address, bus_width_log2, burst_len_code, _ in trace.iter_records():
+                yield bool(is_write), address, bus_width_log2, burst_len_code
+        finally:
+            trace.close()
+    else:
+        with open(filepath, 'r') as f:
+            for line in f:
+                parsed = parse_text_line(line)
+                if parsed is not None:
+                    yield parsed[:4]
+
+
+class BinaryTraceReader:
+    """
+    TraceReader variant for binary traces: memory-maps the file and yields
+    hardware-aligned Request chunks without per-line text parsing.
+    二進位 Trace 的 TraceReader 版本：以記憶體映射讀取檔案，不需逐行文字解析即可產生硬體對齊的 Request 區塊。
+    """
+    def __init__(self, filepath, mapper):
+        # Imported here, as chunker imports this module
+        # 於此處匯入，因 chunker 會匯入本模組
+        from chunker import iter_chunks
+
+        self.filepath = filepath
+        self.trace = BinaryTrace(filepath)
+        self.mapper = mapper
+        self.chunks = iter_chunks(self._transactions(), mapper)
+
+    def _transactions(self):
+        records = self.trace.iter_records()
+        try:
+            for is_write, address, bus_width_log2, burst_len_code, _ in records:
+                yield is_write, address, bus_width_log2, burst_len_code
+        finally:
+            records.close()
+            self.trace.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert text traces to the binary trace format (將文字 Trace 轉換為二進位格式)')
+    parser.add_argument('inputs', nargs='+', help='Text trace files to convert (要轉換的文字 Trace 檔案)')
+    parser.add_argument('--out_dir', type=str, default=None, help='Output directory; defaults to next to each input (輸出資料夾，預設與輸入檔相同)')
+    args = parser.parse_args()
+
+    for src_path in args.inputs:
+        base_name = os.path.splitext(os.path.basename(src_path))[0] + '.btrace'
+        out_dir = args.out_dir if args.out_dir else os.path.dirname(src_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        dst_path = os.path.join(out_dir, base_name)
+
+        count = convert_text_trace(src_path, dst_path)
+        src_size = os.path.getsize(src_path)
+        dst_size = os.path.getsize(dst_path)
+        print(f"{src_path} -> {dst_path}: {count} records, {src_size} -> {dst_size} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+# Add src to path if needed, or assume running from root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from config import load_mapping
+from chunker import iter_chunks
+from mapper import AddressMapper
+from trace_bin import HEADER, BinaryTrace, is_binary_trace, parse_text_line
+
+# ----------------------------------------------------------------------------
+# Trace sidecar index (Trace 旁路索引)
+#
+# A JSON file next to the trace, built in one pass and reused until the trace
+# changes:
+#   <trace>.tidx                       transaction stats only (no mapping)
+#   <trace>.<mapping_key[:12]>.tidx    plus per-channel stats for that mapping
+#
+# It records the transaction count, read/write mix, size histogram, the byte
+# offset of every OFFSET_STRIDE-th transaction and, with a mapping, the active
+# channels with their hardware-aligned request (chunk) and byte counts.
+# An index is valid while the trace size and mtime match; if only the mtime
+# changed the trace is re-hashed and the index kept when the sha256 matches.
+# 與 Trace 並存的 JSON 檔，以單次掃描建立，直到 Trace 改變前皆可重複使用。
+# 內容包含交易數量、讀寫比例、大小分佈、每 OFFSET_STRIDE 筆交易的檔案位移，
+# 若指定 mapping 則另含啟用的 Channel 及其硬體對齊請求 (區塊) 數量與位元組數。
+# Trace 大小與 mtime 相符時索引即有效；若僅 mtime 改變則重新計算雜湊，sha256 相同時保留索引。
+# ----------------------------------------------------------------------------
+
+INDEX_VERSION = 1
+OFFSET_STRIDE = 4096
+
+
+def file_sha256(filepath):
+    """
+    Returns the sha256 hex digest of a file's contents.
+    回傳檔案內容的 sha256 十六進位摘要。
+    """
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def mapping_key(mapping):
+    """
+    Returns the sha256 of a loaded (normalized) mapping dict.
+    回傳已載入 (正規化) mapping 字典的 sha256。
+    """
+    return hashlib.sha256(json.dumps(mapping, sort_keys=True).encode()).hexdigest()
+
+
+def index_path(trace_path, mapping=None):
+    """
+    Returns the sidecar index path of a trace, for a loaded mapping dict or None.
+    回傳 Trace 的旁路索引路徑；mapping 為載入後的字典或 None。
+    """
+    if mapping is None:
+        return f"{trace_path}.tidx"
+    return f"{trace_path}.{mapping_key(mapping)[:12]}.tidx"
+
+
+class TraceIndex:
+    """
+    Summary statistics and seek offsets of one trace (for one mapping).
+    單一 Trace (對應單一 mapping) 的統計摘要與跳轉位移。
+    channels maps Channel ID -> {'requests', 'bytes', 'reads', 'writes'} and is
+    None for an index built without a mapping.
+    channels 為 Channel ID -> {'requests', 'bytes', 'reads', 'writes'} 的對應；未指定 mapping 時為 None。
+    """
+    def __init__(self, trace, mapping_key, transactions, reads, writes, read_bytes, write_bytes, sizes, offset_stride, offsets, channels=None):
+        self.trace = trace
+        self.mapping_key = mapping_key
+        self.transactions = transactions
+        self.reads = reads
+        self.writes = writes
+        self.read_bytes = read_bytes
+        self.write_bytes = write_bytes
+        self.total_bytes = read_bytes + write_bytes
+        self.sizes = sizes
+        self.offset_stride = offset_stride
+        self.offsets = offsets
+        self.channels = channels
+
+    @property
+    def active_channels(self):
+        return set(self.channels) if self.channels is not None else None
+
+    def seek_point(self, start):
+        """
+        Returns (byte_offset, skip): where to seek to reach transaction start,
+        and how many transactions to skip after seeking.
+        回傳 (位元組位移, 略過數量)：要到達第 start 筆交易需跳轉的位置，以及跳轉後需略過的交易數。
+        """
+        if start >= self.transactions:
+            return self.trace['size'], 0
+        return self.offsets[start // self.offset_stride], start % self.offset_stride
+
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION,
+            'trace': self.trace,
+            'mapping_key': self.mapping_key,
+            'transactions': self.transactions,
+            'reads': self.reads,
+            'writes': self.writes,
+            'read_bytes': self.read_bytes,
+            'write_bytes': self.write_bytes,
+            # JSON object keys are strings
+            # JSON 物件的鍵值必須為字串
+            'sizes': {str(size): count for size, count in sorted(self.sizes.items())},
+            'offset_stride': self.offset_stride,
+            'offsets': self.offsets,
+            'channels': None if self.channels is None else {str(ch): stats for ch, stats in sorted(self.channels.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        channels = data['channels']
+        return cls(data['trace'], data['mapping_key'], data['transactions'], data['reads'], data['writes'],
+                   data['read_bytes'], data['write_bytes'], {int(size): count for size, count in data['sizes'].items()},
+                   data['offset_stride'], data['offsets'],
+                   None if channels is None else {int(ch): stats for ch, stats in channels.items()})
+
+
+def _iter_offset_transactions(trace_path, digest):
+    """
+    Yields (byte_offset, is_write, address, bus_width_log2, burst_len_code),
+    feeding the raw bytes to the digest on the way.
+    逐筆產生 (位元組位移, is_write, address, bus_width_log2, burst_len_code)，同時將原始位元組送入雜湊。
+    """
+    if is_binary_trace(trace_path):
+        trace = BinaryTrace(trace_path)
+        try:
+            digest.update(trace.mm)
+            offset = HEADER.size
+            step = trace.record.size
+            for is_write, address, bus_width_log2, burst_len_code, _ in trace.iter_records():
+                yield offset, bool(is_write), address, bus_width_log2, burst_len_code
+                offset += step
+        finally:
+            trace.close()
+    else:
+        with open(trace_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                digest.update(line)
+                parsed = parse_text_line(line.decode())
+                if parsed is not None:
+                    yield (offset,) + parsed[:4]
+                offset += len(line)
+
+
+def build_index(trace_path, mapping=None, offset_stride=OFFSET_STRIDE):
+    """
+    Scans a text or binary trace once and returns its TraceIndex.
+    掃描文字或二進位 Trace 一次並回傳其 TraceIndex。
+    mapping is a loaded mapping dict; with it, every transaction is split into
+    hardware-aligned chunks exactly as TraceReader does and counted per channel.
+    mapping 為載入後的 mapping 字典；若提供，每筆交易會以與 TraceReader 相同的方式切割為硬體對齊區塊，並依 Channel 統計。
+    """
+    st = os.stat(trace_path)
+    digest = hashlib.sha256()
+    mapper = AddressMapper(mapping) if mapping is not None else None
+
+    transactions = reads = writes = read_bytes = write_bytes = 0
+    sizes = {}
+    offsets = []
+    channels = {} if mapper is not None else None
+
+    for offset, is_write, address, bus_width_log2, burst_len_code in _iter_offset_transactions(trace_path, digest):
+        if transactions % offset_stride == 0:
+            offsets.append(offset)
+        transactions += 1
+
+        bytes_per_beat = 2**bus_width_log2
+        size = bytes_per_beat * (burst_len_code + 1)
+        sizes[size] = sizes.get(size, 0) + 1
+        if is_write:
+            writes += 1
+            write_bytes += size
+        else:
+            reads += 1
+            read_bytes += size
+
+        if mapper is None:
+            continue
+
+        # The simulators' hardware-aligned chunks (chunker.iter_chunks)
+        # 模擬器的硬體對齊區塊 (chunker.iter_chunks)
+        for req in iter_chunks(((is_write, address, bus_width_log2, burst_len_code),), mapper):
+            ch = mapper.map_fields(req.address)[0]
+            stats = channels.get(ch)
+            if stats is None:
+                stats = channels[ch] = {'requests': 0, 'bytes': 0, 'reads': 0, 'writes': 0}
+            stats['requests'] += 1
+            stats['bytes'] += req.size
+            stats['writes' if is_write else 'reads'] += 1
+
+    trace = {
+        'path': os.path.abspath(trace_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': digest.hexdigest(),
+    }
+    return TraceIndex(trace, mapping_key(mapping) if mapping is not None else None, transactions, reads, writes,
+                      read_bytes, write_bytes, sizes, offset_stride, offsets, channels)
+
+
+def save_index(index, path):
+    """
+    Writes an index atomically; returns False if the location is not writable.
+    以原子方式寫入索引；若該位置無法寫入則回傳 False。
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(index.to_dict(), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def load_index(trace_path, mapping=None):
+    """
+    Returns the trace's sidecar TraceIndex if it is still valid, else None.
+    若 Trace 的旁路索引仍有效則回傳 TraceIndex，否則回傳 None。
+    """
+    path = index_path(trace_path, mapping)
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            return None
+        index = TraceIndex.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    if index.mapping_key != (mapping_key(mapping) if mapping is not None else None):
+        return None
+
+    try:
+        st = os.stat(trace_path)
+    except OSError:
+        return None
+    if st.st_size != index.trace['size']:
+        return None
+    if st.st_mtime_ns != index.trace['mtime_ns']:
+        # Touched but possibly unchanged: confirm by content
+        # 檔案被更動但內容可能相同：以內容確認
+        if file_sha256(trace_path) != index.trace['sha256']:
+            return None
+        index.trace['mtime_ns'] = st.st_mtime_ns
+        save_index(index, path)
+    return index
+
+
+def get_index(trace_path, mapping=None, rebuild=False):
+    """
+    Returns the valid sidecar TraceIndex of a trace, building and saving it if needed.
+    回傳 Trace 的有效旁路索引，必要時建立並儲存。
+    """
+    index = None if rebuild else load_index(trace_path, mapping)
+    if index is None:
+        index = build_index(trace_path, mapping)
+        save_index(index, index_path(trace_path, mapping))
+    return index
+
+
+def iter_transactions_from(trace_path, index, start=0):
+    """
+    Yields (is_write, address, bus_width_log2, burst_len_code) from transaction
+    start onwards, seeking with the index instead of reading the skipped part.
+    從第 start 筆交易開始逐筆產生 (is_write, address, bus_width_log2, burst_len_code)，藉由索引跳轉而不讀取略過的部分。
+    """
+    if is_binary_trace(trace_path):
+        trace = BinaryTrace(trace_path)
+        try:
+            step = trace.record.size
+            view = trace.view[min(start, trace.count) * step:]
+            try:
+                if trace.has_timestamp:
+                    for address, _, is_write, bus_width_log2, burst_len_code in trace.record.iter_unpack(view):
+                        yield bool(is_write), address, bus_width_log2, burst_len_code
+                else:
+                    for address, is_write, bus_width_log2, burst_len_code in trace.record.iter_unpack(view):
+                        yield bool(is_write), address, bus_width_log2, burst_len_code
+            finally:
+                view.release()
+        finally:
+            trace.close()
+        return
+
+    offset, skip = index.seek_point(start)
+    with open(trace_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            parsed = parse_text_line(line.decode())
+            if parsed is None:
+                continue
+            if skip > 0:
+                skip -= 1
+                continue
+            yield parsed[:4]
+
+
+def format_index(trace_path, index):
+    """
+    Formats a TraceIndex as a short human-readable summary.
+    將 TraceIndex 格式化為簡短易讀的摘要。
+    """
+    total = index.transactions
+    pct = lambda n: n / total * 100 if total else 0
+    lines = [
+        f"{trace_path}: {total} transactions, {index.total_bytes} bytes",
+        f"  Reads: {index.reads} ({pct(index.reads):.2f}%), {index.read_bytes} bytes",
+        f"  Writes: {index.writes} ({pct(index.writes):.2f}%), {index.write_bytes} bytes",
+        "  Sizes: " + ", ".join(f"{size}B x {count}" for size, count in sorted(index.sizes.items())),
+    ]
+    if index.channels is not None:
+        lines.append(f"  Active channels: {sorted(index.channels)}")
+        for ch, stats in sorted(index.channels.items()):
+            lines.append(f"    CH{ch}: {stats['requests']} requests ({stats['reads']} R / {stats['writes']} W), {stats['bytes']} bytes")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and show trace sidecar indexes (建立並顯示 Trace 旁路索引)')
+    parser.add_argument('traces', nargs='+', help='Trace files (Trace 檔案)')
+    parser.add_argument('--mapping', type=str, default=None, help='Address mapping JSON; adds per-channel stats (位址映射檔；加入各 Channel 統計)')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild even if a valid index exists (即使已有有效索引也重新建立)')
+    args = parser.parse_args()
+
+    mapping = load_mapping(args.mapping) if args.mapping else None
+    for trace_path in args.traces:
+        index = get_index(trace_path, mapping, rebuild=args.rebuild)
+        print(format_index(trace_path, index))
+
+if __name__ == "__main__":
+    main()
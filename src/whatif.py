@@ -0,0 +1,294 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+# Add src to path if needed, or assume running from root
+sys.path.append(os.path.join(os.path.dirname(__file__), '../src'))
+
+from config import load_config, load_mapping
+from mapper import AddressMapper
+from dram_sim import POLICIES, DRAMController
+from chunker import iter_chunks
+from simulate import result_from_controller
+from sweep import METRIC_FIELDS, iter_packed_transactions, load_packed_trace
+from checkpoint import controller_state, restore_controller
+
+# ----------------------------------------------------------------------------
+# What-if branching (What-if 分支模擬)
+#
+# Variants of one run usually share their warm-up: the same trace prefix
+# simulated with the same settings. branch() simulates that prefix once, up
+# to fork_us, then forks one child per variant from the warmed state. Each
+# child restores the state into a controller built with its own policy,
+# queue depth and timing, and finishes the trace; the parent collects the
+# results. The trace is held in memory as packed records, so children share
+# it (and the parent's other pages) copy-on-write and no file offset is shared.
+# 同一執行的各種變體通常共用暖機階段：以相同設定模擬相同的 Trace 前段。
+# branch() 只模擬該前段一次 (至 fork_us)，再由暖機後的狀態為每個變體 fork 一個子行程。
+# 每個子行程將狀態還原至以自身排程策略、隊列深度與時序建立的控制器，並完成剩餘的 Trace；主行程收集結果。
+# Trace 以打包紀錄保存在記憶體中，子行程以寫入時複製 (copy-on-write) 共用它 (及主行程其他記憶體頁)，不共用檔案位移。
+# ----------------------------------------------------------------------------
+
+# Result record fields, in table order: the variant, then its SimulationResult metrics
+# 結果紀錄欄位，依表格順序：變體參數，接著為其 SimulationResult 指標
+VARIANT_FIELDS = ('policy', 'queue_depth', 'timing')
+RESULT_FIELDS = VARIANT_FIELDS + ('fork_cycle',) + METRIC_FIELDS
+
+
+def parse_timing(text):
+    """
+    Parses 'tCL=20,tRCD=50' into {'tCL': 20, 'tRCD': 50}; an empty string or 'base' is no change.
+    將 'tCL=20,tRCD=50' 解析為 {'tCL': 20, 'tRCD': 50}；空字串或 'base' 表示不變更。
+    """
+    if text in ('', 'base'):
+        return {}
+    timing = {}
+    for item in text.split(','):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Timing override must be KEY=VALUE: {item}")
+        timing[key.strip()] = float(value) if '.' in value else int(value)
+    return timing
+
+
+def format_timing(timing):
+    return ','.join(f"{key}={value}" for key, value in timing.items()) or 'base'
+
+
+def _iter_requests(packed, mapper):
+    return (req.map(mapper) for req in iter_chunks(iter_packed_transactions(packed), mapper))
+
+
+def _finish_branch(config, mapper, state, requests, variant, engine, fast_forward):
+    """
+    Restores the warmed state into a controller built for variant and runs the remaining requests.
+    將暖機後的狀態還原至依變體建立的控制器，並執行剩餘的請求。
+    """
+    policy, queue_depth, timing = variant
+    controller = DRAMController(dict(config, **timing), mapper, scheduler_type=policy, queue_depth=queue_depth, engine=engine)
+    restore_controller(controller, state, allow_changes=('config', 'scheduler_type', 'queue_depth'))
+
+    # Same fill/tick loop as src/main.py
+    # 與 src/main.py 相同的填充/步進迴圈
+    next_req = next(requests, None)
+
+    def fill_queue():
+        nonlocal next_req
+        while next_req is not None and controller.has_room(next_req):
+            controller.queue.append(next_req)
+            next_req = next(requests, None)
+
+    while next_req is not None or len(controller.queue) > 0:
+        fill_queue()
+        if not (fast_forward and controller.fast_forward(fill_queue)):
+            controller.tick()
+    return result_from_controller(controller).to_dict()
+
+
+def _fork_branch(run):
+    """
+    Runs run() in a forked child; returns (pid, read end of the pipe carrying its JSON result).
+    於 fork 出的子行程中執行 run()；回傳 (pid, 傳回其 JSON 結果之管道的讀取端)。
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            reply = {'result': run()}
+        except BaseException:
+            reply = {'error': traceback.format_exc()}
+            status = 1
+        with os.fdopen(write_fd, 'w') as f:
+            json.dump(reply, f)
+        # Skip the parent's atexit handlers and buffered output
+        # 略過主行程的 atexit 處理與緩衝輸出
+        os._exit(status)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def _collect_branch(pid, read_fd):
+    with os.fdopen(read_fd, 'r') as f:
+        reply = json.load(f)
+    os.waitpid(pid, 0)
+    if 'error' in reply:
+        raise RuntimeError(f"What-if branch failed:\n{reply['error']}")
+    return reply['result']
+
+
+def branch(config, mapping, trace, fork_us, variants, policy='PageHitFirst', queue_depth=16, engine='scan', fast_forward=False, processes=None, progress=None):
+    """
+    Simulates trace up to fork_us once, then finishes it once per variant from that state; returns the result records.
+    只模擬一次 Trace 至 fork_us，再由該狀態為每個變體完成剩餘部分；回傳結果紀錄。
+
+    config and mapping are dicts or JSON file paths, trace is a text or
+    binary trace path. policy and queue_depth are the settings of the shared
+    prefix. variants is a list of (policy, queue_depth, timing) tuples, where
+    timing is a dict of config overrides such as {'tCL': 20}. Each variant
+    runs in a forked child, at most processes at a time (default: the CPU
+    count); without os.fork they run one after another in this process.
+    Records are dicts with the RESULT_FIELDS keys, in variant order. A
+    variant equal to the prefix settings gives exactly the result of an
+    uninterrupted run.
+    config 與 mapping 可為字典或 JSON 檔案路徑，trace 為文字或二進位 Trace 路徑。policy 與 queue_depth 為共用前段的設定。
+    variants 為 (policy, queue_depth, timing) 的列表，timing 為 config 覆寫值的字典，例如 {'tCL': 20}。
+    每個變體於 fork 出的子行程中執行，同時最多 processes 個 (預設為 CPU 數量)；無 os.fork 時於此行程中依序執行。
+    結果為以 RESULT_FIELDS 為鍵值的字典，依變體順序排列。與前段設定相同的變體，結果與未中斷的執行完全相同。
+    """
+    if isinstance(config, str):
+        config = load_config(config)
+    if isinstance(mapping, str):
+        mapping = load_mapping(mapping)
+    for _, _, timing in variants:
+        unknown = [key for key in timing if key not in config]
+        if unknown:
+            raise ValueError(f"Unknown timing parameter(s): {', '.join(unknown)}")
+
+    mapper = AddressMapper(mapping)
+    controller = DRAMController(config, mapper, scheduler_type=policy, queue_depth=queue_depth, engine=engine)
+    packed = load_packed_trace(trace)
+    requests = _iter_requests(packed, mapper)
+
+    # Shared prefix, stopping at the first step that reaches the fork cycle
+    # 共用前段，於第一個到達分支週期的步進停止
+    fork_cycle = fork_us * 1000.0 / (1000.0 / config['ClockFrequencyMHz'])
+    consumed = 0
+    next_req = next(requests, None)
+
+    def fill_queue():
+        nonlocal next_req, consumed
+        while next_req is not None and controller.has_room(next_req):
+            controller.queue.append(next_req)
+            consumed += 1
+            next_req = next(requests, None)
+
+    while (next_req is not None or len(controller.queue) > 0) and controller.current_time < fork_cycle:
+        fill_queue()
+        if not (fast_forward and controller.fast_forward(fill_queue, fork_cycle)):
+            controller.tick()
+
+    state = controller_state(controller)
+    fork_time = controller.current_time
+
+    def remaining():
+        # The request held back by the prefix loop comes first
+        # 前段迴圈保留的請求排在最前面
+        if next_req is None:
+            return iter(())
+        if hasattr(os, 'fork'):
+            return itertools.chain([next_req], requests)
+        return itertools.islice(_iter_requests(packed, mapper), consumed, None)
+
+    def make_record(variant, result):
+        record = {'policy': variant[0], 'queue_depth': variant[1], 'timing': format_timing(variant[2]), 'fork_cycle': fork_time}
+        record.update((field, result[field]) for field in METRIC_FIELDS)
+        if progress is not None:
+            progress(record)
+        return record
+
+    if not hasattr(os, 'fork'):
+        return [make_record(variant, _finish_branch(config, mapper, state, remaining(), variant, engine, fast_forward))
+                for variant in variants]
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, processes)
+
+    # Buffered output would otherwise be printed again by every child
+    # 否則緩衝中的輸出會被每個子行程再印一次
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    results = [None] * len(variants)
+    running = []
+    try:
+        for index, variant in enumerate(variants):
+            if len(running) >= processes:
+                done, pid, read_fd = running.pop(0)
+                results[done] = make_record(variants[done], _collect_branch(pid, read_fd))
+            pid, read_fd = _fork_branch(lambda: _finish_branch(config, mapper, state, remaining(), variant, engine, fast_forward))
+            running.append((index, pid, read_fd))
+        while running:
+            done, pid, read_fd = running.pop(0)
+            results[done] = make_record(variants[done], _collect_branch(pid, read_fd))
+    finally:
+        for _, pid, read_fd in running:
+            os.close(read_fd)
+            os.waitpid(pid, 0)
+    return results
+
+
+def format_table(results):
+    """
+    Formats result records as a Markdown table.
+    將結果紀錄格式化為 Markdown 表格。
+    """
+    headers = ["Policy", "QD", "Timing", "Total Cycles", "Bandwidth (GB/s)", "Utilization (%)", "Avg Queue Depth", "Page Hits", "Page Misses", "Page Conflicts"]
+    lines = ["| " + " | ".join(headers) + " |", "| " + " | ".join(["---"] * len(headers)) + " |"]
+    for res in results:
+        row = [
+            res['policy'],
+            str(res['queue_depth']),
+            res['timing'],
+            str(res['total_cycles']),
+            f"{res['bandwidth_gbs']:.2f}",
+            f"{res['utilization']:.2f}",
+            f"{res['avg_queue_depth']:.2f}",
+            str(res['page_hits']),
+            str(res['page_misses']),
+            str(res['page_conflicts']),
+        ]
+        lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='What-if branching from a shared warmed-up prefix (由共用暖機前段分支的 What-if 模擬)')
+    parser.add_argument('--trace', type=str, required=True, help='Trace file (Trace 檔案)')
+    parser.add_argument('--config', type=str, required=True, help='Timing config JSON file (時序設定檔)')
+    parser.add_argument('--mapping', type=str, required=True, help='Address mapping JSON file (位址映射檔)')
+    parser.add_argument('--policy', default='PageHitFirst', choices=list(POLICIES), help='Scheduling policy of the shared prefix (共用前段的排程策略)')
+    parser.add_argument('--queue_depth', type=int, default=16, help='Command queue depth of the shared prefix (共用前段的指令隊列深度)')
+    parser.add_argument('--fork_us', type=float, required=True, help='Simulated microseconds of shared prefix before branching (分支前共用前段的模擬微秒數)')
+    parser.add_argument('--policies', nargs='+', default=None, choices=list(POLICIES), help='Branch policies, default the prefix policy (分支的排程策略，預設同前段)')
+    parser.add_argument('--queue_depths', nargs='+', type=int, default=None, help='Branch queue depths, default the prefix depth (分支的隊列深度，預設同前段)')
+    parser.add_argument('--timings', nargs='+', default=['base'], help="Branch timing overrides, each 'KEY=VALUE[,KEY=VALUE]' or 'base' (分支的時序覆寫值)")
+    parser.add_argument('--engine', default='scan', choices=['scan', 'event'], help='Scheduler engine: per-bank scan or event-driven (排程引擎：逐 Bank 掃描或事件驅動)')
+    parser.add_argument('--fast_forward', action='store_true', help='Issue row-hit streaks in one batch, same results (Row 命中連續段批次發出，結果相同)')
+    parser.add_argument('--jobs', type=int, default=None, help='Branches running at once, defaults to the CPU count (同時執行的分支數，預設為 CPU 數量)')
+    parser.add_argument('--json', type=str, default=None, help='Write the result records to this JSON file (將結果紀錄寫入此 JSON 檔)')
+    args = parser.parse_args()
+
+    try:
+        timings = [parse_timing(text) for text in args.timings]
+    except ValueError as e:
+        parser.error(str(e))
+    variants = list(itertools.product(args.policies or [args.policy], args.queue_depths or [args.queue_depth], timings))
+
+    print(f"Shared prefix: {args.policy}, Queue Depth {args.queue_depth}, up to {args.fork_us} us; {len(variants)} branch(es)")
+
+    def progress(record):
+        print(f"{record['policy']} QD={record['queue_depth']} {record['timing']}: {record['total_cycles']} cycles")
+
+    try:
+        results = branch(args.config, args.mapping, args.trace, args.fork_us, variants, args.policy, args.queue_depth,
+                         engine=args.engine, fast_forward=args.fast_forward, processes=args.jobs, progress=progress)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    print(f"\nBranched at cycle {results[0]['fork_cycle'] if results else 0}")
+    print(format_table(results))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
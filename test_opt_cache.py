@@ -0,0 +1,179 @@
+import glob
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+from config import load_config, load_mapping
+from mapper import AddressMapper
+from dram_sim import DRAMController
+from main import TraceReader
+from asyc_parall_opt import DRAMControllerOpt
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_lockstep(trace, queue_depth, policy='PageHitFirst'):
+    """
+    Drives DRAMController and DRAMControllerOpt with the same request stream
+    and checks that they agree after every tick.
+    以相同的請求串流驅動兩種控制器，並在每次 tick 後確認狀態一致。
+    """
+    config = load_config(os.path.join(ROOT, 'configs/LP4_32_cfg.json'))
+    mapper = AddressMapper(load_mapping(os.path.join(ROOT, 'configs/mapping_2ch.json')))
+    ref = DRAMController(config, mapper, scheduler_type=policy, queue_depth=queue_depth)
+    opt = DRAMControllerOpt(config, mapper, scheduler_type=policy, queue_depth=queue_depth)
+
+    ref_iter = TraceReader(trace, mapper)
+    opt_iter = TraceReader(trace, mapper)
+    ref_req = next(ref_iter, None)
+    opt_req = next(opt_iter, None)
+
+    while ref_req is not None or ref.queue:
+        while ref_req is not None and len(ref.queue) < queue_depth:
+            ref.queue.append(ref_req)
+            opt.queue.append(opt_req)
+            ref_req = next(ref_iter, None)
+            opt_req = next(opt_iter, None)
+
+        ref.tick()
+        opt.tick()
+
+        assert opt.current_time == ref.current_time, trace
+        assert opt.completed_requests == ref.completed_requests, trace
+        assert opt.data_bus_free_time == ref.data_bus_free_time, trace
+
+    assert not opt.queue
+    assert opt.stats == ref.stats, trace
+
+
+def test_basic100():
+    for trace in sorted(glob.glob(os.path.join(ROOT, 'traces/basic100/*.trace'))):
+        for queue_depth in (16, 64):
+            run_lockstep(trace, queue_depth)
+        run_lockstep(trace, 16, policy='FIFO')
+
+
+def test_perf_limit():
+    for trace in sorted(glob.glob(os.path.join(ROOT, 'traces/perf_limit/*.trace'))):
+        run_lockstep(trace, 128)
+
+
+def test_engine_equivalence():
+    # Every engine, with and without fast-forward, must issue the same command stream in both queue modes,
+    # with and without a separate write queue, under every page policy and with auto-precharge
+    # 所有引擎 (含與不含快轉) 在兩種隊列模式下、使用與不使用獨立寫入隊列時、各 Page 策略下及使用自動預充電時，都必須發出相同的指令串流
+    from equivalence import ENGINES, MODES, POLICIES, compare_point
+
+    config = load_config(os.path.join(ROOT, 'configs/LP4_32_cfg.json'))
+    for mapping in ('configs/mapping_2ch.json', 'configs/mapping_single_bank.json'):
+        mapping = load_mapping(os.path.join(ROOT, mapping))
+        for trace in ('gen_seq', 'gen_rand', 'gen_hot_rows'):
+            for policy in POLICIES:
+                for mode in MODES:
+                    for write_queue_depth, page_policy, auto_precharge in ((0, 'open', False), (8, 'open', True), (0, 'closed', False), (8, 'adaptive', False)):
+                        assert compare_point(trace, config, mapping, policy, 16, mode, list(ENGINES), write_queue_depth=write_queue_depth,
+                                             page_policy=page_policy, auto_precharge=auto_precharge) == [], \
+                            (trace, policy, mode, write_queue_depth, page_policy, auto_precharge)
+
+    # Bank group timing and the cross-group preference (LPDDR5 with a BankGroup mapping)
+    # Bank Group 時序與跨 Bank Group 優先 (LPDDR5 搭配含 BankGroup 的映射)
+    config = load_config(os.path.join(ROOT, 'configs/LP5_32_cfg.json'))
+    mapping = load_mapping(os.path.join(ROOT, 'configs/mapping_4ch_bg.json'))
+    for trace in ('gen_seq', 'gen_rand', 'gen_hot_rows'):
+        for policy in POLICIES:
+            for mode in MODES:
+                for write_queue_depth, page_policy, auto_precharge in ((0, 'open', False), (8, 'adaptive', True)):
+                    assert compare_point(trace, config, mapping, policy, 16, mode, list(ENGINES), write_queue_depth=write_queue_depth,
+                                         page_policy=page_policy, auto_precharge=auto_precharge) == [], \
+                        ('bank groups', trace, policy, mode, write_queue_depth, page_policy)
+
+
+def test_checkpoint_resume(tmp_path):
+    # A controller saved mid-run and restored into a fresh one must finish exactly like the original
+    # 執行中途儲存並還原至新控制器後，必須與原控制器完全相同地完成
+    from checkpoint import load_checkpoint, restore_controller, save_checkpoint
+
+    config = load_config(os.path.join(ROOT, 'configs/LP4_32_cfg.json'))
+    mapper = AddressMapper(load_mapping(os.path.join(ROOT, 'configs/mapping_2ch.json')))
+    trace = os.path.join(ROOT, 'traces/mix/rand_mix_128B.trace')
+    for cls in (DRAMController, DRAMControllerOpt):
+        controller = cls(config, mapper, scheduler_type='PageHitFirst', queue_depth=16)
+        pending = TraceReader(trace, mapper)
+        next_req = next(pending, None)
+        resumed = None
+        while next_req is not None or controller.queue:
+            while next_req is not None and len(controller.queue) < 16:
+                controller.queue.append(next_req)
+                next_req = next(pending, None)
+            controller.tick()
+            if resumed is None and controller.current_time >= 500:
+                path = save_checkpoint(str(tmp_path / 'mid.ckpt'), controller, controller.completed_requests + len(controller.queue))
+                resumed = cls(config, mapper, scheduler_type='PageHitFirst', queue_depth=16)
+                data = load_checkpoint(path)
+                restore_controller(resumed, data['state'])
+                resumed_pending = iter(list(TraceReader(trace, mapper))[data['position']:])
+                resumed_req = next(resumed_pending, None)
+
+        while resumed_req is not None or resumed.queue:
+            while resumed_req is not None and len(resumed.queue) < 16:
+                resumed.queue.append(resumed_req)
+                resumed_req = next(resumed_pending, None)
+            resumed.tick()
+
+        assert resumed.current_time == controller.current_time, cls.__name__
+        assert resumed.stats == controller.stats, cls.__name__
+        assert resumed.data_bus_free_time == controller.data_bus_free_time, cls.__name__
+
+
+def test_whatif_branch(monkeypatch):
+    # Forked branches must match in-process ones, and the unchanged branch an uninterrupted run
+    # fork 出的分支必須與行程內執行相同，未變更的分支必須與未中斷的執行相同
+    from simulate import simulate
+    from whatif import branch
+
+    config = os.path.join(ROOT, 'configs/LP4_32_cfg.json')
+    mapping = os.path.join(ROOT, 'configs/mapping_2ch.json')
+    trace = os.path.join(ROOT, 'traces/mix/rand_mix_128B.trace')
+    variants = [('PageHitFirst', 16, {}), ('FIFO', 64, {}), ('PageHitFirst', 8, {'tCL': 40})]
+    forked = branch(config, mapping, trace, 0.5, variants, 'PageHitFirst', 16, processes=2)
+    assert forked[0]['total_cycles'] == simulate(config, mapping, trace, 'PageHitFirst', 16).total_cycles
+
+    monkeypatch.delattr(os, 'fork')
+    assert branch(config, mapping, trace, 0.5, variants, 'PageHitFirst', 16) == forked
+
+
+def test_block_reader_binary(tmp_path):
+    # The NumPy block reader must handle an empty binary trace and release the memory map when closed early
+    # NumPy 區塊讀取器必須能處理空的二進位 Trace，並在提前關閉時釋放記憶體映射
+    import pytest
+    pytest.importorskip('numpy')
+    from chunker import BlockTraceReader
+    from trace_bin import convert_text_trace
+
+    mapper = AddressMapper(load_mapping(os.path.join(ROOT, 'configs/mapping_2ch.json')))
+    (tmp_path / 'empty.trace').write_text('')
+    convert_text_trace(str(tmp_path / 'empty.trace'), str(tmp_path / 'empty.btrace'))
+    assert list(BlockTraceReader(str(tmp_path / 'empty.btrace'), mapper, block_size=64)) == []
+
+    trace = os.path.join(ROOT, 'traces/mix/rand_mix_128B.trace')
+    convert_text_trace(trace, str(tmp_path / 'mix.btrace'))
+    reader = BlockTraceReader(str(tmp_path / 'mix.btrace'), mapper, block_size=64)
+    first = next(reader)
+    reader.blocks.close()
+    expected = next(TraceReader(trace, mapper))
+    assert (first.address, first.size, first.is_write) == (expected.address, expected.size, expected.is_write)
+
+
+def test_write_queue_per_channel():
+    # Write drains are per channel, so a write queue must not cost a 4-channel mixed trace cycles or turnarounds
+    # 寫入排空依 Channel 分別進行，因此寫入隊列不可使 4 Channel 讀寫混合 Trace 的週期數或轉向次數增加
+    from simulate import simulate
+
+    config = os.path.join(ROOT, 'configs/LP4_32_cfg.json')
+    mapping = os.path.join(ROOT, 'configs/mapping_4ch.json')
+    for trace in ('traces/mix/rand_mix_128B.trace', 'traces/mix/seq_mix_128B.trace'):
+        trace = os.path.join(ROOT, trace)
+        shared = simulate(config, mapping, trace, 'PageHitFirst', 32)
+        queued = simulate(config, mapping, trace, 'PageHitFirst', 32, write_queue_depth=8)
+        assert queued.total_cycles <= shared.total_cycles, trace
+        assert queued.turnarounds <= shared.turnarounds, trace